@@ -1,7 +1,14 @@
 import csv
+import hashlib
+import io
 #import json
 import os
 import pickle
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from postings import PostingList
 
 ### <--------- Helper Functions ---------> ###
 def to_bool(val):
@@ -10,13 +17,17 @@ def to_bool(val):
 
 def to_number(val):
     """Converting string to int or float if possible, else leave as string"""
-    try:
+    digits = val.strip()
+    if digits[:1] in ("-", "+"):
+        digits = digits[1:]
+    if digits.isdecimal(): #fast path, no exception for the common integer case
         return int(val)
+    if not digits: #empty cell
+        return val
+    try:
+        return float(val)
     except ValueError:
-        try:
-            return float(val)
-        except ValueError:
-            return val
+        return val
 
 def to_list(val):
     """Converting comma-separated string to list of strings"""
@@ -31,18 +42,141 @@ def initialize_next_key_to_insert(records_dic):
     """
     #Using max(keys) to ensure the highest number is found, even if
     #earlier keys were deleted (ex. max of {0, 5, 10} is 10)
-    max_key = max(records_dic.keys())
+    max_key = max(records_dic.keys(), default=-1) #-1: an empty catalog starts at key 0
     next_key = max_key + 1
     return next_key
 ### <--------- KEY FUNCTIONALITY ---------> ###
+
+### <--------- CHECKPOINT Helper ---------> ###
+def atomic_pickle_dump(obj, path):
+    """
+    Pickle obj into a temporary file next to path, fsync it and rename it over path.
+    A crash mid-write leaves the previous checkpoint intact instead of a truncated pickle.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+### <--------- CHECKPOINT Helper ---------> ###
 ### <--------- Helper Functions ---------> ###
 
+### <--------- SOURCE Tracking ---------> ###
+def source_fingerprint(path, known=None):
+    """
+    {"size", "mtime_ns", "sha256"} of the CSV. When size and mtime match the known fingerprint
+    the file is not read again; otherwise its content is hashed (1 MiB at a time).
+    """
+    stat = os.stat(path)
+    if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+def source_key(record):
+    """Identity of a movie across CSV versions: imdb_id, or (title, release_date) when it is empty"""
+    imdb_id = record.get("imdb_id")
+    return imdb_id if imdb_id else (record.get("title"), record.get("release_date"))
+### <--------- SOURCE Tracking ---------> ###
+
+### <--------- CHUNKED CSV Parsing ---------> ###
+CHUNK_SIZE = 16 * 1024 * 1024  #bytes of CSV per worker task
+BATCH_ROWS = 10000             #rows per batch in the single-process loader
+
+def row_to_record(row):
+    """One csv.DictReader row -> typed movie record"""
+    return {
+        #"id":                  new_index,      #to_number(row["id"]),  # !! NO NEED !! #
+        "title":                row["title"],
+        "vote_average":         to_number(row["vote_average"]),
+        "vote_count":           to_number(row["vote_count"]),
+        "status":               row["status"],
+        "release_date":         row["release_date"],
+        "revenue":              to_number(row["revenue"]),
+        "runtime":              to_number(row["runtime"]),
+        "adult":                to_bool(row["adult"]),
+        "backdrop_path":        row["backdrop_path"],
+        "budget":               to_number(row["budget"]),
+        "homepage":             row["homepage"] if row["homepage"].strip() else None,
+        "imdb_id":              row["imdb_id"],
+        "original_language":    row["original_language"],
+        "original_title":       row["original_title"],
+        "overview":             row["overview"],
+        "popularity":           to_number(row["popularity"]),
+        "poster_path":          row["poster_path"],
+        "tagline":              row["tagline"],
+        "genres":               to_list(row["genres"]),
+        "production_companies": to_list(row["production_companies"]),
+        "production_countries": to_list(row["production_countries"]),
+        "spoken_languages":     to_list(row["spoken_languages"]),
+        "keywords":             to_list(row["keywords"])
+    }
+
+def _last_record_end(buf):
+    """
+    Index of the last newline of buf that ends a record, -1 if none.
+    buf starts on a record boundary; a newline inside a quoted field follows an odd number of quotes
+    ("" escapes add two, so parity still tells whether we are inside quotes).
+    """
+    i = buf.rfind(b"\n")
+    while i != -1:
+        if buf.count(b'"', 0, i) % 2 == 0:
+            return i
+        i = buf.rfind(b"\n", 0, i)
+    return -1
+
+def _chunk_ranges(path, data_start, chunk_size):
+    """Yield (start, end) byte ranges of ~chunk_size that begin and end on record boundaries"""
+    with open(path, "rb") as f:
+        f.seek(data_start)
+        start = data_start
+        carry = b""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                if carry:
+                    yield start, start + len(carry)
+                return
+            buf = carry + block
+            cut = _last_record_end(buf)
+            if cut == -1: #a single record longer than the buffer so far
+                carry = buf
+                continue
+            yield start, start + cut + 1
+            start += cut + 1
+            carry = buf[cut + 1:]
+
+def _parse_chunk(path, start, end, fieldnames):
+    """Worker: parse one byte range of the CSV into typed records"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    #newline=None: same universal-newline handling as open() in the single-process loader
+    reader = csv.DictReader(io.StringIO(text, newline=None), fieldnames=fieldnames)
+    return [row_to_record(row) for row in reader]
+### <--------- CHUNKED CSV Parsing ---------> ###
+
+
+#in-memory layouts of records_dic: plain dict of record dicts, columnar.ColumnarRecords,
+#compact.CompactRecords (interned, dictionary-encoded record tuples),
+#or snapshot.SnapshotRecords (pickle_path is then a binary snapshot mapped with mmap)
+BACKENDS = ["dict", "columnar", "compact", "snapshot"]
 
 class STORAGE_DATASET:
-    def __init__(self, csv_path="project/data/raw/movies.csv", pickle_path="project/data/pickle/records_dic.pkl"):
+    def __init__(self, csv_path="project/data/raw/movies.csv", pickle_path="project/data/pickle/records_dic.pkl", backend="dict"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend!r}, expected one of {BACKENDS}")
         self.csv_path = os.path.abspath(csv_path)
         self.pickle_path = os.path.abspath(pickle_path)
-        self.records_dic = {}
+        self.backend = backend
+        self.records_dic = self._as_backend({})
+        self.wal_lsn = 0 #last write-ahead log entry already contained in the pickle
+        self.source = None       #{"fingerprint": source_fingerprint(csv), "ids": PostingList of the IDs loaded from it}
+        self.source_changed = None #new CSV fingerprint when the CSV no longer matches the pickle, see check_source()
         ### <--------- KEY FUNCTIONALITY ---------> ###
         self._next_key_to_insert = 0
         ### <--------- KEY FUNCTIONALITY ---------> ###
@@ -54,65 +188,173 @@ class STORAGE_DATASET:
     def setter_next_key_to_insert(self, increment):
         self._next_key_to_insert = increment
     ### <--------- KEY FUNCTIONALITY ---------> ###
+
+    def _as_backend(self, records):
+        """records in this dataset's layout (converted when a pickle was written by the other backend)"""
+        if self.backend == "columnar":
+            from columnar import ColumnarRecords #only paid for when the columnar backend is used
+            return records if isinstance(records, ColumnarRecords) else ColumnarRecords(records)
+        if self.backend == "compact":
+            from compact import CompactRecords
+            return records if isinstance(records, CompactRecords) else CompactRecords(records)
+        if self.backend == "snapshot": #records move into a snapshot when it is saved
+            return records
+        return records if type(records) is dict else {movie_id: dict(record) for movie_id, record in records.items()}
     
 
     ### <--------- Main Conversion Function ---------> ###
-    def load_movie_csv(self):
+    def iter_movie_csv_batches(self, workers=None, chunk_size=CHUNK_SIZE):
+        """
+        Stream the CSV as lists of (new_index, record), in file order.
+            workers None/1: one csv.DictReader, a batch every BATCH_ROWS rows.
+            workers > 1:    the file is cut into ~chunk_size byte ranges on record boundaries,
+                            parsed by a process pool, and at most 2 * workers chunks are in flight,
+                            so memory is bounded by the chunk size, not the file size.
+        """
+        new_index = 0
+        if not workers or workers <= 1:
+            with open(self.csv_path, encoding="utf-8") as f:
+                batch = []
+                for row in csv.DictReader(f):
+                    batch.append((new_index, row_to_record(row)))
+                    new_index += 1
+                    if len(batch) >= BATCH_ROWS:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+            return
+
+        with open(self.csv_path, encoding="utf-8", newline="") as f:
+            header_line = f.readline()
+        fieldnames = next(csv.reader([header_line]))
+        data_start = len(header_line.encode("utf-8"))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for start, end in _chunk_ranges(self.csv_path, data_start, chunk_size):
+                in_flight.append(pool.submit(_parse_chunk, self.csv_path, start, end, fieldnames))
+                if len(in_flight) < 2 * workers:
+                    continue
+                records = in_flight.popleft().result()
+                yield [(new_index + i, record) for i, record in enumerate(records)]
+                new_index += len(records)
+            while in_flight:
+                records = in_flight.popleft().result()
+                yield [(new_index + i, record) for i, record in enumerate(records)]
+                new_index += len(records)
+
+
+    def load_movie_csv(self, workers=None, chunk_size=CHUNK_SIZE, on_batch=None):
         """
         Load CSV into a dictionary of movies (dics) keyed by index.
         Each movie record is represented as a dictionary with typed fields
+        on_batch(batch) is called with every [(new_index, record)] batch as it arrives
+        (e.g. StreamingIndexBuilder.add_batch). Throughput is kept in self.load_stats.
         """
+        started = time.perf_counter()
+        rows = 0
+        for batch in self.iter_movie_csv_batches(workers, chunk_size):
+            self.records_dic.update(batch)
+            rows += len(batch)
+            if on_batch is not None:
+                on_batch(batch)
 
-        with open(self.csv_path, encoding="utf-8") as f:
-            data = csv.DictReader(f)
-            for new_index, row in enumerate(data):
-                record = {
-                    #"id":                  new_index,      #to_number(row["id"]),  # !! NO NEED !! #
-                    "title":                row["title"],
-                    "vote_average":         to_number(row["vote_average"]),
-                    "vote_count":           to_number(row["vote_count"]),
-                    "status":               row["status"],
-                    "release_date":         row["release_date"],
-                    "revenue":              to_number(row["revenue"]),
-                    "runtime":              to_number(row["runtime"]),
-                    "adult":                to_bool(row["adult"]),
-                    "backdrop_path":        row["backdrop_path"],
-                    "budget":               to_number(row["budget"]),
-                    "homepage":             row["homepage"] if row["homepage"].strip() else None,
-                    "imdb_id":              row["imdb_id"],
-                    "original_language":    row["original_language"],
-                    "original_title":       row["original_title"],
-                    "overview":             row["overview"],
-                    "popularity":           to_number(row["popularity"]),
-                    "poster_path":          row["poster_path"],
-                    "tagline":              row["tagline"],
-                    "genres":               to_list(row["genres"]),
-                    "production_companies": to_list(row["production_companies"]),
-                    "production_countries": to_list(row["production_countries"]),
-                    "spoken_languages":     to_list(row["spoken_languages"]),
-                    "keywords":             to_list(row["keywords"])
-                }
-                self.records_dic[new_index] = record
+        seconds = time.perf_counter() - started
+        self.load_stats = {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0.0}
         return self.records_dic
     ### <--------- Main Conversion Function ---------> ###
 
 
     ### <--------- PICKLE Functions ---------> ###
-    def save_DATASET_pickle(self):
-        with open(self.pickle_path, "wb") as f:
-            pickle.dump(self.records_dic, f) #indent=2
+    def save_DATASET_pickle(self, wal_lsn=None):
+        """Checkpoint the records together with the last WAL entry they contain"""
+        if wal_lsn is not None:
+            self.wal_lsn = wal_lsn
+        if self.backend == "snapshot":
+            import snapshot
+            self.records_dic = snapshot.save_records(self.pickle_path, self.records_dic, self.wal_lsn, self.source)
+            return
+        atomic_pickle_dump({"wal_lsn": self.wal_lsn, "records_dic": self.records_dic, "source": self.source}, self.pickle_path)
 
     def load_DATASET_pickle(self):
+        if self.backend == "snapshot":
+            import snapshot
+            records, self.wal_lsn, self.source = snapshot.open_records(self.pickle_path)
+            return records
         with open(self.pickle_path, "rb") as f:
-            return pickle.load(f)
+            data = pickle.load(f)
+        if "records_dic" not in data: #old format: the pickle is the bare records dictionary
+            self.wal_lsn = 0
+            return self._as_backend(data)
+        self.wal_lsn = data["wal_lsn"]
+        self.source = data.get("source")
+        return self._as_backend(data["records_dic"])
     ### <--------- PICKLE Functions ---------> ###
 
+    ### <--------- SOURCE Delta ---------> ###
+    def check_source(self):
+        """
+        Compare the CSV with the fingerprint stored in the pickle. Returns None when they match,
+        else the new fingerprint. QueryEngine then diffs the CSV (see diff_source) once the write-ahead
+        log is replayed, merges the delta through the index maintenance paths and checkpoints it
+        together with the new fingerprint.
+        """
+        if not os.path.exists(self.csv_path):
+            return None
+        if self.source is None: #pickle written before source tracking: adopt the CSV as it is now
+            self.source = {"fingerprint": source_fingerprint(self.csv_path),
+                           "ids": PostingList.from_sorted(sorted(self.records_dic))}
+            return None
+
+        known = self.source["fingerprint"]
+        fingerprint = source_fingerprint(self.csv_path, known)
+        if fingerprint["sha256"] == known["sha256"]:
+            self.source["fingerprint"] = fingerprint #touched, not changed
+            return None
+        return fingerprint
+
+    def diff_source(self):
+        """
+        Diff the CSV against the records by source_key, streaming it batch by batch:
+            {"insert": [record], "update": {movie_id: record}, "delete": [movie_id], "matched": [movie_id]}
+        Every record is a match candidate (so rows merged before a crash are not inserted twice),
+        but only movies that came from the CSV (self.source["ids"]) are deleted when it drops them;
+        movies inserted through QueryEngine are kept. For the movies it contains, the CSV wins.
+        Repeated keys are paired in ID / file order.
+        O(N) time, memory for the key map plus the changed rows only.
+        """
+        by_key = {}
+        for movie_id in sorted(self.records_dic):
+            by_key.setdefault(source_key(self.records_dic[movie_id]), deque()).append(movie_id)
+
+        inserts, updates, matched = [], {}, []
+        for batch in self.iter_movie_csv_batches():
+            for _, record in batch:
+                candidates = by_key.get(source_key(record))
+                if not candidates:
+                    inserts.append(record)
+                    continue
+                movie_id = candidates.popleft()
+                matched.append(movie_id)
+                if self.records_dic[movie_id] != record:
+                    updates[movie_id] = record
+
+        source_ids = self.source["ids"]
+        deletes = sorted(movie_id for ids in by_key.values() for movie_id in ids if movie_id in source_ids)
+        return {"insert": inserts, "update": updates, "delete": deletes, "matched": matched}
+    ### <--------- SOURCE Delta ---------> ###
+
     ### <--------- UNIFIED Loader ---------> ###
-    def load_DATASET_final(self):
+    def load_DATASET_final(self, workers=None, on_batch=None):
+        """workers/on_batch are passed to load_movie_csv when there is no pickle yet"""
         if os.path.exists(self.pickle_path):
             self.records_dic = self.load_DATASET_pickle() #load from pickle if it exists
+            self.source_changed = self.check_source()
         else:  #load from CSV if pickle doesn't exist
-            self.load_movie_csv()
+            fingerprint = source_fingerprint(self.csv_path)
+            self.load_movie_csv(workers=workers, on_batch=on_batch)
+            self.source = {"fingerprint": fingerprint, "ids": PostingList.from_sorted(sorted(self.records_dic))}
             self.save_DATASET_pickle()
         ### <--------- KEY FUNCTIONALITY ---------> ###
         find_max_key = initialize_next_key_to_insert(self.records_dic)
@@ -123,7 +365,18 @@ class STORAGE_DATASET:
 
 
 
-storager_obj = STORAGE_DATASET()
-STORAGE_movie_dic = storager_obj.load_DATASET_final() #Load dataset ONCE at the start
+### <--------- LAZY Module Globals ---------> ###
+def __getattr__(name):
+    """
+    storager_obj / STORAGE_movie_dic used to be loaded when this module was imported.
+    They are now loaded ONCE on first access; new code should use database.open_database().
+    """
+    if name in ("storager_obj", "STORAGE_movie_dic"):
+        global storager_obj, STORAGE_movie_dic
+        storager_obj = STORAGE_DATASET()
+        STORAGE_movie_dic = storager_obj.load_DATASET_final()
+        return globals()[name]
+    raise AttributeError(f"module 'STORAGE' has no attribute '{name}'")
+### <--------- LAZY Module Globals ---------> ###
 
 #©Vardan Grigoryan
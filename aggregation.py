@@ -0,0 +1,302 @@
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError: #optional: without NumPy every aggregate is one pass over the records
+    np = None
+
+from columnar import ColumnarRecords, NUMERIC_COLUMNS, MULTI_CATEGORICAL_COLUMNS, CATEGORICAL_COLUMNS
+from columnar import _year_of, _is_number, _view, _NATIVE, _INT_AS_FLOAT
+from indexing import NUMERIC_FIELDS
+
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+ROLLUP_FIELDS = ["genres", "year"] #group-by fields whose aggregates are maintained by every mutation
+
+
+def parse_metrics(metrics):
+    """["count", "avg:vote_average"] -> [(name, function, field or None)]"""
+    if isinstance(metrics, str):
+        metrics = [metrics]
+    parsed = []
+    for metric in metrics:
+        function, _, field = str(metric).partition(":")
+        if function not in AGGREGATES or (function != "count" and not field):
+            raise ValueError(f"Invalid metric {metric!r}, expected 'count' or '<count|sum|avg|min|max>:<field>'")
+        parsed.append((metric, function, field or None))
+    return parsed
+
+def group_keys(record, group_by):
+    """Groups of one record: a list field puts the movie once in every group it lists (none when it is missing)"""
+    if group_by is None:
+        return (None,)
+    value = _year_of(record) if group_by == "year" else record.get(group_by)
+    if type(value) is list:
+        return list(dict.fromkeys(value))
+    return () if value is None and group_by in MULTI_CATEGORICAL_COLUMNS else (value,)
+
+
+### <--------- GROUP Accumulator ---------> ###
+def add_total(stat, value):
+    """
+    stat[1] += value without rounding drift: ints are summed exactly in stat[1], finite floats kept
+    in stat[4] as the exact partials of math.fsum (Shewchuk), so adding -value undoes adding value.
+    """
+    if type(value) is int or not math.isfinite(value):
+        stat[1] += value
+        return
+    partials = stat[4]
+    i = 0
+    for other in partials:
+        if abs(value) < abs(other):
+            value, other = other, value
+        high = value + other
+        low = other - (high - value)
+        if low:
+            partials[i] = low
+            i += 1
+        value = high
+    partials[i:] = [value]
+
+def _total(stat):
+    return math.fsum([*stat[4], stat[1]]) if stat[4] else stat[1]
+
+
+class _Group:
+    """count of the movies in a group, and [n, int sum, min, max, float sum partials] of the numeric values of each field"""
+    __slots__ = ("count", "stats")
+
+    def __init__(self, fields):
+        self.count = 0
+        self.stats = {field: [0, 0, None, None, []] for field in fields}
+
+    def add(self, record):
+        self.count += 1
+        for field, stat in self.stats.items():
+            value = record.get(field)
+            if _is_number(value):
+                stat[0] += 1
+                add_total(stat, value)
+                if stat[2] is None or value < stat[2]:
+                    stat[2] = value
+                if stat[3] is None or value > stat[3]:
+                    stat[3] = value
+
+    def remove(self, record):
+        """Undo add(record); True when it removed a min or max, which then has to be recomputed"""
+        self.count -= 1
+        stale = False
+        for field, stat in self.stats.items():
+            value = record.get(field)
+            if _is_number(value):
+                stat[0] -= 1
+                add_total(stat, -value)
+                if not stat[0]: #non-finite values cannot be subtracted back out
+                    stat[1], stat[4] = 0, []
+                stale = stale or value == stat[2] or value == stat[3]
+        return stale
+
+    def result(self, metrics):
+        row = {}
+        for name, function, field in metrics:
+            if function == "count" and field is None:
+                row[name] = self.count
+                continue
+            stat = self.stats.get(field, (0, 0, None, None, []))
+            n, low, high, total = stat[0], stat[2], stat[3], _total(stat)
+            row[name] = {"count": n, "sum": total, "avg": total / n if n else None, "min": low, "max": high}[function]
+        return row
+### <--------- GROUP Accumulator ---------> ###
+
+
+### <--------- GROUP-BY ---------> ###
+def _python_groups(records, group_by, fields, movie_ids=None):
+    """{key: _Group} in one pass over the records. O(N) (O(K) for K movie_ids)"""
+    groups = {}
+    rows = records.values() if movie_ids is None else (records.get(i) for i in movie_ids)
+    for record in rows:
+        if record is None:
+            continue
+        for key in group_keys(record, group_by):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = _Group(fields)
+            group.add(record)
+    return groups
+
+def _column_groups(store, rows, group_by):
+    """(group index of each element, row of each element, key of each group index), None if not vectorizable"""
+    if group_by is None:
+        return np.zeros(len(rows), dtype=np.int64), rows, [None]
+    if group_by == "year":
+        values, present = _view(store._num["year"], "i8")[rows], _view(store._kind["year"], "u1")[rows] == _NATIVE
+        years, index = np.unique(values, return_inverse=True)
+        index[~present] = len(years) #absent year: the None group
+        return index, rows, years.tolist() + [None]
+    if store._overflow.get(group_by): #values that could not be encoded
+        return None
+    if group_by in CATEGORICAL_COLUMNS:
+        return _view(store._codes[group_by], "u4")[rows].astype(np.int64), rows, store._values[group_by] #code 0 = None
+    if group_by in MULTI_CATEGORICAL_COLUMNS:
+        offsets = _view(store._multi_offsets[group_by], "u8").astype(np.int64)
+        starts, lengths = offsets[rows], offsets[rows + 1] - offsets[rows]
+        #explode: element j of row r sits at starts[r] + j in the flat code array
+        element_rows = np.repeat(rows, lengths)
+        first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + np.arange(len(element_rows)) - first
+        codes = _view(store._multi_codes[group_by], "u4")[positions].astype(np.int64)
+        return codes, element_rows, store._values[group_by]
+    return None
+
+def _columnar_groups(store, group_by, fields, movie_ids=None):
+    """
+    _python_groups over the column arrays of a ColumnarRecords: bincount/ufunc.at per field,
+    O(N) vectorized work and O(groups) Python objects. None when a column needs the slow path.
+    """
+    if np is None or any(field not in NUMERIC_COLUMNS or store._overflow[field] for field in fields):
+        return None
+    if movie_ids is None:
+        rows = np.flatnonzero(_view(store._live, "u1"))
+    else:
+        row_of = store._row_of
+        rows = np.fromiter((row_of[i] for i in movie_ids if i in row_of), dtype=np.int64)
+    grouped = _column_groups(store, rows, group_by)
+    if grouped is None:
+        return None
+    index, element_rows, keys = grouped
+    unique = {} #codes of equal values (None stored vs absent, 1 and True...) are one group, as in a dict
+    remap = np.array([unique.setdefault(key, len(unique)) for key in keys], dtype=np.int64)
+    index, keys = remap[index], list(unique)
+    size = len(keys)
+    if group_by in MULTI_CATEGORICAL_COLUMNS: #a movie listing a group twice is counted once
+        _, first = np.unique(element_rows * size + index, return_index=True)
+        index, element_rows = index[first], element_rows[first]
+    counts = np.bincount(index, minlength=size)
+
+    stats = {}
+    for field in fields:
+        typecode = NUMERIC_COLUMNS[field]
+        kinds = _view(store._kind[field], "u1")[element_rows]
+        valid = (kinds == _NATIVE) | (kinds == _INT_AS_FLOAT)
+        at, values = index[valid], _view(store._num[field], typecode)[element_rows][valid]
+        n = np.bincount(at, minlength=size)
+        if typecode == "d":
+            total = np.bincount(at, weights=values, minlength=size)
+            low, high = np.full(size, np.inf), np.full(size, -np.inf)
+        else: #exact integer sums
+            total = np.zeros(size, dtype=np.int64)
+            np.add.at(total, at, values)
+            low, high = np.full(size, np.iinfo(np.int64).max), np.full(size, np.iinfo(np.int64).min)
+        np.minimum.at(low, at, values)
+        np.maximum.at(high, at, values)
+        stats[field] = (n.tolist(), total.tolist(), low.tolist(), high.tolist())
+
+    groups = {}
+    for i in np.flatnonzero(counts).tolist():
+        group = groups[keys[i]] = _Group(())
+        group.count = int(counts[i])
+        for field, (n, total, low, high) in stats.items():
+            group.stats[field] = [n[i], 0, low[i], high[i], []] if n[i] else [0, 0, None, None, []]
+            add_total(group.stats[field], total[i])
+    return groups
+
+def compute_groups(records, group_by, fields, movie_ids=None):
+    """{key: _Group} of the records (only movie_ids, when given), vectorized when the backend allows it"""
+    if isinstance(records, ColumnarRecords):
+        groups = _columnar_groups(records, group_by, fields, movie_ids)
+        if groups is not None:
+            return groups
+    return _python_groups(records, group_by, fields, movie_ids)
+
+def metric_fields(metrics):
+    return list(dict.fromkeys(field for _, _, field in metrics if field is not None))
+
+def format_groups(groups, group_by, metrics):
+    """{key: {metric: value}} sorted by key (None last); the single row itself when group_by is None"""
+    if group_by is None:
+        return groups.get(None, _Group(())).result(metrics)
+    try:
+        keys = sorted(groups, key=lambda key: (key is None, key if key is not None else 0))
+    except TypeError: #keys of mixed types
+        keys = list(groups)
+    return {key: groups[key].result(metrics) for key in keys}
+
+def aggregate_records(records, group_by, metrics, movie_ids=None):
+    """Aggregate the {movie_id: record} mapping; metrics as parsed by parse_metrics"""
+    return format_groups(compute_groups(records, group_by, metric_fields(metrics), movie_ids), group_by, metrics)
+### <--------- GROUP-BY ---------> ###
+
+
+### <--------- INCREMENTAL Rollups ---------> ###
+class Rollups:
+    """
+    Aggregates of NUMERIC_FIELDS per group of each ROLLUP_FIELDS field, updated in O(g) by every
+    insert/delete/modify so dashboard queries answer in O(groups) instead of O(N).
+    Built by the first query that uses them (until then add/remove cost nothing).
+    Removing the min or max of a group marks it stale: only that group is recomputed, on the next read.
+    """
+    def __init__(self, fields=ROLLUP_FIELDS, metric_fields=NUMERIC_FIELDS):
+        self.fields = list(fields)
+        self.metric_fields = list(metric_fields)
+        self.groups = None #{field: {key: _Group}}
+        self.stale = {field: set() for field in self.fields}
+        self._lock = threading.Lock() #readers may build or refresh concurrently
+
+    def covers(self, group_by, metrics):
+        return group_by in self.fields and all(field is None or field in self.metric_fields for _, _, field in metrics)
+
+    def reset(self):
+        """Forget everything; rebuilt from the records on the next read"""
+        self.groups = None
+        for keys in self.stale.values():
+            keys.clear()
+
+    def add(self, record):
+        if self.groups is None or record is None:
+            return
+        for field in self.fields:
+            groups = self.groups[field]
+            for key in group_keys(record, field):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = _Group(self.metric_fields)
+                group.add(record)
+
+    def remove(self, record):
+        if self.groups is None or record is None:
+            return
+        for field in self.fields:
+            groups = self.groups[field]
+            for key in group_keys(record, field):
+                group = groups.get(key)
+                if group is None:
+                    continue
+                if group.remove(record):
+                    self.stale[field].add(key)
+                if not group.count:
+                    del groups[key]
+                    self.stale[field].discard(key)
+
+    def result(self, group_by, metrics, records, members):
+        """
+        format_groups of the rollup of group_by. records builds missing rollups,
+        members(field, key) lists the records of one group to refresh a stale one.
+        """
+        with self._lock:
+            if self.groups is None:
+                self.groups = {field: compute_groups(records, field, self.metric_fields) for field in self.fields}
+            groups, stale = self.groups[group_by], self.stale[group_by]
+            while stale:
+                key = stale.pop()
+                group = _Group(self.metric_fields)
+                for record in members(group_by, key):
+                    if key in group_keys(record, group_by):
+                        group.add(record)
+                if group.count:
+                    groups[key] = group
+                else:
+                    groups.pop(key, None)
+            return format_groups(groups, group_by, metrics)
+### <--------- INCREMENTAL Rollups ---------> ###
+
+#©Vardan Grigoryan
@@ -1,63 +1,246 @@
+import atexit
+import bisect
 import json
 import os
+import weakref
 from datetime import datetime
 
+_TS_STRIDE = 128 #one (timestamp, offset) sample every _TS_STRIDE entries in the sidecar index
+
+_open_loggers = weakref.WeakSet() #loggers not closed yet: flushed at exit without being kept alive
+
+@atexit.register
+def _flush_open_loggers():
+    for logger in list(_open_loggers):
+        logger.flush()
+
 class AuditLogger:
-    def __init__(self, log_path="project/data/audit/audit_log.json"):
+    """
+    Append-only JSON-lines audit log. Entries are never re-read on write: they are
+    buffered, written in groups of batch_size, and the active segment is sealed
+    once it grows past max_bytes. Every sealed segment gets a sidecar index
+    (offsets by movie_id + sparse timestamps), so history/changes_since only
+    open the segments and lines they need.
+    """
+    def __init__(self, log_path="project/data/audit/audit_log.jsonl", batch_size=1, max_bytes=64 * 1024 * 1024):
+        """
+            batch_size (int): entries buffered before one write (group commit), 1 = write through.
+            max_bytes (int): size after which the active segment is rotated.
+        """
         self.log_path = os.path.abspath(log_path)
-        
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+
+        self._stem = self.log_path[:-len(".jsonl")] if self.log_path.endswith(".jsonl") else self.log_path
+        self._buffer = []
+        self._segments = self._load_sealed_segments()
+
         #creating the file if it does not exist
         with open(self.log_path, 'a'):
             pass
+        self._active = self._scan_segment(self.log_path)
+        self._active_size = os.path.getsize(self.log_path)
 
-    def _read_logs(self):
-        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
-            return []
+        _open_loggers.add(self)
 
-        with open(self.log_path, 'r') as f:
-            content = f.read()
-        return json.loads(f'[{content}]')
 
+    ### <--------- SEGMENTS, SIDECAR INDEX ---------> ###
+    def _segment_path(self, number):
+        return f"{self._stem}.{number:06d}.jsonl"
 
-    def _write_logs(self, all_entries):
-        with open(self.log_path, 'w') as f:
-            for i, entry in enumerate(all_entries):
-                json.dump(entry, f, indent=4)
-                if i < len(all_entries) - 1:
-                    f.write(',\n')
-            f.write('\n')
+    def _new_segment_index(self, path):
+        return {"path": path, "first_ts": None, "last_ts": None, "movie_ids": {}, "timestamps": [], "count": 0}
 
+    def _index_entry(self, segment, entry, offset):
+        """Record one entry in the segment's index. O(1) amortized"""
+        ts = entry["timestamp"]
+        if segment["first_ts"] is None:
+            segment["first_ts"] = ts
+        segment["last_ts"] = ts
+        segment["movie_ids"].setdefault(entry["movie_id"], []).append(offset)
+        if segment["count"] % _TS_STRIDE == 0:
+            segment["timestamps"].append([ts, offset])
+        segment["count"] += 1
 
-    def _log_entry(self, entry):
+    def _scan_segment(self, path):
+        """
+        Build a segment index by reading it once. Used for the active segment at startup.
+        A torn last line (crash in the middle of a flush) is cut off the file, as in
+        WriteAheadLog.recover, so the next flush starts on a clean line.
+        """
+        segment = self._new_segment_index(path)
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break #torn write, everything after it is garbage
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index_entry(segment, entry, offset)
+                offset += len(line)
+
+        if offset != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        return segment
+
+    def _load_sealed_segments(self):
+        segments = []
+        number = 1
+        while os.path.exists(self._segment_path(number)):
+            path = self._segment_path(number)
+            sidecar_path = path[:-len(".jsonl")] + ".idx"
+            if os.path.exists(sidecar_path):
+                with open(sidecar_path, 'r') as f:
+                    segment = json.load(f)
+                #JSON object keys are strings, movie ids are ints
+                segment["movie_ids"] = {int(k): v for k, v in segment["movie_ids"].items()}
+                segment["path"] = path
+            else: #crash between sealing and writing the sidecar
+                segment = self._scan_segment(path)
+                self._write_sidecar(segment)
+            segments.append(segment)
+            number += 1
+        return segments
+
+    def _write_sidecar(self, segment):
+        sidecar_path = segment["path"][:-len(".jsonl")] + ".idx"
+        with open(sidecar_path, 'w') as f:
+            json.dump({k: v for k, v in segment.items() if k != "path"}, f)
+
+    def _rotate(self):
+        """Seal the active segment under the next number and start an empty one."""
+        sealed_path = self._segment_path(len(self._segments) + 1)
+        os.replace(self.log_path, sealed_path)
+        self._active["path"] = sealed_path
+        self._write_sidecar(self._active)
+        self._segments.append(self._active)
+
+        with open(self.log_path, 'w'):
+            pass
+        self._active = self._new_segment_index(self.log_path)
+        self._active_size = 0
+    ### <--------- SEGMENTS, SIDECAR INDEX ---------> ###
+
+
+    ### <--------- APPEND ---------> ###
+    def flush(self):
+        """Write every buffered entry with a single append. O(batch)"""
+        if not self._buffer:
+            return
+        with open(self.log_path, 'ab') as f:
+            f.write(b"".join(self._buffer))
+        self._buffer = []
+
+        if self._active_size >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        """Write the buffered entries; the logger is no longer flushed at exit."""
+        self.flush()
+        _open_loggers.discard(self)
+
+    def _buffer_entry(self, entry):
         entry["timestamp"] = datetime.now().isoformat()
-        
-        all_entries = self._read_logs()
-        all_entries.append(entry)
-        self._write_logs(all_entries)
 
-    def log_insertion(self, movie_id, movie_title):
-        entry = {
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        self._index_entry(self._active, entry, self._active_size)
+        self._active_size += len(line)
+        self._buffer.append(line)
+
+    def _log_entry(self, entry):
+        self._buffer_entry(entry)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+    ### <--------- APPEND ---------> ###
+
+
+    ### <--------- LOOKUPS ---------> ###
+    def _all_segments(self):
+        self.flush()
+        return self._segments + [self._active]
+
+    def history(self, movie_id):
+        """Every entry about movie_id, oldest first. Only reads the lines listed in the sidecar indices."""
+        result = []
+        for segment in self._all_segments():
+            offsets = segment["movie_ids"].get(movie_id)
+            if not offsets:
+                continue
+            with open(segment["path"], 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    result.append(json.loads(f.readline()))
+        return result
+
+    def changes_since(self, timestamp):
+        """Every entry logged at or after timestamp (ISO string), skipping segments that end before it."""
+        result = []
+        for segment in self._all_segments():
+            if segment["last_ts"] is None or segment["last_ts"] < timestamp:
+                continue
+            #last sample taken before timestamp -> first line that can be newer
+            samples = [ts for ts, _ in segment["timestamps"]]
+            i = bisect.bisect_left(samples, timestamp) - 1
+            start = segment["timestamps"][i][1] if i >= 0 else 0
+
+            with open(segment["path"], 'rb') as f:
+                f.seek(start)
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["timestamp"] >= timestamp:
+                        result.append(entry)
+        return result
+
+    def read_logs(self):
+        """Iterate over the full log, oldest first."""
+        for segment in self._all_segments():
+            with open(segment["path"], 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+    ### <--------- LOOKUPS ---------> ###
+
+
+    def log_batch(self, entries):
+        """Log many entries (built with the *_entry helpers) with a single write."""
+        for entry in entries:
+            self._buffer_entry(entry)
+        self.flush()
+
+
+    def insertion_entry(self, movie_id, movie_title):
+        return {
             "action": "INSERTED",
             "movie_id": movie_id,
             "title": movie_title,
         }
-        self._log_entry(entry)
 
-    def log_deletion(self, movie_id, movie_title):
-        entry = {
+    def deletion_entry(self, movie_id, movie_title):
+        return {
             "action": "REMOVED",
             "movie_id": movie_id,
             "title": movie_title,
         }
-        self._log_entry(entry)
 
-    def log_modification(self, movie_id, movie_title, changes):
-        entry = {
+    def modification_entry(self, movie_id, movie_title, changes):
+        return {
             "action": "MODIFIED",
             "movie_id": movie_id,
             "title": movie_title,
             "modifications": changes
         }
-        self._log_entry(entry)
 
-#©Vardan Grigoryan
\ No newline at end of file
+    def log_insertion(self, movie_id, movie_title):
+        self._log_entry(self.insertion_entry(movie_id, movie_title))
+
+    def log_deletion(self, movie_id, movie_title):
+        self._log_entry(self.deletion_entry(movie_id, movie_title))
+
+    def log_modification(self, movie_id, movie_title, changes):
+        self._log_entry(self.modification_entry(movie_id, movie_title, changes))
+
+#©Vardan Grigoryan
@@ -0,0 +1 @@
+"""Benchmarks for the Movies_DB storage, indices and query engine. Run the modules with python -m."""
@@ -0,0 +1,83 @@
+"""
+Compare two benchmarks.run result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+
+Every metric present in both files is compared. *_per_second metrics are better when higher;
+*_seconds, *_ms and *_mb metrics are better when lower; counts (rows, calls) are ignored.
+Prints one line per metric, worst change first; exits with status 1 if any metric got worse
+by more than the threshold (a fraction of the baseline value).
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("per_second",)
+LOWER_IS_BETTER = ("seconds", "_ms", "_mb")
+
+def _flatten(tree, prefix=""):
+    """{"10k": {"queries": {"search_by_id": {"p50_ms": 1}}}} -> {"10k/queries/search_by_id/p50_ms": 1}"""
+    flat = {}
+    for key, value in tree.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def _direction(metric):
+    """+1 when higher is better, -1 when lower is better, 0 for metrics that are not compared"""
+    name = metric.rsplit("/", 1)[-1]
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+def compare(baseline, candidate, threshold=0.10):
+    """[(metric, base, new, change)], change > 0 is an improvement; and the metrics regressed beyond threshold"""
+    base, new = _flatten(baseline["results"]), _flatten(candidate["results"])
+    rows, regressions = [], []
+    for metric in sorted(base.keys() & new.keys()):
+        direction = _direction(metric)
+        if not direction or not base[metric]:
+            continue
+        change = direction * (new[metric] - base[metric]) / base[metric]
+        rows.append((metric, base[metric], new[metric], change))
+        if change < -threshold:
+            regressions.append(metric)
+    rows.sort(key=lambda row: row[3])
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="tolerated relative slowdown")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    for label, document in (("baseline", baseline), ("candidate", candidate)):
+        meta = document.get("meta", {})
+        print(f"{label:9} {meta.get('commit')}{' (dirty)' if meta.get('dirty') else ''} {meta.get('timestamp')} "
+              f"python {meta.get('python')} on {meta.get('platform')}")
+    if baseline.get("meta", {}).get("platform") != candidate.get("meta", {}).get("platform"):
+        print("warning: the two runs come from different platforms")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    width = max((len(metric) for metric, *_ in rows), default=0)
+    for metric, old, new, change in rows:
+        flag = "REGRESSION" if metric in regressions else ("improved" if change > args.threshold else "")
+        print(f"{metric:{width}}  {old:14.6g} -> {new:<14.6g} {change:+8.1%}  {flag}")
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Load test of the local query service (service.py).
+
+    python -m benchmarks.load_service --data project/data --clients 32 --seconds 10 --write-ratio 0.1
+
+Starts `python service.py` on a free localhost port over a temporary copy of raw/movies.csv
+(or targets a running service with --connect host:port), then runs pipelining clients sending
+a mix of hot reads (coalescable), cold reads and mutations. Prints one JSON document with the
+throughput, the latency percentiles per kind of request, and the service's own counters
+(coalesced reads, mutations per group commit).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from service import ServiceClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HOT_GENRES = ["Drama", "Comedy", "Action"]
+
+def _request(rng, write_ratio, own):
+    """(kind, op, args) of the next request"""
+    if rng.random() < write_ratio:
+        if own and rng.random() < 0.4:
+            movie_id = rng.choice(own)
+            if rng.random() < 0.5:
+                return "write", "modify_movie", [movie_id, {"vote_average": round(rng.uniform(0, 10), 1)}]
+            own.remove(movie_id)
+            return "write", "delete_movie", [movie_id]
+        year = rng.randrange(1950, 2030)
+        movie = {"title": f"Load {rng.randrange(10 ** 6)}", "release_date": f"{year}-01-01", "genres": ["Drama"]}
+        return "write", "insert_movie", [movie]
+    choice = rng.random()
+    if choice < 0.5:
+        return "hot_read", "search_by_genre", [rng.choice(HOT_GENRES)]
+    if choice < 0.7:
+        return "read", "search_by_year", [rng.randrange(1950, 2030)]
+    if choice < 0.85:
+        low = round(rng.uniform(0, 9), 1)
+        return "read", "range_query", ["vote_average", low, low + 0.5]
+    return "read", "query", [{"and": [{"eq": ["genres", rng.choice(HOT_GENRES)]}, {"range": ["year", 1990, 2010]}]}]
+
+
+async def _client(host, port, seed, deadline, pipeline, write_ratio, latencies, errors):
+    rng = random.Random(seed)
+    own = []
+
+    async def one(client):
+        kind, op, args = _request(rng, write_ratio, own)
+        start = time.perf_counter()
+        try:
+            result = await client.call(op, *args)
+        except ValueError as exc:
+            errors.append(str(exc))
+            return
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        if op == "insert_movie":
+            own.append(result)
+
+    async with ServiceClient(host, port) as client:
+        async def lane():
+            while time.perf_counter() < deadline:
+                await one(client)
+        await asyncio.gather(*[lane() for _ in range(pipeline)])
+        return await client.call("stats")
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": samples[-1] * 1000}
+
+
+async def _load(host, port, clients, pipeline, seconds, write_ratio):
+    latencies, errors = {}, []
+    start = time.perf_counter()
+    stats = await asyncio.gather(*[
+        _client(host, port, seed, start + seconds, pipeline, write_ratio, latencies, errors) for seed in range(clients)
+    ])
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "pipeline": pipeline,
+        "seconds": elapsed,
+        "requests_per_second": sum(len(samples) for samples in latencies.values()) / elapsed,
+        "latency": {kind: _percentiles(samples) for kind, samples in sorted(latencies.items())},
+        "errors": errors[:10],
+        "error_count": len(errors),
+        "service": max(stats, key=lambda s: s["requests"]), #counters read by the last client to finish
+    }
+
+
+def _start_service(data, workers, batch_window):
+    """Run service.py over a copy of data/raw/movies.csv; returns (process, port, directory)"""
+    directory = tempfile.mkdtemp(prefix="movies_service_")
+    os.makedirs(os.path.join(directory, "raw"))
+    shutil.copy(os.path.join(data, "raw", "movies.csv"), os.path.join(directory, "raw", "movies.csv"))
+    process = subprocess.Popen(
+        [sys.executable, "service.py", "--data", directory, "--port", "0", "--workers", str(workers),
+         "--batch-window", str(batch_window)],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith("listening on "):
+            return process, int(line.split()[2].rsplit(":", 1)[1]), directory
+    process.wait()
+    shutil.rmtree(directory, ignore_errors=True)
+    raise RuntimeError(f"service.py exited with status {process.returncode}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="project/data", help="data directory holding raw/movies.csv")
+    parser.add_argument("--connect", help="host:port of a running service instead of starting one")
+    parser.add_argument("--clients", type=int, default=32, help="connections")
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight per connection")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=4, help="read threads of the started service")
+    parser.add_argument("--batch-window", type=float, default=0.002, help="group commit window of the started service")
+    args = parser.parse_args(argv)
+
+    process = directory = None
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        port = int(port)
+    else:
+        host = "127.0.0.1"
+        process, port, directory = _start_service(os.path.abspath(args.data), args.workers, args.batch_window)
+    try:
+        result = asyncio.run(_load(host, port, args.clients, args.pipeline, args.seconds, args.write_ratio))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(directory, ignore_errors=True)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
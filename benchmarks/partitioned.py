@@ -0,0 +1,98 @@
+"""
+Throughput of partitioning.PartitionedQueryEngine against one QueryEngine.
+
+    python -m benchmarks.partitioned --data project/data --partitions 1 2 4 8 --clients 8 --seconds 5
+
+Copies raw/movies.csv of the data directory to a temporary directory, then for every workload
+runs client threads issuing the same query for --seconds against a thread-safe single-process
+engine and against each partition count. Prints one JSON document with the queries per second
+of each (engine, workload) pair and the speedup over the single engine.
+The partitions only run in parallel on as many cores: on one core the numbers measure the
+scatter-gather overhead, not the scaling. That overhead is mostly pickling the matching records
+through the pipes (about 10 µs per record), so wide results (search_by_genre, range_query) gain
+the least and selective CPU-bound queries (query_selective, aggregate_scan) the most.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from query_planner import Eq, Range
+
+WORKLOADS = {
+    "search_by_id": lambda engine, i: engine.search_by_id(i % 1000),
+    "search_by_genre": lambda engine, i: engine.search_by_genre(("Drama", "Comedy", "Horror", "Documentary")[i % 4]),
+    "range_query": lambda engine, i: engine.range_query("vote_average", 7 + i % 3 * 0.5, 9),
+    "query_selective": lambda engine, i: engine.query(Eq("original_language", ("fr", "ja", "de")[i % 3]) & Range("vote_average", 8)),
+    "search_text": lambda engine, i: engine.search_text(("love story", "war hero", "space alien")[i % 3], 10),
+    "aggregate_scan": lambda engine, i: engine.aggregate("original_language", ["count", "avg:vote_average"]),
+}
+
+
+def _throughput(engine, query, clients, seconds):
+    """Queries per second of `clients` threads calling query(engine, i) until the deadline"""
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(c):
+        i = c
+        while time.perf_counter() < deadline:
+            query(engine, i)
+            i += clients
+            counts[c] += 1
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="project/data", help="data directory holding raw/movies.csv")
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--scheme", choices=["hash", "year"], default="hash")
+    parser.add_argument("--clients", type=int, default=8, help="client threads per run")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    args = parser.parse_args(argv)
+
+    from database import Database
+    from partitioning import PartitionedQueryEngine
+
+    csv_path = os.path.join(args.data, "raw", "movies.csv")
+    workdir = tempfile.mkdtemp(prefix="movies_db_partitioned_")
+    results = {"cpus": os.cpu_count(), "clients": args.clients, "scheme": args.scheme, "queries_per_second": {}}
+    try:
+        single = Database(os.path.join(workdir, "single"), csv_path=csv_path, thread_safe=True)
+        results["movies"] = len(single.records)
+        results["queries_per_second"]["single"] = {
+            name: _throughput(single.engine, WORKLOADS[name], args.clients, args.seconds) for name in args.workloads
+        }
+        single.close()
+
+        for n in args.partitions:
+            with PartitionedQueryEngine(os.path.join(workdir, f"partitioned_{n}"), partitions=n, scheme=args.scheme,
+                                        csv_path=csv_path) as engine:
+                results["queries_per_second"][f"partitions_{n}"] = {
+                    name: _throughput(engine, WORKLOADS[name], args.clients, args.seconds) for name in args.workloads
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = results["queries_per_second"]["single"]
+    results["speedup"] = {
+        label: {name: rates[name] / base[name] if base[name] else None for name in rates}
+        for label, rates in results["queries_per_second"].items() if label != "single"
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
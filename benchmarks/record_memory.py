@@ -0,0 +1,72 @@
+"""
+Memory and pickle size of the records under each storage backend.
+
+    python -m benchmarks.record_memory --data project/data --backends dict compact columnar
+
+Every backend runs in a fresh interpreter: movies.csv of the data directory is parsed into that
+backend's records, which are then measured (Python heap with tracemalloc, pickle size, pickling
+and unpickling time, search_by_id-style lookups). Prints one JSON document, with each backend's
+memory and pickle size also as a ratio of the dict backend's.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEASURE_SNIPPET = """
+import gc, json, pickle, time, tracemalloc
+from STORAGE import STORAGE_DATASET
+tracemalloc.start()
+storage = STORAGE_DATASET({csv_path!r}, "unused.pkl", backend={backend!r})
+records = storage.load_movie_csv()
+gc.collect()
+records_bytes = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+t0 = time.perf_counter()
+blob = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+t1 = time.perf_counter()
+loaded = pickle.loads(blob)
+t2 = time.perf_counter()
+ids = list(records)[::7]
+t3 = time.perf_counter()
+for movie_id in ids:
+    loaded.get(movie_id)
+t4 = time.perf_counter()
+print(json.dumps({{
+    "movies": len(records),
+    "records_mb": records_bytes / 2**20,
+    "bytes_per_movie": records_bytes / max(len(records), 1),
+    "pickle_mb": len(blob) / 2**20,
+    "dumps_seconds": t1 - t0,
+    "loads_seconds": t2 - t1,
+    "lookup_us": (t4 - t3) / max(len(ids), 1) * 1e6,
+}}))
+"""
+
+def measure(csv_path, backend):
+    snippet = _MEASURE_SNIPPET.format(csv_path=os.path.abspath(csv_path), backend=backend)
+    done = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="project/data", help="data directory holding raw/movies.csv")
+    parser.add_argument("--backends", nargs="+", default=["dict", "compact", "columnar"])
+    args = parser.parse_args(argv)
+
+    csv_path = os.path.join(args.data, "raw", "movies.csv")
+    results = {backend: measure(csv_path, backend) for backend in args.backends}
+    base = results.get("dict")
+    if base is not None:
+        for metrics in results.values():
+            metrics["records_vs_dict"] = metrics["records_mb"] / base["records_mb"]
+            metrics["pickle_vs_dict"] = metrics["pickle_mb"] / base["pickle_mb"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
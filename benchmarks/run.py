@@ -0,0 +1,309 @@
+"""
+Benchmark suite: CSV load, index build, cold start, queries and mutations on synthetic catalogs.
+
+    python -m benchmarks.run --sizes 10k,100k --out results.json
+    python -m benchmarks.compare baseline.json results.json
+
+For every size, a synthetic movies.csv (benchmarks.synthetic, cached in --work between runs)
+is copied to a fresh data directory and each phase runs in its own interpreter, in order:
+    csv_load     parse movies.csv into records, pickle them
+    index_build  build every MovieIndex index from the records, pickle them
+    cold_start   open_database on the pickles up to the first queries
+    queries      point (search_by_*), range (range_query, search_by_year_range) and prefix
+                 (get_keys_with_prefix, autocomplete), typo-tolerant title (search_by_title_fuzzy)
+                 lookups with seeded arguments, and aggregates
+                 from the rollups (genres) and computed over every movie (original_language)
+    mutations    insert/modify/delete one at a time (WAL fsync each) and in batches
+Each phase reports its timings and the peak RSS of its process. The JSON output carries the
+commit and platform, so results of two commits can be compared with benchmarks.compare.
+--instrument runs every phase with instrumentation.enable(): comparing a run with and without
+it measures the overhead of the instrumentation.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate, parse_rows
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ["csv_load", "index_build", "cold_start", "queries", "mutations"]
+QUERY_BUDGET = 1.0  #seconds spent on each query operation at most
+QUERY_REPEAT = 2000 #calls of each query operation at most
+MUTATIONS = 300     #single mutations of each kind
+BATCH = 1000        #movies per insert_many / delete_many
+AGGREGATE_METRICS = ["count", "avg:vote_average", "sum:revenue"]
+
+def _peak_rss_mb():
+    """Peak resident memory of this process, None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 #bytes on macOS, KiB elsewhere
+
+def _timed(fn, arguments, budget=QUERY_BUDGET):
+    """Call fn(*args) for each args until the budget runs out: throughput and latency percentiles"""
+    latencies = []
+    started = time.perf_counter()
+    for args in arguments:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+        if start - started > budget:
+            break
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "ops_per_second": len(latencies) / sum(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+### <--------- PHASES ---------> ###
+#each runs in a fresh interpreter (python -m benchmarks.run --phase NAME --data DIR) and returns its metrics
+def phase_csv_load(data, workers):
+    from STORAGE import STORAGE_DATASET
+    storage = STORAGE_DATASET(os.path.join(data, "raw", "movies.csv"), os.path.join(data, "pickle", "records_dic.pkl"))
+    storage.load_movie_csv(workers=workers)
+    start = time.perf_counter()
+    storage.save_DATASET_pickle()
+    return {
+        "rows": storage.load_stats["rows"],
+        "parse_seconds": storage.load_stats["seconds"],
+        "rows_per_second": storage.load_stats["rows_per_sec"],
+        "pickle_seconds": time.perf_counter() - start,
+    }
+
+def phase_index_build(data, workers):
+    from STORAGE import STORAGE_DATASET
+    from indexing import MovieIndex
+    storage = STORAGE_DATASET(os.path.join(data, "raw", "movies.csv"), os.path.join(data, "pickle", "records_dic.pkl"))
+    records = storage.load_DATASET_final()
+    start = time.perf_counter()
+    index = MovieIndex(os.path.join(data, "pickle", "indices_avl.pkl"), dataset=records, wal_lsn=storage.wal_lsn,
+                       build_workers=workers)
+    total = time.perf_counter() - start
+    build = sum(index.build_times.values())
+    result = {"build_seconds": build, "pickle_seconds": total - build}
+    result.update({f"{name}_seconds": seconds for name, seconds in index.build_times.items()})
+    return result
+
+def phase_cold_start(data, workers):
+    t0 = time.perf_counter()
+    from database import open_database
+    db = open_database(data)
+    db.records
+    t1 = time.perf_counter()
+    db.index
+    t2 = time.perf_counter()
+    engine = db.engine
+    t3 = time.perf_counter()
+    engine.search_by_genre("Drama")
+    t4 = time.perf_counter()
+    engine.search_by_title("The Last Night")
+    t5 = time.perf_counter()
+    return {
+        "load_records_seconds": t1 - t0,
+        "open_index_seconds": t2 - t1,
+        "open_engine_seconds": t3 - t2,
+        "first_genre_query_seconds": t4 - t3,
+        "first_title_query_seconds": t5 - t4,
+        "total_seconds": t5 - t0,
+    }
+
+def _typo(title, rng):
+    """title with one character replaced, dropped or doubled"""
+    if not title:
+        return title
+    i = rng.randrange(len(title))
+    return title[:i] + rng.choice(("x", "", title[i] * 2)) + title[i + 1:]
+
+def phase_queries(data, workers):
+    from database import open_database
+    from benchmarks.synthetic import GENRE_WEIGHTS
+    db = open_database(data)
+    engine, records = db.engine, db.records
+    rng = random.Random(0)
+    ids = rng.sample(sorted(records), min(QUERY_REPEAT, len(records)))
+    titles = [records[movie_id]["title"] for movie_id in ids]
+    prefixes = [title[:3] for title in titles]
+    typos = [_typo(title, rng) for title in titles]
+    years = [rng.randint(1950, 2024) for _ in ids]
+    engine.search_by_year(2000), engine.autocomplete("a"), engine.range_query("vote_average", 5, 6) #load every index
+    engine.search_by_title_fuzzy("a")
+    engine.aggregate("genres", AGGREGATE_METRICS) #builds the rollups
+
+    return {
+        "search_by_id": _timed(engine.search_by_id, [(i,) for i in ids]),
+        "search_by_title": _timed(engine.search_by_title, [(title,) for title in titles]),
+        "search_by_year": _timed(engine.search_by_year, [(year,) for year in years]),
+        "search_by_genre": _timed(engine.search_by_genre, [(rng.choice(list(GENRE_WEIGHTS)),) for _ in ids]),
+        "search_by_year_range": _timed(engine.search_by_year_range, [(year, year + 2) for year in years]),
+        "range_query_vote_average": _timed(engine.range_query, [("vote_average", low, low + 0.1) for low in
+                                                              (round(rng.uniform(0, 9.9), 1) for _ in ids)]),
+        "range_query_revenue": _timed(engine.range_query, [("revenue", low, low * 2) for low in
+                                                         (rng.randint(10 ** 5, 10 ** 9) for _ in ids)]),
+        "get_keys_with_prefix": _timed(engine.title_idx.get_keys_with_prefix, [(prefix,) for prefix in prefixes]),
+        "autocomplete": _timed(engine.autocomplete, [(prefix.lower(),) for prefix in prefixes]),
+        "search_by_title_fuzzy": _timed(engine.search_by_title_fuzzy, [(typo,) for typo in typos]),
+        "aggregate_rollup": _timed(engine.aggregate, [("genres", AGGREGATE_METRICS)] * len(ids)),
+        "aggregate_scan": _timed(engine.aggregate, [("original_language", AGGREGATE_METRICS)] * len(ids)),
+    }
+
+def phase_mutations(data, workers):
+    from database import open_database
+    db = open_database(data, checkpoint_every=10 ** 9) #no checkpoint inside the timings
+    engine = db.engine
+    rng = random.Random(0)
+
+    def movie(i):
+        return {"title": f"Benchmark {i}", "release_date": f"{rng.randint(1950, 2024)}-01-01",
+                "genres": rng.sample(["Drama", "Comedy", "Action", "Horror"], 2), "vote_average": rng.uniform(0, 10)}
+
+    result = {}
+    start = time.perf_counter()
+    keys = [engine.insert_movie(movie(i)) for i in range(MUTATIONS)]
+    result["insert_movie_per_second"] = MUTATIONS / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for key in keys:
+        engine.modify_movie(key, {"genres": ["Western"], "vote_average": rng.uniform(0, 10)})
+    result["modify_movie_per_second"] = MUTATIONS / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for key in keys:
+        engine.delete_movie(key)
+    result["delete_movie_per_second"] = MUTATIONS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    keys = engine.insert_many(movie(i) for i in range(BATCH))
+    result["insert_many_per_second"] = BATCH / (time.perf_counter() - start)
+    start = time.perf_counter()
+    engine.delete_many(keys)
+    result["delete_many_per_second"] = BATCH / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    engine.checkpoint()
+    result["checkpoint_seconds"] = time.perf_counter() - start
+    db.close()
+    return result
+### <--------- PHASES ---------> ###
+
+
+def _run_phase(phase, data, workers, instrument=False):
+    """Run one phase in a fresh interpreter, return its metrics plus its peak RSS"""
+    done = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--phase", phase, "--data", data] + (["--workers", str(workers)] if workers else [])
+        + (["--instrument"] if instrument else []),
+        cwd=REPO_ROOT, capture_output=True, text=True)
+    if done.returncode:
+        raise RuntimeError(f"phase {phase} failed:\n{done.stderr}")
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(dirty.stdout.strip())
+
+
+def run(sizes, work, seed, workers, phases, repeat, instrument=False):
+    results = {}
+    for size in sizes:
+        rows = parse_rows(size)
+        csv_path = os.path.join(work, f"movies_{rows}_{seed}.csv")
+        if not os.path.exists(csv_path): #generating 10M rows takes minutes: kept between runs
+            generate(csv_path + ".tmp", rows, seed)
+            os.replace(csv_path + ".tmp", csv_path)
+
+        samples = {phase: [] for phase in phases}
+        for _ in range(repeat):
+            data = tempfile.mkdtemp(prefix="movies_bench_", dir=work)
+            try:
+                os.makedirs(os.path.join(data, "raw"))
+                os.makedirs(os.path.join(data, "pickle"))
+                try:
+                    os.link(csv_path, os.path.join(data, "raw", "movies.csv"))
+                except OSError: #no hard links on this file system
+                    shutil.copy(csv_path, os.path.join(data, "raw", "movies.csv"))
+                for phase in PHASES: #every phase needs the files of the previous ones
+                    metrics = _run_phase(phase, data, workers, instrument)
+                    if phase in samples:
+                        samples[phase].append(metrics)
+            finally:
+                shutil.rmtree(data, ignore_errors=True)
+        results[size] = {phase: _median(runs) for phase, runs in samples.items()}
+    return results
+
+
+def _median(runs):
+    """Metric by metric median of the repeated runs of one phase"""
+    if isinstance(runs[0], dict):
+        return {key: _median([run[key] for run in runs]) for key in runs[0]}
+    return statistics.median(runs) if isinstance(runs[0], (int, float)) else runs[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated catalog sizes, e.g. 10k,100k,1M,10M")
+    parser.add_argument("--phases", default=",".join(PHASES))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="processes for the CSV load and the index build")
+    parser.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "movies_db_bench"),
+                        help="directory for the generated catalogs (kept) and the data directories (removed)")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    parser.add_argument("--instrument", action="store_true", help="run the phases with the hot path instrumentation enabled")
+    parser.add_argument("--phase", choices=PHASES, help=argparse.SUPPRESS) #internal: run one phase
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.phase:
+        if args.instrument:
+            import instrumentation
+            instrumentation.enable()
+        metrics = globals()[f"phase_{args.phase}"](args.data, args.workers)
+        metrics["peak_rss_mb"] = _peak_rss_mb()
+        print(json.dumps(metrics))
+        return
+
+    os.makedirs(args.work, exist_ok=True)
+    commit, dirty = _git_commit()
+    document = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "instrument": args.instrument,
+        },
+        "results": run(args.sizes.split(","), args.work, args.seed, args.workers, args.phases.split(","), args.repeat,
+                       args.instrument),
+    }
+    text = json.dumps(document, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Import-time and cold-start benchmark.
+
+    python -m benchmarks.startup --data project/data --repeat 5
+
+Every sample runs in a fresh interpreter, so nothing stays cached between runs.
+Prints one JSON document with the median seconds of each step.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTED_MODULES = ["STORAGE", "indexing", "query_engine", "database"]
+
+_IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+"""
+
+_COLD_START_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+from database import open_database
+db = open_database({path!r})
+t1 = time.perf_counter()
+db.records
+t2 = time.perf_counter()
+db.index
+t3 = time.perf_counter()
+db.engine.search_by_genre("Drama")
+t4 = time.perf_counter()
+db.engine.search_by_title("The Matrix")
+t5 = time.perf_counter()
+print(json.dumps({{
+    "open_database": t1 - t0,
+    "load_records": t2 - t1,
+    "open_index": t3 - t2,
+    "first_genre_query": t4 - t3,
+    "first_title_query": t5 - t4,
+    "total": t5 - t0,
+}}))
+"""
+
+def _run(snippet):
+    """Run snippet in a fresh interpreter from the repository root, return its last output line"""
+    done = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return done.stdout.strip().splitlines()[-1]
+
+
+def bench_imports(repeat):
+    return {
+        module: statistics.median(float(_run(_IMPORT_SNIPPET.format(module=module))) for _ in range(repeat))
+        for module in IMPORTED_MODULES
+    }
+
+
+def bench_cold_start(path, repeat):
+    samples = [json.loads(_run(_COLD_START_SNIPPET.format(path=os.path.abspath(path)))) for _ in range(repeat)]
+    return {step: statistics.median(sample[step] for sample in samples) for step in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="project/data", help="data directory passed to open_database")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(json.dumps({
+        "import_seconds": bench_imports(args.repeat),
+        "cold_start_seconds": bench_cold_start(args.data, args.repeat),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
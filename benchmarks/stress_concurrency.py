@@ -0,0 +1,234 @@
+"""
+Concurrency stress test for concurrency.ThreadSafeQueryEngine.
+
+    python -m benchmarks.stress_concurrency --data project/data --readers 8 --writers 2 --seconds 10
+
+Copies raw/movies.csv of the data directory to a temporary directory, then runs reader threads
+(lookups, index/record consistency checks, paging) against writer threads (single and batched
+inserts, modifies, deletes) with frequent checkpoints. At the end the live indices are compared
+with indices rebuilt from the records, and again after reopening the directory from disk.
+Prints one JSON document; exits with status 1 if any check failed.
+
+Reader and writer threads share the GIL: with many CPU-bound readers the write rate mostly
+measures GIL hand-offs, not lock waits. --switch-interval 0.00001 makes thread switches (and so
+the interleavings the checks can catch) far more frequent.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+GENRES = ["Drama", "Comedy", "Thriller", "Action", "Romance", "Horror", "Documentary", "Stress"]
+
+def _random_movie(rng, tag):
+    return {
+        "title": f"Stress {tag} {rng.randrange(1000)}",
+        "release_date": f"{rng.randrange(1950, 2030)}-01-01",
+        "genres": rng.sample(GENRES, rng.randrange(1, 4)),
+        "vote_average": round(rng.uniform(0, 10), 1),
+        "popularity": rng.uniform(0, 100),
+    }
+
+def _year(record):
+    date = record.get("release_date") or ""
+    return int(date[:4]) if len(date) >= 4 and date[:4].isdigit() else None
+
+
+### <--------- CHECKS ---------> ###
+def _ids(value):
+    """IDs stored under one index key: a bare ID (unique title) or a PostingList"""
+    if value is None:
+        return set()
+    return {value} if isinstance(value, int) else set(value)
+
+def _check_record(engine, movie_id):
+    """Under one read lock: a record in by_id is in every index entry it should be in"""
+    with engine.lock.read():
+        record = engine.by_id.get(movie_id)
+        if record is None:
+            return None
+        for genre in record["genres"]:
+            if movie_id not in _ids(engine.genre_idx.get(genre)):
+                return f"movie {movie_id} missing from genre {genre!r}"
+        year = _year(record)
+        if year is not None and movie_id not in _ids(engine.year_idx.get(year)):
+            return f"movie {movie_id} missing from year {year}"
+        if movie_id not in _ids(engine.title_idx.get(record["title"])):
+            return f"movie {movie_id} missing from title {record['title']!r}"
+    return None
+
+def _tree_contents(tree):
+    contents = {}
+    for entry in tree.entry_set():
+        ids = _ids(entry.get_value())
+        if ids:
+            contents[entry.get_key()] = ids
+    return contents
+
+def compare_indices(engine):
+    """Differences between the live title/year/genre trees and trees rebuilt from by_id"""
+    from indexing import build_indices
+    fresh = build_indices(engine.by_id, ["AVL_title", "AVL_year", "AVL_genre"])
+    errors = []
+    for name in fresh:
+        if _tree_contents(getattr(engine.indexer, name)) != _tree_contents(fresh[name]):
+            errors.append(f"{name} differs from a rebuild")
+    return errors
+### <--------- CHECKS ---------> ###
+
+
+### <--------- WORKERS ---------> ###
+def reader(engine, stop, seed, stats, errors, writing):
+    rng = random.Random(seed)
+    ops = 0
+    while not stop.is_set():
+        try:
+            choice = rng.random()
+            if choice < 0.4:
+                if writing and rng.random() < 0.5:
+                    movie_id = writing[-1] #the movie a writer is changing right now
+                else:
+                    next_key = engine.storager.getter_next_key_to_insert()
+                    low = 1 if rng.random() < 0.5 else max(1, next_key - 100) #half of the checks on the recent, written-to IDs
+                    movie_id = rng.randrange(low, next_key)
+                error = _check_record(engine, movie_id)
+                if error:
+                    errors.append(error)
+            elif choice < 0.6:
+                genre = rng.choice(GENRES)
+                if any(genre not in record["genres"] for record in engine.search_by_genre(genre)):
+                    errors.append(f"search_by_genre({genre!r}) returned another genre")
+            elif choice < 0.75:
+                year = rng.randrange(1950, 2030)
+                if any(_year(record) != year for record in engine.search_by_year(year)):
+                    errors.append(f"search_by_year({year}) returned another year")
+            elif choice < 0.9:
+                low = rng.uniform(0, 9)
+                records = engine.range_query("vote_average", low, low + 1)
+                if any(not low <= record["vote_average"] <= low + 1 for record in records):
+                    errors.append(f"range_query(vote_average, {low}, {low + 1}) out of range")
+            else:
+                genre, cursor = rng.choice(GENRES), None
+                for _ in range(5):
+                    records, cursor = engine.page_by_genre(genre, limit=50, cursor=cursor)
+                    for record in records:
+                        if genre not in record["genres"]:
+                            errors.append(f"page_by_genre({genre!r}) returned another genre")
+                    if cursor is None:
+                        break
+        except Exception as exc:
+            errors.append(f"reader {seed}: {exc!r}")
+            break
+        ops += 1
+    stats["reads"].append(ops)
+
+def writer(engine, stop, seed, stats, errors, writing):
+    rng = random.Random(seed)
+    own = [] #IDs inserted by this writer, the only ones it modifies or deletes
+    ops = 0
+    while not stop.is_set():
+        choice = rng.random()
+        try:
+            if choice < 0.35 or not own:
+                own.append(engine.insert_movie(_random_movie(rng, seed)))
+            elif choice < 0.45:
+                own.extend(engine.insert_many([_random_movie(rng, seed) for _ in range(rng.randrange(2, 20))]))
+            elif choice < 0.75:
+                movie_id = rng.choice(own)
+                writing.append(movie_id)
+                new = _random_movie(rng, seed)
+                engine.modify_movie(movie_id, {"genres": new["genres"], "release_date": new["release_date"]})
+            elif choice < 0.9:
+                own.remove(movie_id := rng.choice(own))
+                engine.delete_movie(movie_id)
+            else:
+                batch = rng.sample(own, min(len(own), rng.randrange(1, 10)))
+                for movie_id in batch:
+                    own.remove(movie_id)
+                engine.delete_many(batch)
+        except Exception as exc:
+            errors.append(f"writer {seed}: {exc!r}")
+            break
+        ops += 1
+    stats["writes"].append(ops)
+### <--------- WORKERS ---------> ###
+
+
+def run(data, readers, writers, seconds, checkpoint_every, backend):
+    from database import open_database
+    from result_cache import ResultCache
+
+    directory = tempfile.mkdtemp(prefix="movies_stress_")
+    try:
+        os.makedirs(os.path.join(directory, "raw"))
+        shutil.copy(os.path.join(data, "raw", "movies.csv"), os.path.join(directory, "raw", "movies.csv"))
+        db = open_database(directory, checkpoint_every=checkpoint_every, backend=backend,
+                           result_cache=ResultCache(), thread_safe=True)
+        engine = db.engine
+
+        stop = threading.Event()
+        stats = {"reads": [], "writes": []} #operations per thread
+        errors = []
+        writing = deque(maxlen=writers) #IDs the writers are modifying, checked by the readers while it happens
+        threads = [threading.Thread(target=reader, args=(engine, stop, i, stats, errors, writing)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(engine, stop, 1000 + i, stats, errors, writing)) for i in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        errors += compare_indices(engine)
+        records = dict(engine.by_id.items())
+        db.close()
+
+        reopened = open_database(directory, backend=backend, thread_safe=True)
+        if dict(reopened.engine.by_id.items()) != records:
+            errors.append("records differ after reopening")
+        errors += [f"after reopening: {error}" for error in compare_indices(reopened.engine)]
+        reopened.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "readers": readers,
+        "writers": writers,
+        "seconds": elapsed,
+        "reads_per_second": sum(stats["reads"]) / elapsed,
+        "writes_per_second": sum(stats["writes"]) / elapsed,
+        "records": len(records),
+        "errors": errors[:20],
+        "error_count": len(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="project/data", help="data directory holding raw/movies.csv")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--checkpoint-every", type=int, default=200)
+    parser.add_argument("--backend", default="dict", choices=["dict", "columnar", "compact", "snapshot"])
+    parser.add_argument("--switch-interval", type=float, help="sys.setswitchinterval for the run")
+    args = parser.parse_args(argv)
+
+    if args.switch_interval:
+        sys.setswitchinterval(args.switch_interval)
+
+    result = run(os.path.abspath(args.data), args.readers, args.writers, args.seconds, args.checkpoint_every, args.backend)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["error_count"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Synthetic movies.csv generator with the columns of the TMDB dataset.
+
+    python -m benchmarks.synthetic --rows 1M --out /tmp/movies_1M.csv --seed 0
+
+The same (rows, seed) always produces the same file. Distributions are skewed like the real
+catalog: a few genres hold most movies, release years pile up towards the present, vote counts,
+popularity and revenue are heavy-tailed, and some titles repeat (remakes). Quoted multi-line
+overviews, accented titles and missing values exercise the loader's slow paths.
+Rows are streamed to disk, so memory stays flat at any size.
+"""
+import argparse
+import csv
+import random
+
+COLUMNS = [
+    "id", "title", "vote_average", "vote_count", "status", "release_date", "revenue", "runtime", "adult",
+    "backdrop_path", "budget", "homepage", "imdb_id", "original_language", "original_title", "overview",
+    "popularity", "poster_path", "tagline", "genres", "production_companies", "production_countries",
+    "spoken_languages", "keywords",
+]
+
+#roughly the TMDB genre frequencies
+GENRE_WEIGHTS = {
+    "Drama": 27, "Comedy": 17, "Documentary": 12, "Thriller": 7, "Horror": 7, "Romance": 6, "Action": 6,
+    "Animation": 5, "Crime": 4, "Music": 3, "Family": 3, "Adventure": 3, "Science Fiction": 3, "Fantasy": 2.5,
+    "Mystery": 2, "History": 1.5, "TV Movie": 1.5, "War": 1, "Western": 0.8,
+}
+GENRE_COUNT_WEIGHTS = [15, 40, 30, 10, 5]  #movies with 0, 1, 2, 3, 4 genres
+LANGUAGE_WEIGHTS = {"en": 50, "fr": 7, "es": 6, "de": 5, "ja": 5, "it": 4, "ru": 3, "pt": 3, "zh": 3, "ko": 2, "hi": 2, "sv": 1}
+STATUS_WEIGHTS = {"Released": 97, "Post Production": 1, "In Production": 1, "Planned": 0.5, "Rumored": 0.3, "Canceled": 0.2}
+COUNTRIES = ["United States of America", "France", "United Kingdom", "Germany", "Japan", "India", "Canada", "Italy", "Spain"]
+LANGUAGES = ["English", "Français", "Español", "Deutsch", "日本語", "Italiano", "Русский"]
+
+WORDS = (
+    "love war night day city dream house blood last first dark light secret story man woman girl boy king queen "
+    "world life death time road river sea star space moon sun fire ice storm ghost killer game heart return rise "
+    "fall edge shadow silence memory island hotel family summer winter paradise revenge escape wild lost"
+).split()
+ACCENTED = ["Amélie", "Café", "Über", "Señor", "Noël", "Mañana", "Façade", "Résumé"]
+YEAR_MAX = 2024
+YEAR_MIN = 1874
+
+def _weighted(weights):
+    return list(weights), list(weights.values())
+
+
+class CatalogGenerator:
+    """Deterministic stream of CSV rows; row(i) must be called with i = 0, 1, 2, ..."""
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.genres, self.genre_weights = _weighted(GENRE_WEIGHTS)
+        self.languages, self.language_weights = _weighted(LANGUAGE_WEIGHTS)
+        self.statuses, self.status_weights = _weighted(STATUS_WEIGHTS)
+        self.companies = [f"{self.rng.choice(WORDS).title()} {suffix}" for suffix in
+                          ("Pictures", "Films", "Studios", "Entertainment", "Productions") for _ in range(100)]
+        self.recent_titles = [] #remakes reuse one of these
+
+    def _title(self):
+        rng = self.rng
+        if self.recent_titles and rng.random() < 0.05:
+            return rng.choice(self.recent_titles)
+        words = [rng.choice(WORDS).title() for _ in range(rng.choice((1, 2, 2, 3, 3, 4)))]
+        if rng.random() < 0.03:
+            words[rng.randrange(len(words))] = rng.choice(ACCENTED)
+        if rng.random() < 0.3:
+            words.insert(0, "The")
+        title = " ".join(words)
+        if rng.random() < 0.1:
+            title += f" {rng.randrange(2, 6)}" #sequels
+        if len(self.recent_titles) < 1000:
+            self.recent_titles.append(title)
+        else:
+            self.recent_titles[rng.randrange(1000)] = title
+        return title
+
+    def _genres(self):
+        count = self.rng.choices(range(len(GENRE_COUNT_WEIGHTS)), GENRE_COUNT_WEIGHTS)[0]
+        picked = []
+        while len(picked) < count:
+            genre = self.rng.choices(self.genres, self.genre_weights)[0]
+            if genre not in picked:
+                picked.append(genre)
+        return ", ".join(picked)
+
+    def _text(self, low, high):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def row(self, i):
+        rng = self.rng
+        title = self._title()
+        if rng.random() < 0.08:
+            release_date = ""
+        else:
+            year = max(YEAR_MIN, YEAR_MAX - int(rng.expovariate(1 / 15)))
+            release_date = f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        vote_count = int(rng.paretovariate(1.2)) - 1
+        vote_average = 0 if vote_count == 0 else round(min(10.0, max(0.0, rng.gauss(6.2, 1.3))), 3)
+        has_money = rng.random() < 0.08
+        overview = self._text(10, 40).capitalize() + "."
+        if rng.random() < 0.05:
+            overview += '\nThey said "it ends tonight", and, it did.'
+        return [
+            i + 1,
+            title,
+            vote_average,
+            vote_count,
+            rng.choices(self.statuses, self.status_weights)[0],
+            release_date,
+            int(rng.lognormvariate(16, 2)) if has_money else 0,
+            0 if rng.random() < 0.1 else max(1, int(rng.gauss(95, 25))),
+            rng.random() < 0.02,
+            f"/{rng.getrandbits(64):016x}.jpg" if rng.random() < 0.6 else "",
+            int(rng.lognormvariate(15, 1.5)) if has_money else 0,
+            f"https://example.com/movie/{i + 1}" if rng.random() < 0.2 else "",
+            f"tt{i + 1:08d}" if rng.random() >= 0.03 else "",
+            rng.choices(self.languages, self.language_weights)[0],
+            title,
+            overview,
+            round(rng.lognormvariate(0, 1.2), 3),
+            f"/{rng.getrandbits(64):016x}.jpg" if rng.random() < 0.8 else "",
+            self._text(3, 8).capitalize() if rng.random() < 0.6 else "",
+            self._genres(),
+            ", ".join(rng.sample(self.companies, rng.choice((0, 1, 1, 2, 3)))),
+            ", ".join(rng.sample(COUNTRIES, rng.choice((0, 1, 1, 1, 2)))),
+            ", ".join(rng.sample(LANGUAGES, rng.choice((0, 1, 1, 2)))),
+            ", ".join(rng.sample(WORDS, rng.randint(0, 6))),
+        ]
+
+
+def generate(path, rows, seed=0):
+    """Write a movies.csv of `rows` synthetic movies to path"""
+    generator = CatalogGenerator(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            writer.writerow(generator.row(i))
+    return path
+
+
+def parse_rows(text):
+    """"10k", "1M", "2500" -> int"""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="10k", help="number of movies, e.g. 10k, 100k, 1M, 10M")
+    parser.add_argument("--out", default="movies.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    generate(args.out, parse_rows(args.rows), args.seed)
+
+
+if __name__ == "__main__":
+    main()
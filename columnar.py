@@ -0,0 +1,373 @@
+from array import array
+from collections.abc import Mapping, MutableMapping
+
+try:
+    import numpy as np
+except ImportError: #optional: the columns are stdlib arrays, NumPy only vectorizes filter_ids()
+    np = None
+
+from query_planner import Eq, Range, And, Or, Not
+
+#typed numeric columns ("d" float64, "q" int64)
+NUMERIC_COLUMNS = {"vote_average": "d", "vote_count": "q", "revenue": "q", "runtime": "q", "budget": "q", "popularity": "d"}
+#dictionary-encoded columns: one small code per row, every distinct value stored once
+CATEGORICAL_COLUMNS = ["status", "original_language", "adult"]
+MULTI_CATEGORICAL_COLUMNS = ["genres", "production_countries", "spoken_languages"]
+#everything else of a STORAGE record, kept as Python objects (one list slot per row)
+OBJECT_COLUMNS = ["title", "release_date", "backdrop_path", "homepage", "imdb_id", "original_title",
+                  "overview", "poster_path", "tagline", "production_companies", "keywords"]
+
+COMPACT_MIN = 1024 #dead rows tolerated before compacting (and never more than the live rows)
+
+_FIELD_KIND = {}
+_FIELD_KIND.update((field, "num") for field in NUMERIC_COLUMNS)
+_FIELD_KIND.update((field, "cat") for field in CATEGORICAL_COLUMNS)
+_FIELD_KIND.update((field, "multi") for field in MULTI_CATEGORICAL_COLUMNS)
+_FIELD_KIND.update((field, "obj") for field in OBJECT_COLUMNS)
+
+#kind of a numeric cell
+_NATIVE = 0         #value of the column type, in the array
+_OVERFLOW = 1       #anything else (str, bool, out of range int...), exact value in _overflow
+_INT_AS_FLOAT = 2   #int in a float column, exact as a float
+_ABSENT = 3         #field missing from the record
+
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+_FLOAT_EXACT = 2**53
+
+
+def _year_of(record):
+    """Derived "year" column, same rule as query_planner._field_value"""
+    date = record.get("release_date")
+    if isinstance(date, str) and len(date) >= 4 and date[:4].isdecimal():
+        return int(date[:4])
+    return None
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _view(column, dtype):
+    """Zero-copy NumPy view of an array/bytearray column (must not outlive the call using it)"""
+    return np.frombuffer(column, dtype=dtype) if len(column) else np.zeros(0, dtype=dtype)
+
+
+class _RowView(Mapping):
+    """Read-only row whose fields are decoded one by one on access (residual predicates)"""
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def _keys(self):
+        return self._store._shapes[self._store._shape[self._row]]
+
+    def __getitem__(self, field):
+        if field not in self._keys():
+            raise KeyError(field)
+        return self._store._cell(self._row, field)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+
+class ColumnarRecords(MutableMapping):
+    """
+    Drop-in replacement for the {movie_id: movie_record} dictionary, stored column by column.
+    Rows are append-only: assigning an existing ID appends a new row and marks the old one dead,
+    deleting only marks it dead, and the columns are rewritten once dead rows outnumber live ones.
+    Reading a movie builds its record dict on demand with the keys, key order and values that were
+    stored, so QueryEngine callers see no difference.
+    With NumPy installed, filter_ids() evaluates Eq/Range/And/Or/Not over whole columns.
+    """
+    def __init__(self, records=None):
+        self._reset()
+        if records is not None:
+            self.update(records)
+
+    def _reset(self):
+        self._row_of = {}               #movie_id -> row, in insertion order like a dict
+        self._ids = array("q")          #row -> movie_id
+        self._live = bytearray()        #row -> 1 live, 0 replaced/deleted
+        self._shape = array("I")        #row -> code of its key tuple in _shapes
+        self._shapes = []               #distinct key tuples, in record order
+        self._shape_code = {}
+        self._dead = 0
+
+        self._num = {field: array(typecode) for field, typecode in NUMERIC_COLUMNS.items()}
+        self._num["year"] = array("q")  #derived from release_date, never part of a record
+        self._kind = {field: bytearray() for field in self._num}
+
+        #dictionary encoding: code 0 = absent, or a value that cannot be encoded (then the row is in _overflow)
+        encoded = CATEGORICAL_COLUMNS + MULTI_CATEGORICAL_COLUMNS
+        self._values = {field: [None] for field in encoded}
+        self._lookup = {field: {} for field in encoded} #(type, value) -> code, so 1 and True stay apart
+        self._codes = {field: array("I") for field in CATEGORICAL_COLUMNS}
+        self._multi_codes = {field: array("I") for field in MULTI_CATEGORICAL_COLUMNS}
+        self._multi_offsets = {field: array("Q", [0]) for field in MULTI_CATEGORICAL_COLUMNS}
+
+        self._overflow = {field: {} for field in list(NUMERIC_COLUMNS) + encoded} #field -> {row: exact value}
+        self._objects = {field: [] for field in OBJECT_COLUMNS}
+        self._extras = {} #row -> {field: value} for fields outside the schema
+
+
+    ### <--------- ENCODING ---------> ###
+    def _encode(self, field, value):
+        """Dictionary code of value, 0 if it is unhashable"""
+        try:
+            key = (type(value), value)
+            code = self._lookup[field].get(key)
+        except TypeError:
+            return 0
+        if code is None:
+            code = self._lookup[field][key] = len(self._values[field])
+            self._values[field].append(value)
+        return code
+
+    def _append_number(self, field, row, present, value):
+        values, kinds = self._num[field], self._kind[field]
+        kind = _ABSENT
+        if present:
+            kind = _OVERFLOW
+            if NUMERIC_COLUMNS[field] == "d":
+                if type(value) is float:
+                    kind = _NATIVE
+                elif type(value) is int and -_FLOAT_EXACT <= value <= _FLOAT_EXACT:
+                    kind = _INT_AS_FLOAT
+            elif type(value) is int and _INT64_MIN <= value <= _INT64_MAX:
+                kind = _NATIVE
+        if kind == _OVERFLOW:
+            self._overflow[field][row] = value
+        values.append(value if kind in (_NATIVE, _INT_AS_FLOAT) else 0)
+        kinds.append(kind)
+
+    def _append_row(self, movie_id, record):
+        row = len(self._ids)
+        self._ids.append(movie_id)
+        self._live.append(1)
+
+        keys = tuple(record)
+        code = self._shape_code.get(keys)
+        if code is None:
+            code = self._shape_code[keys] = len(self._shapes)
+            self._shapes.append(keys)
+        self._shape.append(code)
+
+        for field in NUMERIC_COLUMNS:
+            self._append_number(field, row, field in record, record.get(field))
+        year = _year_of(record)
+        self._num["year"].append(year if year is not None else 0)
+        self._kind["year"].append(_NATIVE if year is not None else _ABSENT)
+
+        for field in CATEGORICAL_COLUMNS:
+            code = 0
+            if field in record:
+                code = self._encode(field, record[field])
+                if code == 0:
+                    self._overflow[field][row] = record[field]
+            self._codes[field].append(code)
+
+        for field in MULTI_CATEGORICAL_COLUMNS:
+            codes = self._multi_codes[field]
+            if field in record:
+                value = record[field]
+                encoded = [self._encode(field, item) for item in value] if type(value) is list else [0]
+                if 0 in encoded: #not a list of hashable values
+                    self._overflow[field][row] = value
+                else:
+                    codes.extend(encoded)
+            self._multi_offsets[field].append(len(codes))
+
+        for field in OBJECT_COLUMNS:
+            self._objects[field].append(record.get(field))
+
+        extras = {field: value for field, value in record.items() if field not in _FIELD_KIND}
+        if extras:
+            self._extras[row] = extras
+        return row
+
+    def _kill(self, row):
+        self._live[row] = 0
+        self._dead += 1
+        for overflow in self._overflow.values():
+            overflow.pop(row, None)
+        for objects in self._objects.values():
+            objects[row] = None #release the strings now, the slot goes at the next compaction
+        self._extras.pop(row, None)
+
+    def _maybe_compact(self):
+        if self._dead > max(COMPACT_MIN, len(self._row_of)):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the columns without dead rows (and unused dictionary values). O(N)"""
+        records = [(movie_id, self._record(row)) for movie_id, row in self._row_of.items()]
+        self._reset()
+        for movie_id, record in records:
+            self._row_of[movie_id] = self._append_row(movie_id, record)
+    ### <--------- ENCODING ---------> ###
+
+
+    ### <--------- DECODING ---------> ###
+    def _cell(self, row, field):
+        kind = _FIELD_KIND.get(field)
+        if kind == "num":
+            cell_kind = self._kind[field][row]
+            if cell_kind == _NATIVE:
+                return self._num[field][row]
+            if cell_kind == _INT_AS_FLOAT:
+                return int(self._num[field][row])
+            return self._overflow[field].get(row)
+        if kind == "cat":
+            code = self._codes[field][row]
+            return self._values[field][code] if code else self._overflow[field].get(row)
+        if kind == "multi":
+            if row in self._overflow[field]:
+                return self._overflow[field][row]
+            offsets = self._multi_offsets[field]
+            values = self._values[field]
+            return [values[code] for code in self._multi_codes[field][offsets[row]:offsets[row + 1]]]
+        if kind == "obj":
+            value = self._objects[field][row]
+            return list(value) if type(value) is list else value #callers may mutate the record they get
+        return self._extras[row][field]
+
+    def _record(self, row):
+        return {field: self._cell(row, field) for field in self._shapes[self._shape[row]]}
+
+    def get_field(self, movie_id, field, default=None):
+        """One field of a movie without building its record ("year" is derived from release_date). O(1)"""
+        row = self._row_of.get(movie_id)
+        if row is None:
+            return default
+        if field == "year":
+            return self._num["year"][row] if self._kind["year"][row] == _NATIVE else None
+        if field not in self._shapes[self._shape[row]]:
+            return default
+        return self._cell(row, field)
+
+    def row_view(self, movie_id):
+        """Lazy read-only Mapping of one movie, cheaper than self[movie_id] when few fields are read"""
+        return _RowView(self, self._row_of[movie_id])
+    ### <--------- DECODING ---------> ###
+
+
+    ### <--------- MAPPING Interface ---------> ###
+    def __getitem__(self, movie_id):
+        return self._record(self._row_of[movie_id])
+
+    def __setitem__(self, movie_id, record):
+        old_row = self._row_of.get(movie_id)
+        if old_row is not None:
+            self._kill(old_row)
+        self._row_of[movie_id] = self._append_row(movie_id, record) #an existing key keeps its position
+        self._maybe_compact()
+
+    def __delitem__(self, movie_id):
+        self._kill(self._row_of.pop(movie_id))
+        self._maybe_compact()
+
+    def __contains__(self, movie_id):
+        return movie_id in self._row_of
+
+    def __iter__(self):
+        return iter(self._row_of)
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __getstate__(self):
+        if self._dead:
+            self.compact()
+        return self.__dict__
+
+    def __repr__(self):
+        return f"ColumnarRecords({len(self)} movies, {self._dead} dead rows)"
+    ### <--------- MAPPING Interface ---------> ###
+
+
+    ### <--------- VECTORIZED Filters ---------> ###
+    def _overflow_mask(self, mask, field, predicate):
+        """Rows whose value did not fit the column are checked one by one (they are rare)"""
+        for row, value in self._overflow.get(field, {}).items():
+            if predicate.matches({field: value}):
+                mask[row] = True
+        return mask
+
+    def _code_mask(self, field, value):
+        """Boolean mask over the dictionary codes of field equal to value"""
+        matching = [code for code, stored in enumerate(self._values[field]) if code and stored == value]
+        code_mask = np.zeros(len(self._values[field]), dtype=bool)
+        code_mask[matching] = True
+        return code_mask
+
+    def _mask(self, predicate):
+        """Boolean row mask (dead rows included, callers AND it with _live), None if not vectorizable"""
+        if isinstance(predicate, (And, Or)):
+            masks = [self._mask(p) for p in predicate.predicates]
+            if any(mask is None for mask in masks):
+                return None
+            combine = np.logical_and if isinstance(predicate, And) else np.logical_or
+            return combine.reduce(masks) if masks else np.full(len(self._ids), isinstance(predicate, And))
+        if isinstance(predicate, Not):
+            mask = self._mask(predicate.predicate)
+            return None if mask is None else ~mask
+
+        field = getattr(predicate, "field", None)
+        if field in self._num and isinstance(predicate, Range):
+            for bound in (predicate.low, predicate.high):
+                if bound is not None and not _is_number(bound):
+                    return None
+            values, kinds = _view(self._num[field], NUMERIC_COLUMNS.get(field, "q")), _view(self._kind[field], "u1")
+            mask = (kinds == _NATIVE) | (kinds == _INT_AS_FLOAT)
+            try:
+                if predicate.low is not None:
+                    mask &= values >= predicate.low
+                if predicate.high is not None:
+                    mask &= values <= predicate.high
+            except OverflowError: #a bound beyond int64
+                return None
+            return self._overflow_mask(mask, field, predicate)
+
+        if not isinstance(predicate, Eq) or predicate.value is None: #absent fields equal None
+            return None
+        value = predicate.value
+        if field in self._num:
+            if not _is_number(value):
+                mask = np.zeros(len(self._ids), dtype=bool)
+            else:
+                values, kinds = _view(self._num[field], NUMERIC_COLUMNS.get(field, "q")), _view(self._kind[field], "u1")
+                try:
+                    mask = ((kinds == _NATIVE) | (kinds == _INT_AS_FLOAT)) & (values == value)
+                except OverflowError:
+                    return None
+            return self._overflow_mask(mask, field, predicate)
+        if field in self._codes:
+            mask = self._code_mask(field, value)[_view(self._codes[field], "u4")]
+            return self._overflow_mask(mask, field, predicate)
+        if field in self._multi_codes:
+            hits = np.flatnonzero(self._code_mask(field, value)[_view(self._multi_codes[field], "u4")])
+            rows = np.searchsorted(_view(self._multi_offsets[field], "u8"), hits, side="right") - 1
+            mask = np.zeros(len(self._ids), dtype=bool)
+            mask[rows] = True
+            return self._overflow_mask(mask, field, predicate)
+        return None
+
+    def filter_ids(self, predicate):
+        """
+        Sorted IDs of the movies matching predicate, evaluated column-wise in O(N) vectorized work.
+        None when NumPy is missing or the predicate touches a field that is not a typed or encoded
+        column; the caller then falls back to predicate.matches on every record.
+        """
+        if np is None:
+            return None
+        mask = self._mask(predicate)
+        if mask is None:
+            return None
+        mask &= _view(self._live, "u1").astype(bool)
+        return sorted(_view(self._ids, "i8")[mask].tolist())
+    ### <--------- VECTORIZED Filters ---------> ###
+
+#©Vardan Grigoryan
@@ -0,0 +1,295 @@
+import pickle
+import sys
+import threading
+import zlib
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate, repeat
+
+#fields whose values repeat across movies: one shared object per distinct value
+INTERNED_FIELDS = ["status", "original_language", "release_date", "vote_average", "vote_count", "runtime"]
+#list fields stored as codes into one shared table of items per field
+LIST_FIELDS = ["genres", "production_companies", "production_countries", "spoken_languages", "keywords"]
+#string fields unique to each movie: utf-8 in one bytes object per record instead of one str each
+TEXT_FIELDS = ["overview", "tagline", "imdb_id", "poster_path", "backdrop_path", "homepage"]
+
+_LIST_FIELDS = frozenset(LIST_FIELDS)
+_INTERNED_FIELDS = frozenset(INTERNED_FIELDS)
+_TEXT_FIELDS = frozenset(TEXT_FIELDS)
+
+#shared by every CompactRecord of the process; they only grow (one entry per distinct value)
+_interned = {}                                  #(type, value) -> the shared value
+_items = {field: [] for field in LIST_FIELDS}   #code -> item
+_codes = {field: {} for field in LIST_FIELDS}   #item -> code
+_shapes = {}                                    #(fields, packed fields) -> _Shape
+_lock = threading.Lock()                        #tables grow from concurrent writers
+
+_PICKLE_LEVEL = 1 #zlib level of the pickled columns: the fastest, text still shrinks 3-4x
+
+
+### <--------- SHARED Tables ---------> ###
+def _intern(value):
+    """The shared object equal to value (same type), value itself if it cannot be shared"""
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) not in (int, float) or value != value: #NaN never finds itself in a dict
+        return value
+    key = (type(value), value) #keeps 1 and 1.0 apart
+    shared = _interned.get(key)
+    if shared is None:
+        shared = _interned.setdefault(key, value)
+    return shared
+
+def _code(field, item):
+    code = _codes[field].get(item)
+    if code is None:
+        with _lock:
+            code = _codes[field].get(item)
+            if code is None:
+                code = _codes[field][item] = len(_items[field])
+                _items[field].append(sys.intern(item))
+    return code
+
+def _packable(value):
+    return type(value) is list and all(type(item) is str for item in value)
+
+
+class _Shape:
+    """
+    Layout shared by the records with the same keys: index[field] is the position of the field in
+    _values, -1 - k for the k-th list packed into _lists, or len(_values) + j for the j-th string
+    stored in _text.
+    """
+    __slots__ = ("fields", "packed", "text", "index")
+
+    def __init__(self, fields, packed, text):
+        self.fields = fields
+        self.packed = packed
+        self.text = text
+        self.index = {}
+        position = 0
+        for field in fields:
+            if field in packed:
+                self.index[field] = -1 - packed.index(field)
+            elif field not in text:
+                self.index[field] = position
+                position += 1
+        for j, field in enumerate(text):
+            self.index[field] = position + j
+
+def _shape(fields, packed, text):
+    key = (fields, packed, text)
+    shape = _shapes.get(key)
+    if shape is None:
+        with _lock:
+            shape = _shapes.setdefault(key, _Shape(fields, packed, text))
+    return shape
+### <--------- SHARED Tables ---------> ###
+
+
+### <--------- RECORD ---------> ###
+class CompactRecord(Mapping):
+    """
+    Read-only, dict-compatible movie record: the field names live in a shared _Shape, the values
+    in one tuple, the list fields as item codes packed in one array ([length, codes...] per list,
+    after the end offsets of the TEXT_FIELDS strings), those strings as utf-8 in one bytes object.
+    Repeated values (INTERNED_FIELDS, list items) are shared objects instead of per-record copies.
+    Reading a list or text field builds a new object; copy() returns a plain dict to edit.
+    """
+    __slots__ = ("_shape", "_values", "_lists", "_text")
+
+    def __init__(self, fields, values):
+        """fields and values: parallel sequences, as tuple(record) and record.values()"""
+        fields = tuple(fields)
+        packed, text, kept, codes, heap = [], [], [], [], []
+        strings = {} #equal strings of one record (original_title is usually the title) share one object
+        for field, value in zip(fields, values):
+            if field in _LIST_FIELDS and _packable(value):
+                packed.append(field)
+                codes.append(len(value))
+                codes.extend([_code(field, item) for item in value])
+            elif field in _TEXT_FIELDS and type(value) is str:
+                text.append(field)
+                heap.append(value.encode("utf-8", "surrogatepass"))
+            elif field in _INTERNED_FIELDS:
+                kept.append(_intern(value))
+            else:
+                kept.append(strings.setdefault(value, value) if type(value) is str else value)
+        self._shape = _shape(fields, tuple(packed), tuple(text))
+        self._values = tuple(kept)
+        self._lists = array("I", [*accumulate(map(len, heap)), *codes]) if packed or text else None #exact size
+        self._text = b"".join(heap) if text else None
+
+    def _list(self, k, tables=_items):
+        """Items of the k-th packed list. O(number of packed lists + items)"""
+        lists = self._lists
+        start = len(self._shape.text)
+        for _ in range(k):
+            start += lists[start] + 1
+        items = tables[self._shape.packed[k]]
+        return [items[code] for code in lists[start + 1:start + 1 + lists[start]]]
+
+    def _string(self, j):
+        """The j-th string of _text. O(its length)"""
+        lists = self._lists
+        return self._text[lists[j - 1] if j else 0:lists[j]].decode("utf-8", "surrogatepass")
+
+    ### <--------- MAPPING Interface ---------> ###
+    def __getitem__(self, field):
+        i = self._shape.index[field]
+        if i < 0:
+            return self._list(-1 - i)
+        values = self._values
+        return values[i] if i < len(values) else self._string(i - len(values))
+
+    def get(self, field, default=None):
+        i = self._shape.index.get(field)
+        if i is None:
+            return default
+        if i < 0:
+            return self._list(-1 - i)
+        values = self._values
+        return values[i] if i < len(values) else self._string(i - len(values))
+
+    def __contains__(self, field):
+        return field in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.fields)
+
+    def __len__(self):
+        return len(self._shape.fields)
+
+    def copy(self):
+        """The record as a new plain dict"""
+        return {field: self[field] for field in self._shape.fields}
+
+    def __reduce__(self):
+        #decoded values: the tables are per process. Shared strings are written once per pickle (memo)
+        return (CompactRecord, (self._shape.fields, tuple(self[field] for field in self._shape.fields)))
+
+    def __repr__(self):
+        return f"CompactRecord({self.copy()!r})"
+    ### <--------- MAPPING Interface ---------> ###
+
+
+def compact(record):
+    """record as a CompactRecord (returned as is when it already is one)"""
+    if type(record) is CompactRecord:
+        return record
+    return CompactRecord(record, record.values())
+### <--------- RECORD ---------> ###
+
+
+class CompactRecords(dict):
+    """
+    {movie_id: CompactRecord}: a dict whose stores convert every record on the way in,
+    so lookups keep dict speed and callers keep passing plain dicts.
+    """
+    __slots__ = ()
+
+    def __init__(self, records=()):
+        super().__init__()
+        self.update(records)
+
+    def __setitem__(self, movie_id, record):
+        dict.__setitem__(self, movie_id, compact(record))
+
+    def setdefault(self, movie_id, record=None):
+        if movie_id not in self:
+            self[movie_id] = record
+        return dict.__getitem__(self, movie_id)
+
+    def update(self, records=(), **kwargs):
+        for movie_id, record in (records.items() if hasattr(records, "items") else records):
+            self[movie_id] = record
+        for movie_id, record in kwargs.items():
+            self[movie_id] = record
+
+    def __reduce__(self):
+        """
+        Pickled column-wise: the shapes and item tables once, then the values of each shape field
+        by field and the codes of every movie as slices of one array, instead of one CompactRecord
+        reduce per movie. The columns of INTERNED_FIELDS are dictionary-encoded, and the columns of
+        a shape, its utf-8 text blobs last, are pickled together (equal strings of a movie stay one
+        object) and zlib-compressed (see _packed): only the pickle pays for it, reads of the
+        records in memory do not.
+        """
+        shapes, rows, texts = {}, [], []
+        ids, shape_of, lists, ends = [], array("I"), array("I"), array("Q")
+        for movie_id, record in self.items():
+            s = shapes.setdefault(record._shape, len(shapes))
+            if s == len(rows):
+                rows.append([])
+                texts.append([])
+            ids.append(movie_id)
+            shape_of.append(s)
+            rows[s].append(record._values)
+            texts[s].append(record._text)
+            if record._lists is not None:
+                lists.extend(record._lists)
+            ends.append(len(lists))
+        columns = []
+        for shape, shape_rows, shape_texts in zip(shapes, rows, texts):
+            fields = [field for field in shape.fields if field not in shape.packed and field not in shape.text]
+            columns.append(_packed([_dictionary(column) if field in _INTERNED_FIELDS else list(column)
+                                    for field, column in zip(fields, zip(*shape_rows))] + [shape_texts]))
+        tables = {field: list(_items[field]) for field in LIST_FIELDS}
+        return (_restore_columns, ([(shape.fields, shape.packed, shape.text) for shape in shapes], _packed(tables),
+                                   _packed(ids), _packed(shape_of), columns, _packed(lists), _packed(ends)))
+
+    def __repr__(self):
+        return f"CompactRecords({len(self)} movies)"
+
+
+### <--------- PICKLE Format ---------> ###
+def _packed(value):
+    """zlib of the pickle of value: the form of every CompactRecords column in a pickle"""
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), _PICKLE_LEVEL)
+
+def _unpacked(blob):
+    return pickle.loads(zlib.decompress(blob))
+
+def _dictionary(values):
+    """(distinct objects, array of their positions) of a column of shared objects. O(N)"""
+    ids = list(map(id, values)) #the records keep every value alive while the column is encoded
+    positions = {}
+    codes = array("I", [positions.setdefault(i, len(positions)) for i in ids])
+    return list(dict(zip(ids, values)).values()), codes #first occurrences, in code order
+
+def _restore_columns(shapes, tables, ids, shape_of, columns, lists, ends):
+    """
+    Unpickle CompactRecords written by __reduce__: rebuilds the values tuples of each shape from its
+    columns. O(N) when the item codes of the pickle are the codes of this process.
+    """
+    shapes = [_shape(fields, packed, text) for fields, packed, text in shapes]
+    rows = []
+    for shape, blob in zip(shapes, columns):
+        decoded = _unpacked(blob)
+        texts = decoded.pop()
+        for i, field in enumerate(field for field in shape.fields if field not in shape.packed and field not in shape.text):
+            if field in _INTERNED_FIELDS: #pickle shares strings, not numbers
+                table, codes = decoded[i]
+                table = [_intern(value) for value in table]
+                decoded[i] = [table[code] for code in codes]
+        rows.append(zip(zip(*decoded) if decoded else repeat(()), texts))
+    tables, lists, ends = _unpacked(tables), _unpacked(lists), _unpacked(ends)
+    same_codes = all([_code(field, item) for item in items] == list(range(len(items))) for field, items in tables.items())
+
+    records = CompactRecords()
+    start = 0
+    for movie_id, s, end in zip(_unpacked(ids), _unpacked(shape_of), ends):
+        shape = shapes[s]
+        record = CompactRecord.__new__(CompactRecord)
+        record._shape = shape
+        record._values, record._text = next(rows[s])
+        record._lists = lists[start:end] if end > start else None
+        if not same_codes: #decode with the tables of the pickle, encode with ours
+            record = CompactRecord(shape.fields, [record._list(-1 - shape.index[field], tables) if field in shape.packed
+                                                  else record[field] for field in shape.fields])
+        dict.__setitem__(records, movie_id, record)
+        start = end
+    return records
+### <--------- PICKLE Format ---------> ###
+
+#©Vardan Grigoryan
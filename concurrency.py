@@ -0,0 +1,199 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from query_engine import QueryEngine
+
+ITER_PAGE_SIZE = 500 #rows collected per read lock by the ThreadSafeQueryEngine iter_* generators
+
+### <--------- READER-WRITER Lock ---------> ###
+class ReadWriteLock:
+    """
+    Any number of readers, or one writer. Writer-preferring: once a writer waits, new readers
+    queue behind it, so a steady stream of reads cannot starve the writes.
+    The write side is reentrant, and the thread holding it may also take the read side.
+    A reader must not take the read side again while holding it (a waiting writer would deadlock it).
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer = None #ident of the thread holding the write side
+        self._depth = 0     #nested acquisitions by that thread
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            if self._writer == threading.get_ident():
+                self._release_write()
+                return
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+                return
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._release_write()
+
+    def _release_write(self):
+        if self._writer != threading.get_ident():
+            raise RuntimeError("Write lock released by a thread that does not hold it")
+        self._depth -= 1
+        if not self._depth:
+            self._writer = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+### <--------- READER-WRITER Lock ---------> ###
+
+
+### <--------- THREAD-SAFE Query Engine ---------> ###
+def _reading(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+def _applying(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return locked
+
+def _writing(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._writer:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class ThreadSafeQueryEngine(QueryEngine):
+    """
+    QueryEngine shared by reader threads and writer threads.
+        - Every query holds the read side of `lock`: it sees all the indices and by_id at the same
+          state, never a record missing from an index or a tree in the middle of a rotation.
+        - Writers are serialized by a mutex. Validation, key allocation, the WAL append (fsync)
+          and the audit log run under that mutex only; the write side of `lock` is held just for
+          the in-memory index update (O(log N * g) per movie, a whole batch at once).
+        - Checkpoints pickle under the mutex and the read side, so queries keep running while the
+          state is persisted and only writers wait. The snapshot backends remap their files at
+          the end of a checkpoint, so with them the checkpoint takes the write side instead.
+          ColumnarRecords rewrites its columns when pickled with dead rows: they are compacted
+          under the write side first.
+    iter_* do not hold the lock while the caller consumes them: they read ITER_PAGE_SIZE rows per
+    read lock and resume after the last key (see pagination), so every chunk is consistent and
+    rows are never repeated or skipped, but writes may land between two chunks.
+    """
+    def __init__(self, *args, **kwargs):
+        self.lock = ReadWriteLock()
+        self._writer = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    #queries
+    search_by_id = _reading(QueryEngine.search_by_id)
+    search_by_title = _reading(QueryEngine.search_by_title)
+    search_by_year = _reading(QueryEngine.search_by_year)
+    search_by_genre = _reading(QueryEngine.search_by_genre)
+    search_by_year_range = _reading(QueryEngine.search_by_year_range)
+    search_text = _reading(QueryEngine.search_text)
+    autocomplete = _reading(QueryEngine.autocomplete)
+    search_by_title_fuzzy = _reading(QueryEngine.search_by_title_fuzzy)
+    range_query = _reading(QueryEngine.range_query)
+    query = _reading(QueryEngine.query)
+    aggregate = _reading(QueryEngine.aggregate)
+    explain = _reading(QueryEngine.explain)
+    page_by_year = _reading(QueryEngine.page_by_year)
+    page_by_genre = _reading(QueryEngine.page_by_genre)
+    page_by_year_range = _reading(QueryEngine.page_by_year_range)
+    page_range = _reading(QueryEngine.page_range)
+
+    #in-memory updates: the only code that runs with readers excluded
+    _apply_insert = _applying(QueryEngine._apply_insert)
+    _apply_delete = _applying(QueryEngine._apply_delete)
+    _apply_modify = _applying(QueryEngine._apply_modify)
+    _apply_ops = _applying(QueryEngine._apply_ops)
+    _undo_ops = _applying(QueryEngine._undo_ops)
+    _undo = _applying(QueryEngine._undo)
+
+    #mutations
+    insert_movie = _writing(QueryEngine.insert_movie)
+    delete_movie = _writing(QueryEngine.delete_movie)
+    modify_movie = _writing(QueryEngine.modify_movie)
+    insert_many = _writing(QueryEngine.insert_many)
+    delete_many = _writing(QueryEngine.delete_many)
+    modify_many = _writing(QueryEngine.modify_many)
+    apply_source_delta = _writing(QueryEngine.apply_source_delta)
+    close = _writing(QueryEngine.close)
+
+    def checkpoint(self):
+        remaps = self.storager.backend == "snapshot" or getattr(self.indexer, "file_format", None) == "snapshot"
+        with self._writer:
+            if getattr(self.by_id, "_dead", 0): #ColumnarRecords.__getstate__ would compact under the read side
+                with self.lock.write():
+                    self.by_id.compact()
+            with self.lock.write() if remaps else self.lock.read():
+                super().checkpoint()
+
+    ### <--------- STREAMING ---------> ###
+    def _iter_pages(self, page, *args, reverse=False):
+        cursor = None
+        while True:
+            records, cursor = page(*args, limit=ITER_PAGE_SIZE, cursor=cursor, reverse=reverse)
+            yield from records
+            if cursor is None:
+                return
+
+    def iter_by_year(self, movie_year, reverse=False):
+        return self._iter_pages(self.page_by_year, movie_year, reverse=reverse)
+
+    def iter_by_genre(self, movie_genre, reverse=False):
+        return self._iter_pages(self.page_by_genre, movie_genre, reverse=reverse)
+
+    def iter_by_year_range(self, start_year, end_year, reverse=False):
+        return self._iter_pages(self.page_by_year_range, start_year, end_year, reverse=reverse)
+
+    def iter_range(self, field, min_val, max_val, reverse=False):
+        return self._iter_pages(self.page_range, field, min_val, max_val, reverse=reverse)
+    ### <--------- STREAMING ---------> ###
+### <--------- THREAD-SAFE Query Engine ---------> ###
+
+#©Vardan Grigoryan
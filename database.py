@@ -0,0 +1,130 @@
+import os
+import threading
+
+from STORAGE import STORAGE_DATASET
+from audit_logger import AuditLogger
+
+### <--------- DATABASE Handle ---------> ###
+class Database:
+    """
+    Handle on one data directory laid out like project/data:
+        raw/movies.csv, pickle/records_dic.pkl, pickle/indices_avl.pkl, pickle/mutations.wal, audit/audit_log.jsonl
+    Nothing is read when the handle is created. The records are loaded on the first access to
+    `storage`/`records`, the MovieIndex on the first access to `index` (and each of its indices only
+    when a query first touches it), and the QueryEngine (WAL replay, audit log) on `engine`.
+    On a first start (neither pickle exists) the CSV is parsed by load_workers processes and the
+    indices are grouped batch by batch while it is read, instead of in a second pass afterwards.
+    With thread_safe=True the engine is a concurrency.ThreadSafeQueryEngine, and the lazy loads
+    above may be triggered from several threads at once.
+    """
+    def __init__(self, path="project/data", csv_path=None, checkpoint_every=1000, audit_batch_size=1, build_workers=None,
+                 load_workers=None, backend="dict", result_cache=None, thread_safe=False):
+        self.path = os.path.abspath(path)
+        self.csv_path = csv_path or os.path.join(self.path, "raw", "movies.csv")
+        if backend == "snapshot": #mmap-ed binary snapshots instead of the two pickles
+            self.records_path = os.path.join(self.path, "pickle", "records.snap")
+            self.index_path = os.path.join(self.path, "pickle", "indices.snap")
+        else:
+            self.records_path = os.path.join(self.path, "pickle", "records_dic.pkl")
+            self.index_path = os.path.join(self.path, "pickle", "indices_avl.pkl")
+        self.wal_path = os.path.join(self.path, "pickle", "mutations.wal")
+        self.audit_path = os.path.join(self.path, "audit", "audit_log.jsonl")
+
+        self.checkpoint_every = checkpoint_every
+        self.audit_batch_size = audit_batch_size
+        self.build_workers = build_workers
+        self.load_workers = load_workers
+        self.backend = backend #STORAGE.BACKENDS: "columnar" stores the records column by column,
+                               #"snapshot" maps records.snap and builds each index from indices.snap
+                               #on first use instead of unpickling them (indices stay per process)
+        self.result_cache = result_cache #result_cache.ResultCache handed to the QueryEngine, None disables caching
+        self.thread_safe = thread_safe
+
+        self._lock = threading.RLock() #one thread loads each component, the others wait for it
+
+        self._storage = None
+        self._prebuilt = None #StreamingIndexBuilder filled during a CSV load
+        self._index = None
+        self._engine = None
+
+    ### <--------- LAZY Components ---------> ###
+    @property
+    def storage(self):
+        if self._storage is None:
+            with self._lock:
+                if self._storage is None:
+                    os.makedirs(os.path.dirname(self.records_path), exist_ok=True)
+                    storage = STORAGE_DATASET(csv_path=self.csv_path, pickle_path=self.records_path, backend=self.backend)
+                    on_batch = None
+                    if not os.path.exists(self.records_path) and not os.path.exists(self.index_path):
+                        from indexing import StreamingIndexBuilder
+                        self._prebuilt = StreamingIndexBuilder()
+                        on_batch = self._prebuilt.add_batch
+                    storage.load_DATASET_final(workers=self.load_workers, on_batch=on_batch)
+                    self._storage = storage
+        return self._storage
+
+    @property
+    def records(self):
+        return self.storage.records_dic
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    from indexing import MovieIndex #ds_collection + every index module, only paid when needed
+                    self._index = MovieIndex(pickle_path=self.index_path, dataset=self.records, wal_lsn=self.storage.wal_lsn,
+                                             build_workers=self.build_workers, prebuilt=self._prebuilt,
+                                             file_format="snapshot" if self.backend == "snapshot" else "pickle")
+                    self._prebuilt = None
+        return self._index
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    if self.thread_safe:
+                        from concurrency import ThreadSafeQueryEngine as QueryEngine
+                    else:
+                        from query_engine import QueryEngine
+                    os.makedirs(os.path.dirname(self.audit_path), exist_ok=True)
+                    self._engine = QueryEngine(
+                        movie_dic=self.records,
+                        indexer=self.index,
+                        storager=self.storage,
+                        wal_path=self.wal_path,
+                        checkpoint_every=self.checkpoint_every,
+                        logger=AuditLogger(self.audit_path, batch_size=self.audit_batch_size),
+                        result_cache=self.result_cache,
+                    )
+        return self._engine
+    ### <--------- LAZY Components ---------> ###
+
+    def close(self):
+        """Checkpoint pending mutations and close the audit log."""
+        if self._engine is not None:
+            self._engine.close()
+            self._engine.logger.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_database(path="project/data", csv_path=None, checkpoint_every=1000, audit_batch_size=1, build_workers=None,
+                  load_workers=None, backend="dict", result_cache=None, thread_safe=False):
+    """
+    Explicit entry point: returns a lazily loading Database for the data directory at path.
+        with open_database("project/data") as db:
+            db.engine.search_by_genre("Drama")
+    """
+    return Database(path, csv_path=csv_path, checkpoint_every=checkpoint_every,
+                    audit_batch_size=audit_batch_size, build_workers=build_workers, load_workers=load_workers,
+                    backend=backend, result_cache=result_cache, thread_safe=thread_safe)
+### <--------- DATABASE Handle ---------> ###
+
+#©Vardan Grigoryan
@@ -0,0 +1,170 @@
+import heapq
+from collections import Counter
+
+from postings import PostingList
+from title_prefix_index import normalize_title
+
+MAX_DISTANCE = 2    #default edit distance tolerated by search()
+GRAM = 3            #characters per gram
+
+### <--------- EDIT DISTANCE ---------> ###
+def grams(key):
+    """Distinct trigrams of a normalized title, padded so the first and last characters count as much as the others"""
+    padded = "  " + key + " "
+    return {padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)}
+
+def bounded_levenshtein(a, b, limit):
+    """
+    Levenshtein distance of a and b if it is at most limit, else limit + 1.
+    Only the diagonal band |i - j| <= limit is computed, and the scan stops as soon as a whole
+    row exceeds limit. O(limit * len(a))
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        char = a[i - 1]
+        best = current[0] if lo == 1 else over
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return previous[len(b)]
+### <--------- EDIT DISTANCE ---------> ###
+
+
+class FuzzyTitleIndex:
+    """
+    Typo-tolerant title lookup: the titles within an edit distance of a query, closest first.
+    Every distinct normalized title gets a title ID (tid). Postings are grouped by title length,
+    then by trigram: length -> {gram: PostingList of tids}, so a query only reads the lengths
+    within max_distance of its own.
+    One edit changes at most GRAM of the grams of a title, so a title within distance d shares at
+    least len(grams(query)) - GRAM * d of the query's grams: counting them in the postings leaves
+    few candidates, verified with bounded_levenshtein.
+    """
+    def __init__(self):
+        self.keys = []          #tid -> normalized title, None once no movie has it
+        self.movies = []        #tid -> movie ID, or PostingList when several movies share the title
+        self.tid_of = {}        #normalized title -> tid
+        self.by_length = {}     #title length -> {gram: PostingList of tids}
+
+    ### <--------- MAINTENANCE ---------> ###
+    def insert(self, movie_id, movie_dic):
+        """O(L) for a title of L characters (O(L log T) when it reuses an older tid)"""
+        key = normalize_title(movie_dic.get("title") or "")
+        tid = self.tid_of.get(key)
+        if tid is not None:
+            ids = self.movies[tid]
+            if isinstance(ids, PostingList):
+                ids.add(movie_id)
+            elif ids != movie_id:
+                self.movies[tid] = PostingList([ids, movie_id])
+            return
+
+        tid = self.tid_of[key] = len(self.keys) #new tids are the largest: every posting insert is an append
+        self.keys.append(key)
+        self.movies.append(movie_id)
+        postings = self.by_length.setdefault(len(key), {})
+        for gram in grams(key):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = PostingList([tid])
+            else:
+                posting.add(tid)
+
+    def remove(self, movie_id, movie_dic):
+        """movie_dic must be the record that was inserted (same contract as deleting_process)"""
+        key = normalize_title(movie_dic.get("title") or "")
+        tid = self.tid_of.get(key)
+        if tid is None:
+            return
+        ids = self.movies[tid]
+        if isinstance(ids, PostingList):
+            if movie_id in ids:
+                ids.remove(movie_id)
+                if len(ids) == 1:
+                    self.movies[tid] = next(iter(ids))
+            return
+        if ids != movie_id:
+            return
+
+        #last movie with this title: the tid leaves the postings (tids are never reused)
+        del self.tid_of[key]
+        self.keys[tid] = None
+        self.movies[tid] = None
+        postings = self.by_length[len(key)]
+        for gram in grams(key):
+            posting = postings[gram]
+            posting.remove(tid)
+            if not len(posting):
+                del postings[gram]
+        if not postings:
+            del self.by_length[len(key)]
+    ### <--------- MAINTENANCE ---------> ###
+
+
+    ### <--------- LOOKUP ---------> ###
+    def _candidates(self, key, max_distance):
+        """tids whose title length is within max_distance and that share enough grams with key"""
+        query_grams = grams(key)
+        need = len(query_grams) - GRAM * max_distance
+        lengths = range(max(0, len(key) - max_distance), len(key) + max_distance + 1)
+        tables = [self.by_length[length] for length in lengths if length in self.by_length]
+        if need <= 0: #query too short for the count filter: every title of those lengths
+            found = set()
+            for postings in tables:
+                for posting in postings.values():
+                    found.update(posting)
+            return found
+        counts = Counter()
+        for postings in tables:
+            for gram in query_grams:
+                posting = postings.get(gram)
+                if posting is not None:
+                    counts.update(posting)
+        return [tid for tid, count in counts.items() if count >= need]
+
+    def search(self, query, k=10, max_distance=MAX_DISTANCE):
+        """
+        Up to k (distance, movie_id) of the titles within max_distance edits of query,
+        ignoring case and accents, closest first (then by ID).
+        """
+        if max_distance < 0:
+            raise ValueError("max_distance must be >= 0")
+        key = normalize_title(query)
+        keys = self.keys
+        matches = []
+        exact = self.tid_of.get(key)
+        if exact is not None:
+            matches.append((0, exact))
+        if max_distance > 0:
+            for tid in self._candidates(key, max_distance):
+                if tid != exact:
+                    distance = bounded_levenshtein(key, keys[tid], max_distance)
+                    if distance <= max_distance:
+                        matches.append((distance, tid))
+
+        def hits():
+            for distance, tid in matches:
+                ids = self.movies[tid]
+                for movie_id in ([ids] if isinstance(ids, int) else ids):
+                    yield distance, movie_id
+        return heapq.nsmallest(k, hits())
+    ### <--------- LOOKUP ---------> ###
+
+#©Vardan Grigoryan
@@ -1,7 +1,28 @@
 from ds_collection import *
-from STORAGE import STORAGE_movie_dic #*
+from STORAGE import atomic_pickle_dump
+from postings import PostingList
+from text_index import TextIndex
+from title_prefix_index import TitlePrefixIndex
+from fuzzy_title_index import FuzzyTitleIndex
+import multiprocessing
 import pickle
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+#numeric record fields with their own value -> [movie_ids] AVL index (range_query)
+NUMERIC_FIELDS = ["vote_average", "vote_count", "popularity", "revenue", "budget", "runtime"]
+
+#attributes of MovieIndex pickled (and lazily unpickled) one by one
+INDEX_NAMES = ["AVL_title", "AVL_year", "AVL_genre", "AVL_numeric", "TEXT", "TITLE_PREFIX", "TITLE_FUZZY"]
+
+#serializes lazy loading with itself and with the checkpoint reading _blobs (concurrent readers)
+_LAZY_LOCK = threading.RLock()
+
+def _is_indexable_number(value):
+    """int/float values that can be ordered (bool is excluded, NaN never compares)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
 
 class AVLTreeMap(TreeMap):
     """A sorted map implementation using an AVL-balanced binary search tree."""
@@ -126,33 +147,76 @@ class AVLTreeMap(TreeMap):
         
         return in_order_trav(self._tree.root())
 
-    
-    def get_keys_with_prefix(self, prefix):
-        results = []
 
-        start_entry = self.ceiling_entry(prefix) #optimal starting point
-        if start_entry is None:
-            return []
+    @classmethod
+    def from_sorted_items(cls, items):
+        """
+        Build a balanced AVLTreeMap bottom-up from (key, value) pairs sorted by distinct keys.
+        O(N): every node is placed once at its final position (middle of its slice), so no search
+        and no rotation happens. Sibling slices differ by at most one item, so the AVL property holds.
+        """
+        tree_map = cls()
+        tree = tree_map._tree
 
-        def in_order_trav(p):
-            if p is None or self._tree.is_external(p):
+        def fill(p, lo, hi): #recursion depth is log2(N)
+            if lo >= hi:
                 return
-            
-            in_order_trav(self._tree.left(p))
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            tree_map._expand_external(p, tree_map._MapEntry(key, value))
+            fill(tree.left(p), lo, mid)
+            fill(tree.right(p), mid + 1, hi)
+            tree_map._recompute_height(p)
+
+        fill(tree.root(), 0, len(items))
+        return tree_map
+
+
+    def entries_between(self, low=None, high=None, reverse=False):
+        """
+        Yield the entries with low <= key <= high in key order (descending if reverse).
+        None leaves that side unbounded. Iterative, O(log N + K).
+        """
+        stack = []
+        p = self._tree.root()
+        while True:
+            #descend, skipping whole subtrees that lie outside the bound we start from
+            while self._tree.is_internal(p):
+                key = p.get_element().get_key()
+                if not reverse:
+                    if low is not None and key < low:
+                        p = self._tree.right(p)
+                        continue
+                    stack.append(p)
+                    p = self._tree.left(p)
+                else:
+                    if high is not None and key > high:
+                        p = self._tree.left(p)
+                        continue
+                    stack.append(p)
+                    p = self._tree.right(p)
+
+            if not stack:
+                return
+            p = stack.pop()
             key = p.get_element().get_key()
-            value_i = p.get_element().get_value()
-
-            if key.startswith(prefix):
-                results.append(value_i)
-            elif not key.startswith(prefix):
+            if (not reverse and high is not None and key > high) or (reverse and low is not None and key < low):
                 return
-                #Optimization. Stop traversal once it has passed the prefix
-            in_order_trav(self._tree.right(p))
-        
-        #finding the position corresponding to start_entry
-        #_subtree_search returns the node with exact key, ceiling_entry returns an entry
-        start_pos = self._subtree_search(self._tree.root(), start_entry.get_key())
-        in_order_trav(start_pos)
+            yield p.get_element()
+            p = self._tree.right(p) if not reverse else self._tree.left(p)
+
+    
+    def get_keys_with_prefix(self, prefix):
+        """
+        Values of every key starting with prefix, in key order. O(log N + K), iterative:
+        entries_between descends straight to the first key >= prefix instead of
+        re-searching from the root, and keys are sorted so the walk stops at the first miss.
+        """
+        results = []
+        for entry in self.entries_between(prefix):
+            if not entry.get_key().startswith(prefix):
+                break #Optimization. Stop traversal once it has passed the prefix
+            results.append(entry.get_value())
         return results
     ### <----------------------------------------> ###
     
@@ -170,22 +234,147 @@ class AVLTreeMap(TreeMap):
 ### <----------------------------------------> ###
 
 
+### <--------- BULK BUILDERS ---------> ###
+#Every index is built in two steps: group the IDs by key while the movies stream in (add/add_batch),
+#then build each structure once from the sorted keys (finish). Module level so a process pool can run them.
+def _tree_of_postings(groups):
+    """{key: [ascending ids]} -> AVLTreeMap of PostingLists, bottom-up"""
+    return AVLTreeMap.from_sorted_items([(key, PostingList.from_sorted(groups[key])) for key in sorted(groups)])
+
+class StreamingIndexBuilder:
+    """
+    Collects movies for the indices in `names` and builds them in finish().
+    Fed in ascending ID order (the order STORAGE_DATASET.iter_movie_csv_batches yields), every
+    group stays sorted without a sort and every TEXT posting insert is an append, so the
+    indices can be built while the CSV is still being parsed.
+    """
+    def __init__(self, names=INDEX_NAMES):
+        self.names = set(names)
+        self._titles = {}
+        self._years = {}
+        self._genres = {}
+        self._numeric = {field: {} for field in NUMERIC_FIELDS}
+        self._text = TextIndex() if "TEXT" in self.names else None
+        self._prefix = TitlePrefixIndex() if "TITLE_PREFIX" in self.names else None
+        self._fuzzy = FuzzyTitleIndex() if "TITLE_FUZZY" in self.names else None
+        self._last_id = -1
+        self._ascending = True
+
+    def add(self, movie_id, movie_dic):
+        if movie_id <= self._last_id:
+            self._ascending = False #groups get sorted in finish()
+        self._last_id = max(self._last_id, movie_id)
+        names = self.names
+
+        if "AVL_title" in names:
+            self._titles.setdefault(movie_dic.get("title"), []).append(movie_id)
+        if "AVL_year" in names:
+            date = movie_dic.get("release_date")
+            if date and len(date) >= 4:
+                self._years.setdefault(int(date[:4]), []).append(movie_id)
+        if "AVL_genre" in names:
+            for genre in movie_dic.get("genres") or []:
+                ids = self._genres.setdefault(genre, [])
+                if not ids or ids[-1] != movie_id: #a genre listed twice
+                    ids.append(movie_id)
+        if "AVL_numeric" in names:
+            for field in NUMERIC_FIELDS:
+                value = movie_dic.get(field)
+                if _is_indexable_number(value):
+                    self._numeric[field].setdefault(value, []).append(movie_id)
+        if self._text is not None:
+            self._text.insert(movie_id, movie_dic)
+        if self._prefix is not None:
+            self._prefix.insert(movie_id, movie_dic) #bulk mode: buffered until build()
+        if self._fuzzy is not None:
+            self._fuzzy.insert(movie_id, movie_dic)
+
+    def add_batch(self, batch):
+        """batch: [(movie_id, movie_dic)], e.g. as passed to load_movie_csv(on_batch=...)"""
+        for movie_id, movie_dic in batch:
+            self.add(movie_id, movie_dic)
+
+    def finish(self):
+        """{name: built index} for every requested name"""
+        groups = [self._titles, self._years, self._genres] + list(self._numeric.values())
+        if not self._ascending:
+            for group in groups:
+                for ids in group.values():
+                    ids.sort()
+
+        built = {}
+        if "AVL_title" in self.names: #unique titles keep a bare ID, same as inserting_process
+            built["AVL_title"] = AVLTreeMap.from_sorted_items([
+                (title, ids[0] if len(ids) == 1 else PostingList.from_sorted(ids)) for title, ids in sorted(self._titles.items())
+            ])
+        if "AVL_year" in self.names:
+            built["AVL_year"] = _tree_of_postings(self._years)
+        if "AVL_genre" in self.names:
+            built["AVL_genre"] = _tree_of_postings(self._genres)
+        if "AVL_numeric" in self.names:
+            built["AVL_numeric"] = {field: _tree_of_postings(self._numeric[field]) for field in NUMERIC_FIELDS}
+        if self._text is not None:
+            built["TEXT"] = self._text
+        if self._prefix is not None:
+            self._prefix.build()
+            built["TITLE_PREFIX"] = self._prefix
+        if self._fuzzy is not None:
+            built["TITLE_FUZZY"] = self._fuzzy
+        return built
+
+def build_indices(dataset, names=INDEX_NAMES):
+    builder = StreamingIndexBuilder(names)
+    for movie_id in sorted(dataset): #keys are already (almost) in order: timsort is ~O(N) here
+        builder.add(movie_id, dataset[movie_id])
+    return builder.finish()
+
+
+_BUILD_DATASET = None #dataset inherited by forked build workers (never pickled to them)
+
+def _timed_build(name):
+    start = time.perf_counter()
+    index = build_indices(_BUILD_DATASET, [name])[name]
+    return index, time.perf_counter() - start
+### <--------- BULK BUILDERS ---------> ###
+
+
 class MovieIndex:
-    def __init__(self, pickle_path="project/data/pickle/indices_avl.pkl", dataset=None):
-        self.pickle_path = os.path.abspath(pickle_path)
+    def __init__(self, pickle_path="project/data/pickle/indices_avl.pkl", dataset=None, wal_lsn=0, build_workers=None, prebuilt=None,
+                 file_format="pickle"):
+        """
+            pickle_path (str | None): None keeps the indices in memory only.
+            file_format (str): "pickle", or "snapshot" for an mmap-ed binary snapshot (snapshot.py) at pickle_path.
+            build_workers (int): processes used by rebuild() when there is no pickle to load.
+            prebuilt (StreamingIndexBuilder): fed with every movie of `dataset` while it was loaded;
+                                              used instead of rebuild() when there is no pickle to load.
+            dataset (dict): {movie_id: movie_record}, defaults to STORAGE.STORAGE_movie_dic.
+            wal_lsn (int): last write-ahead log entry contained in `dataset`,
+                           recorded in the pickle when the indices are built from it.
+        """
+        if file_format not in ("pickle", "snapshot"):
+            raise ValueError(f"Unknown index file format {file_format!r}")
+        self.pickle_path = os.path.abspath(pickle_path) if pickle_path is not None else None
+        self.file_format = file_format
+        self._snapshot = None #open snapshot.Snapshot the lazy indices are read from
+        self._blobs = {}
+        self.build_times = {} #seconds per index of the last rebuild()
 
         if dataset is None:
-            dataset = STORAGE_movie_dic
+            import STORAGE
+            dataset = STORAGE.STORAGE_movie_dic
         self.dataset = dataset
+        self.wal_lsn = wal_lsn
 
         if self.load_AVL_final(): #True
             print("load exav")
+        elif prebuilt is not None:
+            start = time.perf_counter()
+            for name, index in prebuilt.finish().items():
+                setattr(self, name, index)
+            self.build_times = {"finish": time.perf_counter() - start}
+            self.save_AVL_pickle()
         else: #False
-            self.AVL_title = AVLTreeMap()
-            self.AVL_year = AVLTreeMap()
-            self.AVL_genre = AVLTreeMap()
-
-            self.insert_overall()
+            self.rebuild(build_workers)
             self.save_AVL_pickle()
 
     ### <--------- DELETE_FROM_AVL ---------> ###
@@ -196,33 +385,66 @@ class MovieIndex:
 
         ### <--------- YEAR_AVL ---------> ###
         date = movie_dic.get("release_date")   #date = movie_dic["release_date"]
-        if not date or len(date) < 4:
-            return
-        year = int(date[:4])
+        if date and len(date) >= 4:            #movies without a date are only missing from AVL_year
+            year = int(date[:4])
 
-        existing_list = self.AVL_year.get(year)
+            existing_list = self.AVL_year.get(year)
 
-        if existing_list and movie_id in existing_list:
-            existing_list.remove(movie_id)
-            if len(existing_list) == 0:         #If the list is now empty, delete the whole year node O(log N)
-                self.AVL_year.remove(year)
+            if existing_list and movie_id in existing_list:     #O(log K) binary search
+                existing_list.remove(movie_id)
+                if len(existing_list) == 0:         #If the list is now empty, delete the whole year node O(log N)
+                    self.AVL_year.remove(year)
         ### <--------- YEAR_AVL ---------> ###
 
+        ### <--------- NUMERIC_AVL ---------> ###
+        for field in NUMERIC_FIELDS:
+            value = movie_dic.get(field)
+            if not _is_indexable_number(value):
+                continue
+
+            existing_list = self.AVL_numeric[field].get(value)
+
+            if existing_list and movie_id in existing_list:     #O(log K) binary search
+                existing_list.remove(movie_id)
+                if len(existing_list) == 0:
+                    self.AVL_numeric[field].remove(value)
+        ### <--------- NUMERIC_AVL ---------> ###
+
         ### <--------- GENRE_AVL ---------> ###
-        genres_list = movie_dic.get("genres")   #genres_list = movie_dic["genres"]
+        genres_list = movie_dic.get("genres") or []   #genres_list = movie_dic["genres"]
         for genre in genres_list:
 
             existing_list = self.AVL_genre.get(genre)
 
-            if existing_list and movie_id in existing_list:
+            if existing_list and movie_id in existing_list:     #O(log K) binary search
                 existing_list.remove(movie_id)
                 if len(existing_list) == 0:      #If the list is now empty, delete the whole year node O(log N)
                     self.AVL_genre.remove(genre)
         ### <--------- GENRE_AVL ---------> ###
 
         ### <--------- TITLE_AVL ---------> ###
-        self.AVL_title.remove(movie_dic.get("title"))
+        title = movie_dic.get("title")
+        existing_ids = self.AVL_title.get(title)
+
+        if existing_ids == movie_id:            #the only movie with this title
+            self.AVL_title.remove(title)
+        elif isinstance(existing_ids, PostingList) and movie_id in existing_ids:
+            existing_ids.remove(movie_id)
+            if len(existing_ids) == 1:          #back to a single ID, the compact form
+                self.AVL_title.put(title, next(iter(existing_ids)))
         ### <--------- TITLE_AVL ---------> ###
+
+        ### <--------- TEXT_INDEX ---------> ###
+        self.TEXT.remove(movie_id, movie_dic)
+        ### <--------- TEXT_INDEX ---------> ###
+
+        ### <--------- TITLE_PREFIX ---------> ###
+        self.TITLE_PREFIX.remove(movie_id, movie_dic)
+        ### <--------- TITLE_PREFIX ---------> ###
+
+        ### <--------- TITLE_FUZZY ---------> ###
+        self.TITLE_FUZZY.remove(movie_id, movie_dic)
+        ### <--------- TITLE_FUZZY ---------> ###
     ### <--------- DELETE_FROM_AVL ---------> ###
 
     
@@ -230,62 +452,202 @@ class MovieIndex:
     def inserting_process(self, movie_dic, movie_id):
         ### <--------- YEAR_AVL ---------> ###
         date = movie_dic.get("release_date")    #date = movie_dic["release_date"]
-        if not date or len(date) < 4:
-            return
-        year = int(date[:4])
+        if date and len(date) >= 4:             #movies without a date are only missing from AVL_year
+            year = int(date[:4])
 
-        existing_list = self.AVL_year.get(year)
+            existing_list = self.AVL_year.get(year)
 
-        if existing_list is None:
-            self.AVL_year.put(year, [movie_id])
-        else:
-            existing_list.append(movie_id)
+            if existing_list is None:
+                self.AVL_year.put(year, PostingList([movie_id]))
+            else:
+                existing_list.add(movie_id)          #O(1) for a new largest ID, else O(log K) + memmove
         ### <--------- YEAR_AVL ---------> ###
 
+        ### <--------- NUMERIC_AVL ---------> ###
+        self._insert_numeric(movie_dic, movie_id)
+        ### <--------- NUMERIC_AVL ---------> ###
+
         ### <--------- GENRE_AVL ---------> ###
-        genres_list = movie_dic.get("genres")   #genres_list = movie_dic["genres"]
+        genres_list = movie_dic.get("genres") or []   #genres_list = movie_dic["genres"]
         for genre in genres_list:
 
             existing_list = self.AVL_genre.get(genre)
 
             if existing_list is None:
-                self.AVL_genre.put(genre, [movie_id])
+                self.AVL_genre.put(genre, PostingList([movie_id]))
             else:
-                existing_list.append(movie_id)
+                existing_list.add(movie_id)          #O(1) for a new largest ID, else O(log K) + memmove
         ### <--------- GENRE_AVL ---------> ###
 
         ### <--------- TITLE_AVL ---------> ###
-        self.AVL_title.put(movie_dic.get("title"), movie_id)  #AVL_title.put(movie_dic["title"], movie_id)
+        #Titles are almost always unique: store a bare ID and only switch to a
+        #PostingList when a remake/re-release shares the title (no per-title list overhead)
+        title = movie_dic.get("title")
+        existing_ids = self.AVL_title.get(title)
+
+        if existing_ids is None:
+            self.AVL_title.put(title, movie_id)  #AVL_title.put(movie_dic["title"], movie_id)
+        elif isinstance(existing_ids, PostingList):
+            existing_ids.add(movie_id)
+        elif existing_ids != movie_id:
+            self.AVL_title.put(title, PostingList([existing_ids, movie_id]))
         ### <--------- TITLE_AVL ---------> ###
 
+        ### <--------- TEXT_INDEX ---------> ###
+        self.TEXT.insert(movie_id, movie_dic)   #overview, tagline, keywords -> BM25 postings
+        ### <--------- TEXT_INDEX ---------> ###
+
+        ### <--------- TITLE_PREFIX ---------> ###
+        self.TITLE_PREFIX.insert(movie_id, movie_dic)   #normalized title -> autocomplete top-k
+        ### <--------- TITLE_PREFIX ---------> ###
+
+        ### <--------- TITLE_FUZZY ---------> ###
+        self.TITLE_FUZZY.insert(movie_id, movie_dic)    #normalized title trigrams -> typo-tolerant lookup
+        ### <--------- TITLE_FUZZY ---------> ###
+
+
+    def _insert_numeric(self, movie_dic, movie_id):
+        for field in NUMERIC_FIELDS:
+            value = movie_dic.get(field)
+            if not _is_indexable_number(value): #missing values are stored as "" by to_number
+                continue
+
+            existing_list = self.AVL_numeric[field].get(value)
+
+            if existing_list is None:
+                self.AVL_numeric[field].put(value, PostingList([movie_id]))
+            else:
+                existing_list.add(movie_id)          #O(1) for a new largest ID, else O(log K) + memmove
+
 
     def insert_overall(self):
         for movie_id, movie_dic in self.dataset.items():
             self.inserting_process(movie_dic, movie_id)
+
+    def rebuild(self, workers=None):
+        """
+        Drop every index and bulk-build all of them from self.dataset (build_indices):
+        IDs are grouped by key, then each tree is built bottom-up from the sorted keys in O(N).
+        workers > 1 builds the independent indices concurrently in forked processes (the built
+        indices are pickled back to this process). Seconds per index end up in self.build_times.
+        """
+        self._blobs = {}
+        self.build_times = {}
+
+        if workers and workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            global _BUILD_DATASET
+            _BUILD_DATASET = self.dataset
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                    futures = {name: pool.submit(_timed_build, name) for name in INDEX_NAMES}
+                    for name, future in futures.items():
+                        index, seconds = future.result()
+                        setattr(self, name, index)
+                        self.build_times[name] = seconds
+            finally:
+                _BUILD_DATASET = None
+            return
+
+        for name in INDEX_NAMES:
+            start = time.perf_counter()
+            setattr(self, name, build_indices(self.dataset, [name])[name])
+            self.build_times[name] = time.perf_counter() - start
     ### <--------- INSERT_TO_AVL ---------> ###
 
 
     ### <--------- PICKLE Functions ---------> ###
-    def save_AVL_pickle(self):
-        """Pickle the AVL tree indices"""
-        with open(self.pickle_path, "wb") as f:
-            pickle.dump({
-                "AVL_title": self.AVL_title,
-                "AVL_year": self.AVL_year,
-                "AVL_genre": self.AVL_genre
-            }, f)
+    def save_AVL_pickle(self, wal_lsn=None):
+        """
+        Pickle the indices together with the last WAL entry they contain.
+        Each index is pickled on its own, so load_AVL_pickle can defer unpickling it;
+        indices that were never accessed are written back as the bytes they were loaded from.
+        """
+        if wal_lsn is not None:
+            self.wal_lsn = wal_lsn
+        if self.pickle_path is None: #in-memory index
+            return
+        if self.file_format == "snapshot":
+            self._save_snapshot()
+            return
+
+        blobs = {}
+        for name in INDEX_NAMES:
+            with _LAZY_LOCK:
+                blob = None if name in self.__dict__ else self._blobs[name]
+            if blob is None or callable(blob): #loaded, or still to be built
+                blob = pickle.dumps(getattr(self, name), protocol=pickle.HIGHEST_PROTOCOL)
+            blobs[name] = blob
+        atomic_pickle_dump({"wal_lsn": self.wal_lsn, "indices": blobs}, self.pickle_path)
         
+    def _save_snapshot(self):
+        """Indices never loaded since the last snapshot are copied over as raw sections"""
+        import snapshot
+        with _LAZY_LOCK:
+            indices = {name: self.__dict__.get(name) for name in INDEX_NAMES}
+            self._snapshot = snapshot.save_indices(self.pickle_path, indices, self.wal_lsn, previous=self._snapshot)
+            self._lazy_from_snapshot([name for name in INDEX_NAMES if name not in self.__dict__])
+
+    def _lazy_from_snapshot(self, names):
+        import snapshot
+        self._blobs = {name: (lambda name=name: snapshot.read_index(self._snapshot, name) if snapshot.has_index(self._snapshot, name)
+                              else build_indices(self.dataset, [name])[name]) #index added after the snapshot was written
+                       for name in names}
+
     def load_AVL_pickle(self):
+        if self.file_format == "snapshot":
+            import snapshot
+            self._snapshot = snapshot.Snapshot(self.pickle_path, snapshot.KIND_INDICES)
+            self.wal_lsn = self._snapshot.wal_lsn
+            self._lazy_from_snapshot(INDEX_NAMES) #built from the mapped arrays on first access, on this process's heap
+            return
+
         with open(self.pickle_path, "rb") as f:
             data = pickle.load(f)
-            self.AVL_title = data["AVL_title"]
-            self.AVL_year = data["AVL_year"]
-            self.AVL_genre = data["AVL_genre"]
+        self.wal_lsn = data.get("wal_lsn", 0)
+
+        if "indices" in data:
+            self._blobs = data["indices"] #unpickled one by one on first access, see __getattr__
+            for name in INDEX_NAMES: #indices added after that pickle was written: built on first access
+                self._blobs.setdefault(name, lambda name=name: build_indices(self.dataset, [name])[name])
+            return
+
+        #older format: every index pickled inline in one dictionary
+        self.AVL_title = data["AVL_title"]
+        self.AVL_year = data["AVL_year"]
+        self.AVL_genre = data["AVL_genre"]
+        self.AVL_numeric = data.get("AVL_numeric")
+        self.TEXT = data.get("TEXT")
+        self.TITLE_PREFIX = data.get("TITLE_PREFIX")
+        self.TITLE_FUZZY = data.get("TITLE_FUZZY")
+
+        #pickles written before PostingList store plain lists of IDs
+        for tree in [self.AVL_year, self.AVL_genre] + list((self.AVL_numeric or {}).values()):
+            for entry in list(tree.entry_set()):
+                if isinstance(entry.get_value(), list):
+                    entry._set_value(PostingList(entry.get_value()))
+
+        #indices added after that pickle was written
+        for name in ["AVL_numeric", "TEXT", "TITLE_PREFIX", "TITLE_FUZZY"]:
+            if getattr(self, name) is None:
+                setattr(self, name, build_indices(self.dataset, [name])[name])
+
+    def __getattr__(self, name):
+        """Only called for missing attributes: unpickle (or read from the snapshot) a lazily loaded index on first use."""
+        blobs = self.__dict__.get("_blobs")
+        if blobs and name in blobs:
+            with _LAZY_LOCK:
+                if name in self.__dict__: #loaded by another thread meanwhile
+                    return self.__dict__[name]
+                blob = self._blobs.pop(name)
+                value = blob() if callable(blob) else pickle.loads(blob)
+                setattr(self, name, value)
+                return value
+        raise AttributeError(f"'MovieIndex' object has no attribute '{name}'")
     ### <--------- PICKLE Functions ---------> ###
 
     ### <--------- UNIFIED Loader ---------> ###
     def load_AVL_final(self):
-        if os.path.exists(self.pickle_path):
+        if self.pickle_path is not None and os.path.exists(self.pickle_path):
             self.load_AVL_pickle() # Load from pickle if it exists
             return True
         else:  # False ==> create new AVLs
@@ -294,7 +656,19 @@ class MovieIndex:
 
 
 
-INDEX_searching_engine = MovieIndex()
+### <--------- LAZY Module Global ---------> ###
+def __getattr__(name):
+    """
+    INDEX_searching_engine used to be built when this module was imported.
+    It is now built on first access; new code should use database.open_database().
+    """
+    if name == "INDEX_searching_engine":
+        import STORAGE
+        global INDEX_searching_engine
+        INDEX_searching_engine = MovieIndex(wal_lsn=STORAGE.storager_obj.wal_lsn)
+        return INDEX_searching_engine
+    raise AttributeError(f"module 'indexing' has no attribute '{name}'")
+### <--------- LAZY Module Global ---------> ###
 
 #print(INDEX_searching_engine.AVL_year.get(2000))
 
@@ -0,0 +1,374 @@
+"""
+Off-by-default instrumentation of the hot paths.
+
+    import instrumentation
+    instrumentation.enable()
+    ...
+    print(instrumentation.prometheus_text())
+    instrumentation.disable()
+
+enable() wraps the methods listed in HOT_PATHS with a timer (and COUNTED_PATHS with a counter),
+disable() puts the original functions back: while disabled nothing is wrapped, so there is no cost at all.
+A timer costs ~0.7 microseconds per call: negligible for the entry points, but not for the helpers
+called once per index entry (DETAILED_PATHS), which are only timed with enable(detailed=True).
+"""
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+
+### <--------- HISTOGRAM ---------> ###
+SUB_BUCKETS = 4 #per power of two: a bucket spans at most 25% of its lower bound
+
+def _bucket(value):
+    """Bucket of a non-negative int: exact below 8, then 4 buckets per power of two"""
+    if value < 8:
+        return value
+    bits = value.bit_length()
+    return (bits - 3) * SUB_BUCKETS + (value >> (bits - 3))
+
+def _bucket_bounds(index):
+    """(lowest, highest) value of a bucket"""
+    if index < 8:
+        return index, index
+    bits = index // SUB_BUCKETS + 2
+    step = 1 << (bits - 3)
+    low = (index % SUB_BUCKETS + SUB_BUCKETS) * step
+    return low, low + step - 1
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative ints (nanoseconds, result sizes). observe() is one
+    bit_length and a few increments, and quantiles are within 25% of the true value.
+    Updates are not locked: two threads observing at once may, rarely, lose one count.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.counts = [0] * (SUB_BUCKETS * 64)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, 0 when empty"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(_bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """[(bound, observations <= bound)] for ascending bounds (Prometheus buckets)"""
+        result, seen, index = [], 0, 0
+        for bound in bounds:
+            while index < len(self.counts) and _bucket_bounds(index)[1] <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append((bound, seen))
+        return result
+### <--------- HISTOGRAM ---------> ###
+
+
+### <--------- REGISTRY ---------> ###
+class Operation:
+    """Metrics of one instrumented method"""
+    __slots__ = ("latency", "sizes", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()  #nanoseconds
+        self.sizes = Histogram()    #len() of the result, for the methods returning collections
+        self.errors = 0
+
+
+operations = {}     #"QueryEngine.search_by_genre" -> Operation
+events = {}         #"avl_rotation" -> count
+_patched = []       #(owner class, attribute name, original function) while enabled
+_lock = threading.Lock()
+
+def _operation(name):
+    operation = operations.get(name)
+    if operation is None:
+        operation = operations.setdefault(name, Operation())
+    return operation
+
+def reset():
+    """Zero every collected metric, in place: the installed wrappers keep recording into them"""
+    for operation in operations.values():
+        operation.latency.clear()
+        operation.sizes.clear()
+        operation.errors = 0
+    for event in events:
+        events[event] = 0
+### <--------- REGISTRY ---------> ###
+
+
+### <--------- HOT PATHS ---------> ###
+def _size_of_page(result):
+    return len(result[0])
+
+#(module, class, method, size function or None); methods returning a list record len(result)
+HOT_PATHS = [
+    ("query_engine", "QueryEngine", name, len) for name in (
+        "search_by_title", "search_by_year", "search_by_genre", "search_by_year_range", "search_text",
+        "autocomplete", "search_by_title_fuzzy", "range_query", "query", "insert_many")
+] + [
+    ("query_engine", "QueryEngine", name, None) for name in (
+        "search_by_id", "explain", "aggregate", "insert_movie", "delete_movie", "modify_movie", "delete_many", "modify_many",
+        "apply_source_delta", "checkpoint")
+] + [
+    ("query_engine", "QueryEngine", name, _size_of_page) for name in (
+        "page_by_year", "page_by_genre", "page_by_year_range", "page_range")
+] + [
+    ("indexing", "MovieIndex", "inserting_process", None),
+    ("indexing", "MovieIndex", "deleting_process", None),
+    ("indexing", "MovieIndex", "save_AVL_pickle", None),
+    ("indexing", "MovieIndex", "load_AVL_pickle", None),
+    ("indexing", "MovieIndex", "rebuild", None),
+    ("STORAGE", "STORAGE_DATASET", "load_DATASET_final", len),
+    ("STORAGE", "STORAGE_DATASET", "load_movie_csv", len),
+    ("STORAGE", "STORAGE_DATASET", "load_DATASET_pickle", len),
+    ("STORAGE", "STORAGE_DATASET", "save_DATASET_pickle", None),
+    ("audit_logger", "AuditLogger", "_log_entry", None),
+    ("audit_logger", "AuditLogger", "flush", None),
+    ("wal", "WriteAheadLog", "append", None),
+    ("wal", "WriteAheadLog", "append_batch", None),
+]
+
+#called once per index entry by range_query, query, ...: timing them doubles the cost of a range scan
+DETAILED_PATHS = [
+    ("query_engine", "QueryEngine", "_fetch_records", len),
+    ("indexing", "AVLTreeMap", "get_keys_with_prefix", len),
+]
+
+#(module, class, method, event): only counted, these run too often to be timed
+COUNTED_PATHS = [
+    ("indexing", "AVLTreeMap", "_rebalance", "avl_rebalance"),
+    ("indexing", "BalanceableBinaryTree", "restructure", "avl_restructure"),
+    ("indexing", "BalanceableBinaryTree", "_rotate", "avl_rotation"),
+]
+
+def _timed(function, name, size_of):
+    operation = _operation(name)
+    latency, sizes, clock = operation.latency, operation.sizes, time.perf_counter_ns
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            operation.errors += 1
+            raise
+        elapsed = clock() - start
+        #Histogram.observe inlined: this runs on every call of every hot path
+        bits = elapsed.bit_length()
+        latency.counts[elapsed if bits < 4 else (bits - 3) * SUB_BUCKETS + (elapsed >> (bits - 3))] += 1
+        latency.count += 1
+        latency.total += elapsed
+        if elapsed > latency.max:
+            latency.max = elapsed
+        if size_of is not None:
+            try:
+                sizes.observe(size_of(result))
+            except TypeError: #None, a bare ID, ...
+                pass
+        return result
+
+    timed.__wrapped__ = function
+    timed.__name__ = function.__name__
+    timed.__doc__ = function.__doc__
+    return timed
+
+def _counted(function, event):
+    events.setdefault(event, 0)
+
+    def counted(*args, **kwargs):
+        events[event] += 1
+        return function(*args, **kwargs)
+
+    counted.__wrapped__ = function
+    counted.__name__ = function.__name__
+    return counted
+
+def _calls_super(function):
+    return "super" in getattr(getattr(function, "__code__", None), "co_names", ())
+
+def _owners(cls, attribute):
+    """
+    cls and every subclass defining attribute itself (e.g. ThreadSafeQueryEngine's locked methods).
+    Overrides calling super() are skipped: they reach the patched method of cls, so wrapping them
+    too would count every call twice (ThreadSafeQueryEngine.checkpoint).
+    """
+    pending, owners = [cls], []
+    while pending:
+        owner = pending.pop()
+        if attribute in owner.__dict__ and (owner is cls or not _calls_super(owner.__dict__[attribute])):
+            owners.append(owner)
+        pending.extend(owner.__subclasses__())
+    return owners
+
+def _patch(wrap, paths):
+    for module_name, class_name, attribute, extra in paths:
+        cls = getattr(importlib.import_module(module_name), class_name, None)
+        if cls is None or not callable(getattr(cls, attribute, None)): #e.g. another ds_collection
+            continue
+        for owner in _owners(cls, attribute):
+            original = owner.__dict__[attribute]
+            _patched.append((owner, attribute, original))
+            setattr(owner, attribute, wrap(original, f"{class_name}.{attribute}", extra))
+
+def enable(detailed=False):
+    """Wrap the hot paths (and DETAILED_PATHS when detailed). Calling it again while enabled does nothing."""
+    with _lock:
+        if _patched:
+            return
+        importlib.import_module("concurrency") #so ThreadSafeQueryEngine wraps the original methods
+        _patch(_timed, HOT_PATHS + (DETAILED_PATHS if detailed else []))
+        _patch(lambda original, name, event: _counted(original, event), COUNTED_PATHS)
+
+def disable():
+    """Put the original methods back; the collected metrics are kept"""
+    with _lock:
+        while _patched:
+            owner, attribute, original = _patched.pop()
+            setattr(owner, attribute, original)
+
+def is_enabled():
+    return bool(_patched)
+### <--------- HOT PATHS ---------> ###
+
+
+### <--------- EXPORTERS ---------> ###
+PROMETHEUS_PREFIX = "movies_db"
+#Prometheus buckets, in seconds: powers of 4 from 1 microsecond to ~17 seconds
+LATENCY_BUCKETS = [4 ** k / 1e6 for k in range(13)]
+SIZE_BUCKETS = [4 ** k for k in range(13)]
+
+def snapshot():
+    """{"operations": {name: summary}, "events": {name: count}}, latencies in milliseconds"""
+    summary = {}
+    for name, operation in sorted(operations.items()):
+        latency, sizes = operation.latency, operation.sizes
+        if not latency.count and not operation.errors:
+            continue
+        summary[name] = {
+            "count": latency.count,
+            "errors": operation.errors,
+            "mean_ms": latency.total / latency.count / 1e6 if latency.count else 0.0,
+            "p50_ms": latency.quantile(0.5) / 1e6,
+            "p99_ms": latency.quantile(0.99) / 1e6,
+            "max_ms": latency.max / 1e6,
+        }
+        if sizes.count:
+            summary[name].update({"size_p50": sizes.quantile(0.5), "size_p99": sizes.quantile(0.99), "size_max": sizes.max})
+    return {"operations": summary, "events": dict(events)}
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format"""
+    p = PROMETHEUS_PREFIX
+    lines = [
+        f"# HELP {p}_operation_seconds Latency of instrumented operations.",
+        f"# TYPE {p}_operation_seconds histogram",
+    ]
+    for name, operation in sorted(operations.items()):
+        latency = operation.latency
+        if not latency.count:
+            continue
+        for bound, count in latency.cumulative([bound * 1e9 for bound in LATENCY_BUCKETS]):
+            lines.append(f'{p}_operation_seconds_bucket{{op="{name}",le="{bound / 1e9:g}"}} {count}')
+        lines.append(f'{p}_operation_seconds_bucket{{op="{name}",le="+Inf"}} {latency.count}')
+        lines.append(f'{p}_operation_seconds_sum{{op="{name}"}} {latency.total / 1e9:.9f}')
+        lines.append(f'{p}_operation_seconds_count{{op="{name}"}} {latency.count}')
+
+    lines += [f"# HELP {p}_operation_errors_total Instrumented operations that raised.",
+              f"# TYPE {p}_operation_errors_total counter"]
+    lines += [f'{p}_operation_errors_total{{op="{name}"}} {operation.errors}'
+              for name, operation in sorted(operations.items()) if operation.latency.count or operation.errors]
+
+    lines += [f"# HELP {p}_result_size Number of records or entries returned.",
+              f"# TYPE {p}_result_size histogram"]
+    for name, operation in sorted(operations.items()):
+        sizes = operation.sizes
+        if not sizes.count:
+            continue
+        for bound, count in sizes.cumulative(SIZE_BUCKETS):
+            lines.append(f'{p}_result_size_bucket{{op="{name}",le="{bound}"}} {count}')
+        lines.append(f'{p}_result_size_bucket{{op="{name}",le="+Inf"}} {sizes.count}')
+        lines.append(f'{p}_result_size_sum{{op="{name}"}} {sizes.total}')
+        lines.append(f'{p}_result_size_count{{op="{name}"}} {sizes.count}')
+
+    lines += [f"# HELP {p}_events_total AVL rebalancing work.", f"# TYPE {p}_events_total counter"]
+    lines += [f'{p}_events_total{{event="{event}"}} {count}' for event, count in sorted(events.items())]
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    """Atomically write prometheus_text() to path (e.g. for the node_exporter textfile collector)"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def log_metrics(logger=None, level=logging.INFO):
+    """Structured log: one JSON record per operation, and one for the events"""
+    logger = logger or logging.getLogger("movies_db.metrics")
+    current = snapshot()
+    for name, summary in current["operations"].items():
+        logger.log(level, json.dumps({"metric": "operation", "op": name, **summary}))
+    if current["events"]:
+        logger.log(level, json.dumps({"metric": "events", **current["events"]}))
+
+
+class PeriodicExporter:
+    """
+    Calls every exporter (a function without arguments, e.g. log_metrics or
+    lambda: write_prometheus(path)) every `interval` seconds from a daemon thread.
+    """
+    def __init__(self, exporters, interval=60.0):
+        self.exporters = list(exporters)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        for exporter in self.exporters:
+            try:
+                exporter()
+            except Exception: #an exporter failing must not stop the others
+                logging.getLogger("movies_db.metrics").exception("metrics exporter failed")
+
+    def stop(self, final_export=True):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if final_export:
+            self.export()
+### <--------- EXPORTERS ---------> ###
+
+#©Vardan Grigoryan
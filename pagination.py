@@ -0,0 +1,46 @@
+import base64
+import json
+from itertools import islice
+
+PAGE_SIZE = 20
+
+### <--------- CURSORS ---------> ###
+def encode_cursor(query, key):
+    """
+    Opaque cursor: the query it belongs to and the sort key of the last row returned.
+    Keyset pagination resumes after that key, so rows inserted or deleted between two pages
+    never shift the next page.
+    """
+    payload = json.dumps({"q": query, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, query):
+    """Sort key stored in cursor. ValueError for a malformed cursor or one from another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        stored_query, key = payload["q"], payload["k"]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+    if stored_query != json.loads(json.dumps(query)): #compare in JSON form (tuples come back as lists)
+        raise ValueError("Cursor belongs to another query")
+    return tuple(key) if isinstance(key, list) else key
+### <--------- CURSORS ---------> ###
+
+
+### <--------- PAGES ---------> ###
+def paginate(keyed_rows, query, limit=PAGE_SIZE, offset=0):
+    """
+    First `limit` records after skipping `offset` of keyed_rows, an iterator of (sort key, record).
+    Returns (records, next_cursor); next_cursor is None on the last page.
+    Reads offset + limit + 1 rows, whatever the size of the full result.
+    """
+    if limit < 0 or offset < 0:
+        raise ValueError("limit and offset must be >= 0")
+    rows = list(islice(keyed_rows, offset, offset + limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(query, rows[-1][0]) if has_more and rows else None
+    return [record for _, record in rows], next_cursor
+### <--------- PAGES ---------> ###
+
+#©Vardan Grigoryan
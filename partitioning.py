@@ -0,0 +1,566 @@
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from operator import itemgetter
+
+from database import Database
+from STORAGE import STORAGE_DATASET
+from indexing import NUMERIC_FIELDS
+from query_engine import _validate_movie
+from aggregation import _Group, add_total, format_groups, metric_fields, parse_metrics
+from columnar import _year_of
+from pagination import PAGE_SIZE, decode_cursor, paginate
+from title_prefix_index import _rank_value
+from fuzzy_title_index import MAX_DISTANCE
+
+SCHEMES = ["hash", "year"]
+ITER_PAGE_SIZE = 500 #rows fetched per partition round trip by iter_*
+
+def _partition_dir(path, k):
+    return os.path.join(path, "partitions", str(k))
+
+
+### <--------- PARTITION Worker ---------> ###
+class _Partition:
+    """
+    Runs in the worker process next to one partition's QueryEngine. Listing methods return
+    (sort key, record) rows so the coordinator can merge the partitions without re-sorting.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+
+    def info(self):
+        return {"movies": len(self.engine.by_id), "next_key": self.engine.storager.getter_next_key_to_insert()}
+
+    def ids(self):
+        return list(self.engine.by_id)
+
+    def records(self, movie_ids):
+        by_id = self.engine.by_id
+        return {movie_id: by_id[movie_id] for movie_id in movie_ids if movie_id in by_id}
+
+    def missing(self, movie_ids):
+        return [movie_id for movie_id in movie_ids if movie_id not in self.engine.by_id]
+
+    def keyed(self, kind, args, after=None, reverse=False, limit=None):
+        """First `limit` rows of a title/year/genre posting list or of a field range, after the cursor key"""
+        engine = self.engine
+        if kind == "range":
+            rows = engine._keyed_range(*args, after=after, reverse=reverse)
+        else:
+            index = {"title": engine.title_idx, "year": engine.year_idx, "genre": engine.genre_idx}[kind]
+            rows = engine._keyed_postings(index.get(args[0]), after, reverse)
+        return list(islice(rows, limit))
+
+    def scan(self, field, low, high):
+        """(movie_id, record) of an unindexed range, the QueryEngine.range_query scan in ID order"""
+        return [(movie_id, record) for movie_id, record in self.engine.by_id.items()
+                if isinstance(record.get(field), (int, float)) and low <= record[field] <= high]
+
+    def fuzzy(self, movie_title, k, max_distance):
+        by_id = self.engine.by_id
+        return [(distance, movie_id, by_id[movie_id]) for distance, movie_id
+                in self.engine.indexer.TITLE_FUZZY.search(movie_title, k, max_distance) if movie_id in by_id]
+
+    def query(self, predicate):
+        engine = self.engine
+        movie_ids = engine.planner.execute(engine.planner.plan(predicate))
+        return [(movie_id, engine.by_id[movie_id]) for movie_id in movie_ids if movie_id in engine.by_id]
+
+    def text_stats(self, text):
+        return self.engine.indexer.TEXT.term_stats(text)
+
+    def text_search(self, text, k, stats):
+        return [(score, movie_id, self.engine.by_id[movie_id])
+                for score, movie_id in self.engine.indexer.TEXT.search(text, k, stats) if movie_id in self.engine.by_id]
+
+    def autocomplete(self, prefix, k, rank_by):
+        by_id = self.engine.by_id
+        return [(_rank_value(by_id[movie_id].get(rank_by)), movie_id, by_id[movie_id])
+                for movie_id in self.engine.indexer.TITLE_PREFIX.top_k(prefix, k, rank_by) if movie_id in by_id]
+
+    def call(self, method, *args, **kwargs):
+        """Any QueryEngine method (mutations, aggregate, explain, checkpoint...)"""
+        return getattr(self.engine, method)(*args, **kwargs)
+
+
+def _serve(path, options, connection):
+    """Worker process: open the partition's Database, then answer (method, args, kwargs) until None"""
+    database = Database(path, **options)
+    partition = _Partition(database.engine)
+    connection.send((True, partition.info()))
+    while True:
+        request = connection.recv()
+        if request is None:
+            database.close()
+            connection.send((True, None))
+            return
+        method, args, kwargs = request
+        try:
+            reply = (True, getattr(partition, method)(*args, **kwargs))
+        except Exception as exc:
+            reply = (False, exc)
+        try:
+            connection.send(reply)
+        except Exception as exc: #the result or the exception did not pickle
+            connection.send((False, ValueError(f"{type(exc).__name__}: {exc}")))
+### <--------- PARTITION Worker ---------> ###
+
+
+class PartitionedQueryEngine:
+    """
+    The catalog split over N worker processes, each owning a partition: a Database under
+    <path>/partitions/<k> with its own records, AVL indices, write-ahead log and checkpoints.
+    This object is the coordinator: it fans a query out to the partitions that may hold matches
+    (they run it in parallel, each with its own GIL), merges their sorted or top-k rows, and
+    routes every mutation to the partition owning the movie.
+        scheme "hash": a movie lives in partition movie_id % N.
+        scheme "year": partitions hold release-year ranges balanced at split time (no year: partition 0);
+                       search_by_year / year ranges only ask the partitions covering them, and a
+                       modify changing the year moves the movie (insert in the new partition, then delete).
+    Same public API and result order as QueryEngine. Scatter-gather pays for pickling the
+    returned records through a pipe, so it wins on CPU-heavy queries (range scans, query(),
+    aggregate, big genres), not on point lookups. Batches are atomic per partition only.
+    The first start splits <path>'s catalog (records pickle, or the CSV) in `partitions` (default:
+    CPU count) `scheme` (default: "hash") partitions and writes partitions/manifest.json last;
+    later starts reopen the partitions as they are, and partitions/scheme, when passed, must match.
+    """
+    def __init__(self, path="project/data", partitions=None, scheme=None, csv_path=None, backend="dict",
+                 checkpoint_every=1000, audit_batch_size=1, build_workers=None, load_workers=None):
+        if scheme is not None and scheme not in SCHEMES:
+            raise ValueError(f"Unknown partitioning scheme {scheme!r}, expected one of {SCHEMES}")
+        self.path = os.path.abspath(path)
+        manifest_path = os.path.join(self.path, "partitions", "manifest.json")
+        if not os.path.exists(manifest_path):
+            self._split(csv_path, partitions or os.cpu_count() or 1, scheme or "hash", backend, load_workers)
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (partitions is not None and partitions != manifest["partitions"]
+                or scheme is not None and scheme != manifest["scheme"]):
+            raise ValueError(f"{self.path} is split in {manifest['partitions']} {manifest['scheme']} partitions")
+        self.scheme = manifest["scheme"]
+        self.partitions = manifest["partitions"]
+        self.boundaries = manifest["boundaries"]
+
+        self._writer = threading.RLock() #key allocation, directory and cross-partition moves
+        self._locks = [threading.Lock() for _ in range(self.partitions)] #one request in flight per pipe
+        self._connections, self._processes = [], []
+        options = {"backend": backend, "checkpoint_every": checkpoint_every, "audit_batch_size": audit_batch_size,
+                   "build_workers": build_workers}
+        for k in range(self.partitions):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(_partition_dir(self.path, k), options, child),
+                                              name=f"partition-{k}", daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        infos = [self._receive(k)[1] for k in range(self.partitions)] #partitions load in parallel
+        self._next_key = max(info["next_key"] for info in infos)
+        self._owners = self._load_directory() if self.scheme == "year" else None
+
+
+    ### <--------- SPLIT ---------> ###
+    def _split(self, csv_path, partitions, scheme, backend, load_workers):
+        """
+        First start: write one records file per partition from the unpartitioned catalog, then the manifest.
+        The catalog is read as it is (its records pickle, else the CSV): nothing is written next to it.
+        """
+        if not 1 <= partitions <= 32767:
+            raise ValueError("partitions must be between 1 and 32767")
+        catalog = Database(self.path, csv_path=csv_path) #paths only, nothing is loaded through it
+        if os.path.exists(catalog.wal_path) and os.path.getsize(catalog.wal_path):
+            raise ValueError(f"{catalog.wal_path} has mutations not checkpointed yet: close() that database first")
+        source = STORAGE_DATASET(csv_path=catalog.csv_path, pickle_path=catalog.records_path)
+        if os.path.exists(source.pickle_path):
+            records = source.load_DATASET_pickle()
+        else:
+            records = source.load_movie_csv(workers=load_workers)
+
+        boundaries = []
+        if scheme == "year":
+            years = sorted(year for year in map(_year_of, records.values()) if year is not None)
+            boundaries = sorted({years[len(years) * i // partitions] for i in range(1, partitions)} if years else set())
+        self.scheme, self.partitions, self.boundaries = scheme, partitions, boundaries
+
+        split = [{} for _ in range(partitions)]
+        for movie_id, record in records.items():
+            split[self._partition_of(movie_id, record)][movie_id] = record
+        for k, part in enumerate(split):
+            layout = Database(_partition_dir(self.path, k), backend=backend)
+            os.makedirs(os.path.dirname(layout.records_path), exist_ok=True)
+            storage = STORAGE_DATASET(csv_path=layout.csv_path, pickle_path=layout.records_path, backend=backend)
+            storage.records_dic = storage._as_backend(part)
+            storage.save_DATASET_pickle(0)
+
+        manifest_path = os.path.join(self.path, "partitions", "manifest.json")
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"scheme": scheme, "partitions": partitions, "boundaries": boundaries}, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _partition_of(self, movie_id, record=None):
+        if self.scheme == "hash":
+            return movie_id % self.partitions
+        year = _year_of(record)
+        return 0 if year is None else bisect_right(self.boundaries, year)
+
+    def _load_directory(self):
+        """
+        movie_id -> partition for the year scheme. A movie found twice was being moved when the
+        process stopped (inserted in its new partition, not yet deleted from the old one):
+        the copy outside the partition its year maps to is deleted now.
+        """
+        owners = array("h")
+        duplicates = {}
+        for k, movie_ids in sorted(self._broadcast("ids").items()):
+            for movie_id in movie_ids:
+                if movie_id >= len(owners):
+                    owners.extend([-1] * (movie_id + 1 - len(owners)))
+                if owners[movie_id] != -1:
+                    duplicates.setdefault(movie_id, [owners[movie_id]]).append(k)
+                owners[movie_id] = k
+        for movie_id, holders in duplicates.items():
+            record = self._call(holders[0], "records", [movie_id])[movie_id]
+            owner = self._partition_of(movie_id, record)
+            for k in holders:
+                if k != owner:
+                    self._call(k, "call", "delete_movie", movie_id)
+            owners[movie_id] = owner
+        return owners
+
+    def _owner(self, movie_id):
+        """Partition holding movie_id, None when it cannot exist"""
+        if not isinstance(movie_id, int) or movie_id < 0:
+            return None
+        if self._owners is None:
+            return movie_id % self.partitions
+        owner = self._owners[movie_id] if movie_id < len(self._owners) else -1
+        return None if owner == -1 else owner
+
+    def _set_owner(self, movie_id, k):
+        if self._owners is not None:
+            if movie_id >= len(self._owners):
+                self._owners.extend([-1] * (movie_id + 1 - len(self._owners)))
+            self._owners[movie_id] = k
+
+    def _year_partitions(self, start_year, end_year):
+        """Partitions that may hold release years in [start_year, end_year]"""
+        if self.scheme != "year":
+            return range(self.partitions)
+        return range(bisect_right(self.boundaries, start_year), bisect_right(self.boundaries, end_year) + 1)
+    ### <--------- SPLIT ---------> ###
+
+
+    ### <--------- SCATTER-GATHER ---------> ###
+    def _receive(self, k):
+        try:
+            return self._connections[k].recv()
+        except EOFError:
+            raise RuntimeError(f"partition {k} worker exited (exit code {self._processes[k].exitcode})") from None
+
+    def _scatter(self, calls):
+        """
+        {partition: (method, args, kwargs)} -> {partition: result}. Every request is sent before
+        any reply is read, so the partitions work in parallel. Pipe locks are taken in partition
+        order: concurrent callers never deadlock, and queries on disjoint partitions overlap.
+        """
+        order = sorted(calls)
+        for k in order:
+            self._locks[k].acquire()
+        try:
+            for k in order:
+                self._connections[k].send(calls[k])
+            results, error = {}, None
+            for k in order: #read every reply, even after an error, to keep the pipes in step
+                ok, value = self._receive(k)
+                if ok:
+                    results[k] = value
+                elif error is None:
+                    error = value
+        finally:
+            for k in order:
+                self._locks[k].release()
+        if error is not None:
+            raise error
+        return results
+
+    def _broadcast(self, method, *args, partitions=None, **kwargs):
+        targets = range(self.partitions) if partitions is None else partitions
+        return self._scatter({k: (method, args, kwargs) for k in targets})
+
+    def _call(self, k, method, *args, **kwargs):
+        return self._scatter({k: (method, args, kwargs)})[k]
+
+    def _merged(self, kind, args, partitions=None, after=None, reverse=False, limit=None):
+        """(sort key, record) rows of every partition merged in key order"""
+        parts = self._broadcast("keyed", kind, args, after, reverse, limit, partitions=partitions)
+        return heapq.merge(*parts.values(), key=itemgetter(0), reverse=reverse)
+    ### <--------- SCATTER-GATHER ---------> ###
+
+
+    ### <--------- SEARCHING ---------> ###
+    def search_by_id(self, movie_id):
+        k = self._owner(movie_id)
+        return None if k is None else self._call(k, "call", "search_by_id", movie_id)
+
+    def search_by_title(self, movie_title) -> list[dict]:
+        return [record for _, record in self._merged("title", (movie_title,))]
+
+    def search_by_year(self, movie_year) -> list[dict]:
+        return [record for _, record in self._merged("year", (movie_year,), self._year_partitions(movie_year, movie_year))]
+
+    def search_by_genre(self, movie_genre) -> list[dict]:
+        return [record for _, record in self._merged("genre", (movie_genre,))]
+
+    def search_by_year_range(self, start_year, end_year) -> list[dict]:
+        rows = self._merged("range", ("year", start_year, end_year), self._year_partitions(start_year, end_year))
+        return [record for _, record in rows]
+
+    def range_query(self, field, min_val, max_val, ordered=False) -> list[dict]:
+        """Indexed fields in field order, others in ID order (by field with ordered=True)"""
+        if field in NUMERIC_FIELDS:
+            return [record for _, record in self._merged("range", (field, min_val, max_val))]
+        parts = self._broadcast("scan", field, min_val, max_val).values()
+        records = [record for _, record in heapq.merge(*parts, key=itemgetter(0))]
+        if ordered:
+            records.sort(key=lambda movie: movie[field])
+        return records
+
+    def search_text(self, text, k=10) -> list[dict]:
+        """BM25 with the document frequencies of the whole catalog (one extra round trip), so scores match one engine"""
+        stats = list(self._broadcast("text_stats", text).values())
+        dfs = {}
+        for _, _, part_dfs in stats:
+            for term, df in part_dfs.items():
+                dfs[term] = dfs.get(term, 0) + df
+        total = (sum(s[0] for s in stats), sum(s[1] for s in stats), dfs)
+        hits = [hit for part in self._broadcast("text_search", text, k, total).values() for hit in part]
+        return [record for _, _, record in heapq.nlargest(k, hits, key=itemgetter(0))]
+
+    def autocomplete(self, prefix, k=10, rank_by="popularity") -> list[dict]:
+        hits = [hit for part in self._broadcast("autocomplete", prefix, k, rank_by).values() for hit in part]
+        return [record for _, _, record in heapq.nlargest(k, hits, key=itemgetter(0, 1))]
+
+    def search_by_title_fuzzy(self, movie_title, k=10, max_distance=MAX_DISTANCE) -> list[dict]:
+        hits = [hit for part in self._broadcast("fuzzy", movie_title, k, max_distance).values() for hit in part]
+        return [record for _, _, record in heapq.nsmallest(k, hits, key=itemgetter(0, 1))]
+
+    def query(self, predicate) -> list[dict]:
+        return [record for _, record in heapq.merge(*self._broadcast("query", predicate).values(), key=itemgetter(0))]
+
+    def explain(self, predicate) -> dict:
+        """{partition: plan}: each partition plans with its own index statistics"""
+        return self._broadcast("call", "explain", predicate)
+
+    def aggregate(self, group_by=None, metrics=("count",), where=None) -> dict:
+        """QueryEngine.aggregate: every partition returns count/sum/min/max per group, merged here"""
+        metrics = parse_metrics(metrics)
+        fields = metric_fields(metrics)
+        partial = ["count"] + [f"{function}:{field}" for field in fields for function in ("count", "sum", "min", "max")]
+        groups = {}
+        for rows in self._broadcast("call", "aggregate", group_by, partial, where).values():
+            for key, row in (rows.items() if group_by is not None else [(None, rows)]):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = _Group(fields)
+                group.count += row["count"]
+                for field, stat in group.stats.items():
+                    n, total, low, high = (row[f"{function}:{field}"] for function in ("count", "sum", "min", "max"))
+                    stat[0] += n
+                    add_total(stat, total)
+                    stat[2] = low if stat[2] is None else stat[2] if low is None else min(stat[2], low)
+                    stat[3] = high if stat[3] is None else stat[3] if high is None else max(stat[3], high)
+        return format_groups(groups, group_by, metrics)
+    ### <--------- SEARCHING ---------> ###
+
+
+    ### <--------- STREAMING, PAGINATION ---------> ###
+    #same queries and cursors as QueryEngine.page_*: each partition returns its first offset + limit + 1
+    #rows after the cursor, and the merge of those holds the page
+    def _page(self, kind, args, query, partitions, limit, offset, cursor, reverse):
+        after = decode_cursor(cursor, query) if cursor else None
+        rows = self._merged(kind, args, partitions, after, reverse, offset + limit + 1)
+        return paginate(rows, query, limit, offset)
+
+    def page_by_year(self, movie_year, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        return self._page("year", (movie_year,), ["year", movie_year, reverse], self._year_partitions(movie_year, movie_year),
+                          limit, offset, cursor, reverse)
+
+    def page_by_genre(self, movie_genre, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        return self._page("genre", (movie_genre,), ["genre", movie_genre, reverse], None, limit, offset, cursor, reverse)
+
+    def page_by_year_range(self, start_year, end_year, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        return self._page("range", ("year", start_year, end_year), ["year_range", start_year, end_year, reverse],
+                          self._year_partitions(start_year, end_year), limit, offset, cursor, reverse)
+
+    def page_range(self, field, min_val, max_val, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        return self._page("range", (field, min_val, max_val), ["range", field, min_val, max_val, reverse], None,
+                          limit, offset, cursor, reverse)
+
+    def _iter_pages(self, page, *args, reverse=False):
+        cursor = None
+        while True:
+            records, cursor = page(*args, limit=ITER_PAGE_SIZE, cursor=cursor, reverse=reverse)
+            yield from records
+            if cursor is None:
+                return
+
+    def iter_by_year(self, movie_year, reverse=False):
+        return self._iter_pages(self.page_by_year, movie_year, reverse=reverse)
+
+    def iter_by_genre(self, movie_genre, reverse=False):
+        return self._iter_pages(self.page_by_genre, movie_genre, reverse=reverse)
+
+    def iter_by_year_range(self, start_year, end_year, reverse=False):
+        return self._iter_pages(self.page_by_year_range, start_year, end_year, reverse=reverse)
+
+    def iter_range(self, field, min_val, max_val, reverse=False):
+        return self._iter_pages(self.page_range, field, min_val, max_val, reverse=reverse)
+    ### <--------- STREAMING, PAGINATION ---------> ###
+
+
+    ### <--------- INSERT, REMOVE, MODIFY - movie ---------> ###
+    def insert_movie(self, movie):
+        _validate_movie(movie)
+        with self._writer:
+            movie_id = self._next_key
+            k = self._partition_of(movie_id, movie)
+            self._next_key += 1
+            self._call(k, "call", "insert_movie", movie, movie_id)
+            self._set_owner(movie_id, k)
+        return movie_id
+
+    def delete_movie(self, movie_id):
+        with self._writer:
+            k = self._owner(movie_id)
+            if k is None or not self._call(k, "call", "delete_movie", movie_id):
+                return False
+            self._set_owner(movie_id, -1)
+            return True
+
+    def _move(self, movie_id, source, target, new_movie):
+        """Year scheme: the movie's new year belongs to another partition. Insert there first, then delete"""
+        _validate_movie(new_movie)
+        self._call(target, "call", "insert_movie", new_movie, movie_id)
+        self._call(source, "call", "delete_movie", movie_id)
+        self._set_owner(movie_id, target)
+
+    def modify_movie(self, movie_id, updates: dict):
+        with self._writer:
+            k = self._owner(movie_id)
+            if k is None:
+                return False
+            if self.scheme == "year" and "release_date" in updates:
+                old_movie = self._call(k, "records", [movie_id]).get(movie_id)
+                if old_movie is None:
+                    return False
+                new_movie = dict(old_movie, **updates)
+                target = self._partition_of(movie_id, new_movie)
+                if target != k:
+                    self._move(movie_id, k, target, new_movie)
+                    return True
+            return self._call(k, "call", "modify_movie", movie_id, updates)
+
+    def _check_known(self, movie_ids):
+        """ValueError listing the IDs no partition holds"""
+        by_partition, missing = {}, []
+        for movie_id in movie_ids:
+            k = self._owner(movie_id)
+            if k is None:
+                missing.append(movie_id)
+            else:
+                by_partition.setdefault(k, []).append(movie_id)
+        if self._owners is None and by_partition:
+            for found in self._scatter({k: ("missing", (ids,), {}) for k, ids in by_partition.items()}).values():
+                missing.extend(found)
+        if missing:
+            raise ValueError(f"Unknown movie ids: {sorted(missing)}")
+        return by_partition
+
+    def insert_many(self, movies) -> list[int]:
+        """Validated as a whole like QueryEngine.insert_many, then applied as one batch per partition in parallel"""
+        movies = list(movies)
+        for movie in movies:
+            _validate_movie(movie)
+        with self._writer:
+            keys = list(range(self._next_key, self._next_key + len(movies)))
+            self._next_key += len(movies)
+            by_partition = {}
+            for key, movie in zip(keys, movies):
+                batch = by_partition.setdefault(self._partition_of(key, movie), ([], []))
+                batch[0].append(movie)
+                batch[1].append(key)
+            self._scatter({k: ("call", ("insert_many", *batch), {}) for k, batch in by_partition.items()})
+            for k, (_, batch_keys) in by_partition.items():
+                for key in batch_keys:
+                    self._set_owner(key, k)
+        return keys
+
+    def delete_many(self, movie_ids) -> int:
+        movie_ids = list(dict.fromkeys(movie_ids))
+        with self._writer:
+            by_partition = self._check_known(movie_ids)
+            deleted = self._scatter({k: ("call", ("delete_many", ids), {}) for k, ids in by_partition.items()})
+            for movie_id in movie_ids:
+                self._set_owner(movie_id, -1)
+        return sum(deleted.values())
+
+    def modify_many(self, updates_by_id: dict) -> int:
+        with self._writer:
+            by_partition = self._check_known(list(updates_by_id))
+            changed = 0
+            if self.scheme == "year": #movies whose new year maps to another partition move one by one
+                moving = {movie_id for movie_id in updates_by_id if "release_date" in updates_by_id[movie_id]}
+                olds = self._scatter({k: ("records", ([i for i in ids if i in moving],), {}) for k, ids in by_partition.items()})
+                for k, records in olds.items():
+                    for movie_id, old_movie in records.items():
+                        new_movie = dict(old_movie, **updates_by_id[movie_id])
+                        target = self._partition_of(movie_id, new_movie)
+                        if target != k:
+                            self._move(movie_id, k, target, new_movie)
+                            by_partition[k].remove(movie_id)
+                            changed += 1
+            calls = {k: ("call", ("modify_many", {i: updates_by_id[i] for i in ids}), {}) for k, ids in by_partition.items() if ids}
+            return changed + sum(self._scatter(calls).values())
+    ### <--------- INSERT, REMOVE, MODIFY - movie ---------> ###
+
+
+    ### <--------- LIFECYCLE ---------> ###
+    def checkpoint(self):
+        with self._writer:
+            self._broadcast("call", "checkpoint")
+
+    def partition_stats(self):
+        """[{"movies", "next_key"}] per partition"""
+        return [info for _, info in sorted(self._broadcast("info").items())]
+
+    def __len__(self):
+        return sum(info["movies"] for info in self.partition_stats())
+
+    def close(self):
+        """Checkpoint every partition and stop the workers"""
+        with self._writer:
+            for k, connection in enumerate(self._connections):
+                with self._locks[k]:
+                    try:
+                        connection.send(None)
+                        self._receive(k)
+                    except (OSError, RuntimeError): #already gone
+                        pass
+                    connection.close()
+            for process in self._processes:
+                process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    ### <--------- LIFECYCLE ---------> ###
+
+#©Vardan Grigoryan
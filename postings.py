@@ -0,0 +1,176 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from operator import sub
+
+class PostingList:
+    """
+    Sorted, duplicate-free array of movie IDs (4 bytes per ID instead of a list slot plus an int object).
+        - membership: O(log K) binary search
+        - add/remove: O(log K) search + one memmove, O(1) when appending the largest ID (bulk loads)
+        - &, |, - : linear merges, or O(s log l) probing when one side is much smaller
+    """
+    __slots__ = ("_ids",)
+
+    def __init__(self, ids=()):
+        self._ids = array("I", sorted(set(ids)))
+
+    @classmethod
+    def from_sorted(cls, ids):
+        """Build from IDs already in increasing order without re-sorting them. O(K)"""
+        posting = cls.__new__(cls)
+        posting._ids = array("I", ids)
+        return posting
+
+    @classmethod
+    def union_all(cls, postings):
+        """Union of many posting lists (e.g. every year in a range). O(K log K)"""
+        postings = list(postings)
+        if len(postings) == 1:
+            return postings[0]
+        ids = set()
+        for posting in postings:
+            ids.update(posting._ids)
+        return cls.from_sorted(sorted(ids))
+
+
+    ### <--------- BASIC OPERATIONS ---------> ###
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __contains__(self, movie_id):
+        ids = self._ids
+        i = bisect_left(ids, movie_id)
+        return i < len(ids) and ids[i] == movie_id
+
+    def add(self, movie_id):
+        ids = self._ids
+        if not ids or ids[-1] < movie_id: #common case: new IDs are the largest
+            ids.append(movie_id)
+            return
+        i = bisect_left(ids, movie_id)
+        if i == len(ids) or ids[i] != movie_id:
+            ids.insert(i, movie_id)
+
+    append = add #drop-in for the list API used by the index maintenance code
+
+    def iter_from(self, after=None, reverse=False):
+        """
+        IDs greater than `after` in increasing order, or smaller than it in decreasing order if reverse
+        (None: from the start). Every step bisects from the last ID yielded, so a generator kept open
+        stays correct while the list is modified. O(log K) per ID.
+        """
+        ids = self._ids
+        last = after
+        while True:
+            if reverse:
+                i = (len(ids) if last is None else bisect_left(ids, last)) - 1
+                if i < 0:
+                    return
+            else:
+                i = 0 if last is None else bisect_right(ids, last)
+                if i >= len(ids):
+                    return
+            last = ids[i]
+            yield last
+
+    def remove(self, movie_id):
+        ids = self._ids
+        i = bisect_left(ids, movie_id)
+        if i == len(ids) or ids[i] != movie_id:
+            raise ValueError(f"{movie_id} not in posting list")
+        del ids[i]
+
+    def __eq__(self, other):
+        return isinstance(other, PostingList) and self._ids == other._ids
+
+    def __repr__(self):
+        return f"PostingList({self._ids.tolist()})"
+
+    def __reduce__(self):
+        """
+        Pickled as the gaps between consecutive IDs in the narrowest array type that fits them:
+        1 byte per ID for dense postings such as popular genres, instead of 5 for a list of ints.
+        """
+        ids = self._ids
+        if len(ids) < 2:
+            return (_from_gaps, ("I", ids.tobytes()))
+        gaps = array("I", map(sub, ids[1:], ids[:-1]))
+        widest = max(gaps)
+        typecode = "B" if widest < 1 << 8 else "H" if widest < 1 << 16 else "I"
+        if typecode != "I":
+            gaps = array(typecode, gaps)
+        return (_from_gaps, (typecode, ids[0], gaps.tobytes()))
+    ### <--------- BASIC OPERATIONS ---------> ###
+
+
+    ### <--------- SET ALGEBRA ---------> ###
+    def __and__(self, other):
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        if len(small) * 16 < len(large): #probe the large side instead of walking it
+            return PostingList.from_sorted(i for i in small._ids if i in large)
+
+        a, b = self._ids, other._ids
+        out = []
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                out.append(a[i])
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+        return PostingList.from_sorted(out)
+
+    def __or__(self, other):
+        a, b = self._ids, other._ids
+        out = []
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                out.append(a[i])
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                out.append(a[i])
+                i += 1
+            else:
+                out.append(b[j])
+                j += 1
+        out.extend(a[i:])
+        out.extend(b[j:])
+        return PostingList.from_sorted(out)
+
+    def __sub__(self, other):
+        """AND NOT: IDs of self that are not in other"""
+        if len(other) * 16 < len(self):
+            return PostingList.from_sorted(i for i in self._ids if i not in other)
+        b = other._ids
+        out = []
+        j = 0
+        for x in self._ids:
+            while j < len(b) and b[j] < x:
+                j += 1
+            if j == len(b) or b[j] != x:
+                out.append(x)
+        return PostingList.from_sorted(out)
+    ### <--------- SET ALGEBRA ---------> ###
+
+
+def _from_gaps(typecode, *state):
+    if len(state) == 1: #zero or one ID, stored as is
+        posting = PostingList.__new__(PostingList)
+        posting._ids = array("I")
+        posting._ids.frombytes(state[0])
+        return posting
+    first, raw = state
+    gaps = array(typecode)
+    gaps.frombytes(raw)
+    return PostingList.from_sorted(accumulate(gaps, initial=first))
+
+#©Vardan Grigoryan
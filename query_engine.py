@@ -1,24 +1,147 @@
 from ds_collection import *
-from indexing import INDEX_searching_engine #*
-from STORAGE import STORAGE_movie_dic, storager_obj #*
+from indexing import NUMERIC_FIELDS
 from audit_logger import AuditLogger
+from wal import WriteAheadLog
+from query_planner import QueryPlanner
+from postings import PostingList
+from pagination import PAGE_SIZE, decode_cursor, paginate
+from text_index import TEXT_FIELDS
+from fuzzy_title_index import MAX_DISTANCE
+from aggregation import Rollups, aggregate_records, group_keys, parse_metrics
+
+INDEXED_FIELDS = ["title", "release_date", "genres"] + NUMERIC_FIELDS + TEXT_FIELDS
+REQUIRED_FIELDS = ["title", "release_date", "genres"]
+
+def _validate_movie(movie):
+    """Reject records the index maintenance would choke on, before anything is modified"""
+    if not isinstance(movie, dict) or not all(field in movie for field in REQUIRED_FIELDS):
+        raise ValueError(f"Movie must have the following fields: {', '.join(REQUIRED_FIELDS)}")
+    date = movie["release_date"]
+    if not isinstance(date, str) or (len(date) >= 4 and not date[:4].isdigit()):
+        raise ValueError(f"Invalid release_date {date!r}, expected 'YYYY-MM-DD' or ''")
+    if not isinstance(movie["title"], str):
+        raise ValueError(f"Invalid title {movie['title']!r}, expected a string")
+    if not isinstance(movie["genres"], list) or not all(isinstance(genre, str) for genre in movie["genres"]):
+        raise ValueError("genres must be a list of strings")
 
  ### <--------- QUERY Engine ---------> ###
 class QueryEngine:
-    def __init__(self, movie_dic = STORAGE_movie_dic, indexer = INDEX_searching_engine):
+    def __init__(self, movie_dic = None, indexer = None, storager = None,
+                 wal_path="project/data/pickle/mutations.wal", checkpoint_every=1000, logger=None, result_cache=None):
         """
             movie_dic (dict): The main dictionary {movie_id: movie_record}
             indexer (MovieIndex): An instance containing the loaded/built AVL trees.
+            storager (STORAGE_DATASET): The storage object owning movie_dic, checkpointed with the indices.
+            checkpoint_every (int): Number of logged mutations after which both pickles are rewritten.
+            logger (AuditLogger): Defaults to the log under project/data/audit.
+            result_cache (ResultCache): Opt-in cache of the search_by_* / range results, None disables it.
+        Left as None, the first three fall back to the module globals of STORAGE and indexing
+        (loaded on first use); database.open_database() wires all of them for a data directory.
         """
-        self.by_id = movie_dic
-        self.title_idx = indexer.AVL_title
-        self.year_idx = indexer.AVL_year
-        self.genre_idx = indexer.AVL_genre
+        if storager is None:
+            import STORAGE
+            storager = STORAGE.storager_obj
+        if movie_dic is None:
+            movie_dic = storager.records_dic
+        if indexer is None:
+            import indexing
+            indexer = indexing.INDEX_searching_engine
 
+        self.by_id = movie_dic
         self.indexer = indexer
-        self.storager = storager_obj
+        self.storager = storager
+
+        self.logger = logger if logger is not None else AuditLogger()
+        self.result_cache = result_cache
+        self.rollups = Rollups()
+
+        self.checkpoint_every = checkpoint_every
+        self._mutations_since_checkpoint = 0
+        self.wal = WriteAheadLog(wal_path, start_lsn=self.storager.wal_lsn)
+        self._recover()
+
+        self.planner = QueryPlanner(indexer, movie_dic)
+
+
+    ### <--------- INDEX Shortcuts ---------> ###
+    #properties, so an index is only unpickled when a query first needs it
+    @property
+    def title_idx(self):
+        return self.indexer.AVL_title
+
+    @property
+    def year_idx(self):
+        return self.indexer.AVL_year
+
+    @property
+    def genre_idx(self):
+        return self.indexer.AVL_genre
+
+    @property
+    def numeric_idx(self): #{field: AVLTreeMap}
+        return self.indexer.AVL_numeric
+    ### <--------- INDEX Shortcuts ---------> ###
+
+
+    ### <--------- WRITE-AHEAD LOG, CHECKPOINTS ---------> ###
+    def _recover(self):
+        """
+        Bring the loaded checkpoint up to date with the write-ahead log.
+        Checkpoints write the records pickle before the indices pickle, so if their
+        lsns differ a crash hit in between: the indices are rebuilt from the records.
+        """
+        if self.indexer.wal_lsn != self.storager.wal_lsn:
+            self.indexer.rebuild()
+            self.indexer.wal_lsn = self.storager.wal_lsn
+
+        for entry in self.wal.recover(after_lsn=self.storager.wal_lsn):
+            self._apply_entry(entry)
+            self._mutations_since_checkpoint += 1
+
+        if self.storager.source_changed is not None: #movies.csv changed since the checkpoint
+            delta = self.storager.diff_source() #after the replay: the log may have deleted or modified matched movies
+            delta["fingerprint"] = self.storager.source_changed
+            self.apply_source_delta(delta)
 
-        self.logger = AuditLogger()
+    def _apply_entry(self, entry):
+        if entry["op"] == "batch":
+            for sub_entry in entry["entries"]:
+                self._apply_entry(sub_entry)
+            return
+
+        movie_id = entry["id"]
+        if entry["op"] == "insert":
+            self._apply_insert(movie_id, entry["record"])
+            if movie_id >= self.storager.getter_next_key_to_insert():
+                self.storager.setter_next_key_to_insert(movie_id + 1)
+        elif entry["op"] == "delete":
+            self._apply_delete(movie_id)
+        elif entry["op"] == "modify":
+            self._apply_modify(movie_id, entry["record"])
+
+    def _after_mutation(self, count=1):
+        """Threshold-based checkpoint: amortizes the O(N) pickling over checkpoint_every writes."""
+        self._mutations_since_checkpoint += count
+        if self._mutations_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Persist the records and the AVL indices, then empty the write-ahead log. O(N)
+        """
+        lsn = self.wal.last_lsn
+        self.storager.records_dic = self.by_id
+        self.storager.save_DATASET_pickle(lsn)
+        self.indexer.save_AVL_pickle(lsn)
+        self.wal.truncate()
+        self._mutations_since_checkpoint = 0
+
+    def close(self):
+        """Checkpoint pending mutations and release the log file."""
+        if self._mutations_since_checkpoint:
+            self.checkpoint()
+        self.wal.close()
+    ### <--------- WRITE-AHEAD LOG, CHECKPOINTS ---------> ###
 
 
     ### <--------- Helper Function for Lists (GENRE, YEAR) ---------> ###
@@ -26,11 +149,11 @@ class QueryEngine:
         """
         Helper method to look up records by ID from the main dictionary. O(K) complexity.
         """
-        if not movie_ids:
+        if movie_ids is None: #not "if not movie_ids": the bare ID 0 is a unique title
             return []
         
-        # Ensure it's iterable
-        if not isinstance(movie_ids, list):
+        # Ensure it's iterable (AVL_title maps unique titles to a bare ID, the others to a PostingList)
+        if isinstance(movie_ids, int):
             movie_ids = [movie_ids]
         
         # O(1) lookup for each ID
@@ -38,46 +161,300 @@ class QueryEngine:
     ### <--------- Helper Function for Lists (GENRE, YEAR) ---------> ###
 
 
+    ### <--------- RESULT CACHE ---------> ###
+    def _cached(self, key, compute, points=(), ranges=()):
+        """
+        compute() through the result cache. A hit costs one list copy instead of K record fetches
+        (the copy keeps callers from editing the cached list).
+        """
+        cache = self.result_cache
+        if cache is None:
+            return compute()
+        found, records = cache.get(key)
+        if not found:
+            version = cache.version
+            records = compute()
+            cache.put(key, records, points, ranges, version)
+        return list(records)
+
+    def _invalidate_cached(self, movie):
+        """Drop the cached results that may contain movie: every (field, value) of the record is a key"""
+        cache = self.result_cache
+        if cache is None or movie is None:
+            return
+        for field, value in movie.items():
+            if isinstance(value, list):
+                for item in value:
+                    cache.invalidate(field, item)
+            else:
+                cache.invalidate(field, value)
+        date = movie.get("release_date")
+        if date and len(date) >= 4 and date[:4].isdigit():
+            cache.invalidate("year", int(date[:4]))
+    ### <--------- RESULT CACHE ---------> ###
+
+
     ### <--------- SEARCHING ---------> ###
     def search_by_id(self, movie_id): #O(1)
         return self.by_id.get(movie_id)
     
-    def search_by_title(self, movie_title):
-        mov_id = self.title_idx.get(movie_title) # O(log N) AVL lookup
-        return self.search_by_id(mov_id) # O(1) dictionary lookup
+    def search_by_title(self, movie_title) -> list[dict]: #O(log N + K)
+        def compute():
+            mov_ids = self.title_idx.get(movie_title) # O(log N) AVL lookup returns an ID or a PostingList of IDs
+            return self._fetch_records(mov_ids) # every movie with that exact title
+        return self._cached(("title", movie_title), compute, points=[("title", movie_title)])
     
     def search_by_year(self, movie_year) -> list[dict]: #O(log N + K)
-        mov_ids = self.year_idx.get(movie_year) # O(log N) AVL lookup returns a list of IDs
-        return self._fetch_records(mov_ids) # [self.by_id[i] for i in movie_ids] #O(K)
+        def compute():
+            mov_ids = self.year_idx.get(movie_year) # O(log N) AVL lookup returns a list of IDs
+            return self._fetch_records(mov_ids) # [self.by_id[i] for i in movie_ids] #O(K)
+        return self._cached(("year", movie_year), compute, points=[("year", movie_year)])
     
     def search_by_genre(self, movie_genre) -> list[dict]: #O(log N + K)
-        mov_ids = self.genre_idx.get(movie_genre) # O(log N) AVL lookup returns a list of IDs
-        return self._fetch_records(mov_ids) # [self.by_id[i] for i in movie_ids] #O(K)
+        def compute():
+            mov_ids = self.genre_idx.get(movie_genre) # O(log N) AVL lookup returns a list of IDs
+            return self._fetch_records(mov_ids) # [self.by_id[i] for i in movie_ids] #O(K)
+        return self._cached(("genres", movie_genre), compute, points=[("genres", movie_genre)])
+
+    def search_text(self, text, k=10) -> list[dict]:
+        """
+        Keyword search over overview, tagline and keywords.
+        Returns the k best BM25 matches, best first.
+        """
+        return self._fetch_records([movie_id for _, movie_id in self.indexer.TEXT.search(text, k)])
+
+    def autocomplete(self, prefix, k=10, rank_by="popularity") -> list[dict]:
+        """
+        Type-ahead: the k most popular (or most voted, rank_by="vote_count") movies whose title
+        starts with prefix, ignoring case and accents. Independent of the number of matches.
+        """
+        return self._fetch_records(self.indexer.TITLE_PREFIX.top_k(prefix, k, rank_by))
+
+    def search_by_title_fuzzy(self, movie_title, k=10, max_distance=MAX_DISTANCE) -> list[dict]:
+        """
+        Typo-tolerant title search: up to k movies whose title is within max_distance edits
+        (character insertions, deletions, substitutions) of movie_title, ignoring case and accents.
+        Closest first, then by ID: "godfathr" finds "The Godfather" with max_distance >= 5, "the godfathr" with 1.
+        """
+        return self._fetch_records([movie_id for _, movie_id in self.indexer.TITLE_FUZZY.search(movie_title, k, max_distance)])
     ### <--------- SEARCHING ---------> ###
 
 
+    ### <--------- STREAMING, PAGINATION ---------> ###
+    #iter_* yield records one at a time; page_* return (records, next_cursor) with limit/offset and
+    #an opaque keyset cursor. Both only touch the rows they return: O(log N + offset + limit) per page.
+    #Except iter_range/page_range on a field without an index: every page scans by_id, O(N + M log M)
+    #for M matches after the cursor (by_id is not kept in ID order: explicit keys, undone deletes).
+    def _keyed_postings(self, movie_ids, after=None, reverse=False):
+        """(movie_id, record) in ID order for an index value (bare ID or PostingList), after the cursor ID"""
+        if movie_ids is None:
+            return
+        if isinstance(movie_ids, int):
+            movie_ids = PostingList([movie_ids])
+        for movie_id in movie_ids.iter_from(after, reverse):
+            record = self.by_id.get(movie_id)
+            if record is not None:
+                yield movie_id, record
+
+    def _keyed_range(self, field, low, high, after=None, reverse=False):
+        """
+        ((value, movie_id), record) with low <= value <= high, ordered by value then ID, after the cursor key.
+        "year" and NUMERIC_FIELDS walk their AVL tree; other fields scan every record, then order the matches by ID.
+        """
+        tree = self.year_idx if field == "year" else self.numeric_idx.get(field)
+        if tree is None: #no index to walk: O(N) scan, O(M log M) to sort the M matches only
+            matches = []
+            for movie_id, record in self.by_id.items():
+                if after is not None and (movie_id <= after[1] if not reverse else movie_id >= after[1]):
+                    continue
+                value = record.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and low <= value <= high:
+                    matches.append((movie_id, record))
+            matches.sort(key=lambda match: match[0], reverse=reverse)
+            for movie_id, record in matches:
+                yield (movie_id, movie_id), record
+            return
+
+        if after is not None: #resume at the cursor value instead of the range bound
+            low, high = (low, after[0]) if reverse else (after[0], high)
+        for entry in tree.entries_between(low, high, reverse):
+            value = entry.get_key()
+            start = after[1] if after is not None and value == after[0] else None
+            for movie_id, record in self._keyed_postings(entry.get_value(), start, reverse):
+                yield (value, movie_id), record
+
+    def iter_by_year(self, movie_year, reverse=False):
+        return (record for _, record in self._keyed_postings(self.year_idx.get(movie_year), None, reverse))
+
+    def iter_by_genre(self, movie_genre, reverse=False):
+        return (record for _, record in self._keyed_postings(self.genre_idx.get(movie_genre), None, reverse))
+
+    def iter_by_year_range(self, start_year, end_year, reverse=False):
+        return (record for _, record in self._keyed_range("year", start_year, end_year, None, reverse))
+
+    def iter_range(self, field, min_val, max_val, reverse=False):
+        """Indexed fields come in field order; other fields in ID order."""
+        return (record for _, record in self._keyed_range(field, min_val, max_val, None, reverse))
+
+    def page_by_year(self, movie_year, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        query = ["year", movie_year, reverse]
+        after = decode_cursor(cursor, query) if cursor else None
+        return paginate(self._keyed_postings(self.year_idx.get(movie_year), after, reverse), query, limit, offset)
+
+    def page_by_genre(self, movie_genre, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        query = ["genre", movie_genre, reverse]
+        after = decode_cursor(cursor, query) if cursor else None
+        return paginate(self._keyed_postings(self.genre_idx.get(movie_genre), after, reverse), query, limit, offset)
+
+    def page_by_year_range(self, start_year, end_year, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        query = ["year_range", start_year, end_year, reverse]
+        after = decode_cursor(cursor, query) if cursor else None
+        return paginate(self._keyed_range("year", start_year, end_year, after, reverse), query, limit, offset)
+
+    def page_range(self, field, min_val, max_val, limit=PAGE_SIZE, offset=0, cursor=None, reverse=False):
+        query = ["range", field, min_val, max_val, reverse]
+        after = decode_cursor(cursor, query) if cursor else None
+        return paginate(self._keyed_range(field, min_val, max_val, after, reverse), query, limit, offset)
+    ### <--------- STREAMING, PAGINATION ---------> ###
+
+
+    ### <--------- MULTI-PREDICATE QUERIES ---------> ###
+    def query(self, predicate) -> list[dict]:
+        """
+        Records matching a predicate tree from query_planner, e.g.
+            Eq("genres", "Drama") & Range("year", 1990, 2000) & Range("vote_average", 7) & Eq("original_language", "en")
+        ID sets of the indexed predicates are intersected before any record is fetched.
+        """
+        movie_ids = self.planner.execute(self.planner.plan(predicate))
+        return self._fetch_records(movie_ids)
+
+    def explain(self, predicate) -> dict:
+        """The plan query() would run: node types, chosen driver index and estimated rows."""
+        return self.planner.explain(self.planner.plan(predicate))
+    ### <--------- MULTI-PREDICATE QUERIES ---------> ###
+
+
+    ### <--------- AGGREGATION ---------> ###
+    def aggregate(self, group_by=None, metrics=("count",), where=None) -> dict:
+        """
+        Group-by aggregation, e.g. aggregate("genres", ["count", "avg:vote_average"]) ->
+            {"Action": {"count": 120, "avg:vote_average": 6.1}, ..., None: {...}}
+        metrics: "count" or "<count|sum|avg|min|max>:<numeric field>". group_by: a record field
+        (a list field counts a movie in each of its groups), "year", or None for one row of totals.
+        where: optional query_planner predicate, resolved through the indices before any record is read.
+        Unfiltered aggregates by genres/year over NUMERIC_FIELDS answer from the rollups maintained
+        by the mutations in O(groups); the others run vectorized over the columns (columnar backend
+        with NumPy) or in one O(N) pass (O(K) with where).
+        """
+        metrics = parse_metrics(metrics)
+        if where is None and self.rollups.covers(group_by, metrics):
+            return self.rollups.result(group_by, metrics, self.by_id, self._group_members)
+        movie_ids = None if where is None else self.planner.execute(self.planner.plan(where))
+        return aggregate_records(self.by_id, group_by, metrics, movie_ids)
+
+    def _group_members(self, field, key):
+        """Records of one rollup group: through the year/genre index when there is one, else a scan"""
+        index = {"year": self.year_idx, "genres": self.genre_idx}.get(field) if key is not None else None
+        if index is not None:
+            return self._fetch_records(index.get(key))
+        return [record for record in self.by_id.values() if key in group_keys(record, field)]
+    ### <--------- AGGREGATION ---------> ###
+
+
     ### <--------- INSERT, REMOVE, MODIFY - movie ---------> ###
-    def insert_movie(self, movie):
+    def _apply_insert(self, movie_id, movie):
+        self._invalidate_cached(movie)
+
+        #1. Update the AVL Indices O(log n * g)
+        self.indexer.inserting_process(movie, movie_id)
+
+        #2. Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
+        self.by_id[movie_id] = movie
+
+        #3. Update the rollups O(g)
+        self.rollups.add(movie)
+
+    def _apply_delete(self, movie_id):
+        movie = self.by_id.get(movie_id)
+        self._invalidate_cached(movie)
+
+        #1. Update the AVL Indices O(log n * g)
+        self.indexer.deleting_process(movie_id)
+
+        #2. Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
+        del self.by_id[movie_id]
+
+        #3. Update the rollups O(g)
+        self.rollups.remove(movie)
+
+    def _apply_modify(self, movie_id, new_movie):
+        old_movie = self.by_id[movie_id]
+        self._invalidate_cached(old_movie)
+        self._invalidate_cached(new_movie)
+
+        #checking if any indexed fields changed
+        if any(old_movie.get(field) != new_movie.get(field) for field in INDEXED_FIELDS):
+            #removing old movie from AVL indices
+            self.indexer.deleting_process(movie_id)
+            #inserting updated movie into AVL indices
+            self.indexer.inserting_process(new_movie, movie_id)
+
+        #Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
+        self.by_id[movie_id] = new_movie
+
+        #Update the rollups O(g)
+        self.rollups.remove(old_movie)
+        self.rollups.add(new_movie)
+
+
+    def _diff_updates(self, old_movie, updates):
+        """Return (new_movie, changes_list): old_movie with updates applied, and the effective changes."""
+        new_movie = old_movie.copy()
+        changes_list = [] #list to capture changes for the audit log
+
+        #update fields and track changes
+        for key, value in updates.items():
+            if old_movie.get(key) != value:
+                changes_list.append({
+                    "field": key,
+                    "old_value": old_movie.get(key),
+                    "new_value": value
+                })
+                new_movie[key] = value
+        return new_movie, changes_list
+
+
+    def _claim_keys(self, keys):
+        """Reserve keys chosen by the caller (e.g. the partitioning coordinator) instead of the next ones"""
+        if len(set(keys)) != len(keys) or any(not isinstance(key, int) or key < 0 or key in self.by_id for key in keys):
+            raise ValueError("Movie ids must be new, distinct, non-negative integers")
+        if keys:
+            self.storager.setter_next_key_to_insert(max(self.storager.getter_next_key_to_insert(), max(keys) + 1))
+
+    def insert_movie(self, movie, movie_id=None):
         """
         Insert a new movie into storage and all indexes.
         Time Complexity: O(logn * g) where g is the number of genres.
+        movie_id: key to use instead of the next free one; must not exist yet.
         """
-        required_fields = ["title", "release_date", "genres"]
-        if not all(field in movie for field in required_fields):
-            raise ValueError(f"Movie must have the following fields: {', '.join(required_fields)}")
+        _validate_movie(movie)
         
-        #1. Generate O(1) Unique Key (already implemented and stored in STORAGE at startup)
-        new_movie_key = self.storager.getter_next_key_to_insert()
-        update_next_unique = new_movie_key + 1
-        self.storager.setter_next_key_to_insert(update_next_unique)
+        first_key = self.storager.getter_next_key_to_insert()
+        if movie_id is not None:
+            self._claim_keys([movie_id])
+            new_movie_key = movie_id
+        else:
+            #1. Generate O(1) Unique Key (already implemented and stored in STORAGE at startup)
+            new_movie_key = first_key
+            update_next_unique = new_movie_key + 1
+            self.storager.setter_next_key_to_insert(update_next_unique)
 
-        #2. Update the AVL Indices O(log n * g)
-        self.indexer.inserting_process(movie, new_movie_key)
-     
-        #3. Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
-        self.by_id[new_movie_key] = movie
-
-        self.indexer.save_AVL_pickle()
+        #2. Update the AVL Indices and the MAIN DIC, then log the mutation - O(record) I/O
+        try:
+            self._apply_logged("insert", new_movie_key, movie)
+        except Exception:
+            self.storager.setter_next_key_to_insert(first_key)
+            raise
 
         #AL* AUDIT LOG
         movie_title = movie.get("title", f"ID {new_movie_key}")
@@ -94,13 +471,8 @@ class QueryEngine:
         #AL* AUDIT LOG
         movie_title = movie.get("title", f"ID {movie_id}") #capturing title before deletion
         
-        #1. Update the AVL Indices O(log n * g)
-        self.indexer.deleting_process(movie_id)
-
-        #2. Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
-        del self.by_id[movie_id]
-
-        self.indexer.save_AVL_pickle()
+        #1. Update the AVL Indices and the MAIN DIC, then log the mutation - O(1) I/O
+        self._apply_logged("delete", movie_id)
 
         #AL* AUDIT LOG
         self.logger.log_deletion(movie_id, movie_title)
@@ -119,64 +491,247 @@ class QueryEngine:
                 return False
     
             old_movie = self.by_id[movie_id].copy()
-            new_movie = old_movie.copy()
     
             ### <--------- AUDIT LOG ---------> ###
             #AL* AUDIT LOG
-            changes_list = [] #list to capture changes for the audit log
-    
-            #update fields and track changes
-            for key, value in updates.items():
-                if old_movie.get(key) != value: 
-                    changes_list.append({
-                        "field": key,
-                        "old_value": old_movie.get(key),
-                        "new_value": value
-                    })
-                    new_movie[key] = value
+            new_movie, changes_list = self._diff_updates(old_movie, updates)
         
             #If no effective changes were made, exit early.
             if not changes_list:
                 return True
             ### <--------- AUDIT LOG ---------> ###
+            _validate_movie(new_movie)
     
-            #checking if any indexed fields changed
-            indexed_fields = ["title", "release_date", "genres"]
-            if any(field in updates for field in indexed_fields):
-                #removing old movie from AVL indices
-                self.indexer.deleting_process(movie_id)
-                #inserting updated movie into AVL indices
-                self.indexer.inserting_process(new_movie, movie_id)
-    
-            #1. Update the AVL Indices O(log n * g)
-            self.indexer.save_AVL_pickle()
-     
-            #2. Update the MAIN DIC - self.by_id = movie_dic = STORAGE_movie_dic
-            self.by_id[movie_id] = new_movie
+            #1. Update the AVL Indices O(log n * g) and the MAIN DIC, then log the full new record - O(record) I/O
+            self._apply_logged("modify", movie_id, new_movie)
     
             #AL* AUDIT LOG
             movie_title = new_movie.get("title", f"ID {movie_id}")
             self.logger.log_modification(movie_id, movie_title, changes_list)
     
             return True
+
+
+    def _apply_logged(self, op, movie_id, record=None):
+        """
+        One mutation in the order of _apply_batch: applied in memory first (undone if it raises),
+        then logged (undone if the log write raises), so the log never holds a mutation that
+        cannot be replayed.
+        """
+        done = self._apply_ops([(op, movie_id, record)])
+        try:
+            self.wal.append(op, movie_id, record)
+        except Exception:
+            self._undo_ops(done)
+            raise
+        self._after_mutation()
+
+
+    ### <--------- BULK Mutations ---------> ###
+    def _apply_batch(self, ops):
+        """
+        Apply [(op, movie_id, record)] in memory, then log them as ONE write-ahead log entry.
+        If any operation raises, the ones already applied are undone in reverse order and
+        nothing is logged; if the log write raises (disk full, fsync error), the whole batch
+        is undone. Replaying a batch is all-or-nothing: it is a single log line.
+        """
+        done = self._apply_ops(ops)
+        try:
+            self.wal.append_batch(ops)
+        except Exception:
+            self._undo_ops(done)
+            raise
+        self._after_mutation(len(ops))
+
+    def _apply_ops(self, ops):
+        """
+        In-memory half of _apply_batch: all of ops, or none of them if one raises.
+        Returns the [(movie_id, record before, record after)] that _undo_ops takes back.
+        """
+        done = []
+        try:
+            for op, movie_id, record in ops:
+                done.append((movie_id, self.by_id.get(movie_id), None if op == "delete" else record))
+                self._apply_entry({"op": op, "id": movie_id, "record": record})
+        except Exception:
+            self._undo_ops(done)
+            raise
+        return done
+
+    def _undo_ops(self, done):
+        for movie_id, before, after in reversed(done):
+            self._undo(movie_id, before, after)
+
+    def _undo(self, movie_id, before, after):
+        """
+        Put movie_id back to `before` (None = absent). The operation may have stopped half-way,
+        so entries of both versions are removed first; deleting_process skips missing entries.
+        The rollups may hold either version: they are rebuilt on their next read.
+        """
+        self.rollups.reset()
+        for record in (after, before):
+            if record is not None:
+                self.by_id[movie_id] = record
+                try:
+                    self._invalidate_cached(record)
+                    self.indexer.deleting_process(movie_id)
+                except TypeError: #a value the failed operation could not index either: it stopped at the
+                    if record is before: #same point (same order as inserting_process), nothing after it was added
+                        raise
+        if before is None:
+            self.by_id.pop(movie_id, None)
+        else:
+            self._apply_insert(movie_id, before)
+
+    def insert_many(self, movies, keys=None) -> list[int]:
+        """
+        Insert many movies with one log write, one audit write and at most one checkpoint.
+        Every movie is validated first: one bad record rejects the whole batch.
+        keys: one new key per movie instead of the next free ones.
+        Returns the new keys, in input order.
+        """
+        movies = list(movies)
+        for movie in movies:
+            _validate_movie(movie)
+
+        first_key = self.storager.getter_next_key_to_insert()
+        if keys is not None:
+            keys = list(keys)
+            if len(keys) != len(movies):
+                raise ValueError(f"{len(keys)} keys for {len(movies)} movies")
+            self._claim_keys(keys)
+        else:
+            keys = list(range(first_key, first_key + len(movies)))
+            self.storager.setter_next_key_to_insert(first_key + len(movies))
+        try:
+            self._apply_batch([("insert", key, movie) for key, movie in zip(keys, movies)])
+        except Exception:
+            self.storager.setter_next_key_to_insert(first_key)
+            raise
+
+        #AL* AUDIT LOG
+        self.logger.log_batch([
+            self.logger.insertion_entry(key, movie.get("title", f"ID {key}")) for key, movie in zip(keys, movies)
+        ])
+        return keys
+
+    def delete_many(self, movie_ids) -> int:
+        """Delete many movies in one batch. Unknown IDs reject the whole batch. Returns the count deleted."""
+        movie_ids = list(dict.fromkeys(movie_ids))
+        missing = [movie_id for movie_id in movie_ids if movie_id not in self.by_id]
+        if missing:
+            raise ValueError(f"Unknown movie ids: {missing}")
+
+        #AL* AUDIT LOG
+        entries = [self.logger.deletion_entry(i, self.by_id[i].get("title", f"ID {i}")) for i in movie_ids]
+
+        self._apply_batch([("delete", movie_id, None) for movie_id in movie_ids])
+        self.logger.log_batch(entries)
+        return len(movie_ids)
+
+    def modify_many(self, updates_by_id: dict) -> int:
+        """
+        Modify many movies in one batch: {movie_id: updates}. Unknown IDs or invalid resulting
+        records reject the whole batch. Returns the number of movies that actually changed.
+        """
+        missing = [movie_id for movie_id in updates_by_id if movie_id not in self.by_id]
+        if missing:
+            raise ValueError(f"Unknown movie ids: {missing}")
+
+        ops, entries = [], []
+        for movie_id, updates in updates_by_id.items():
+            new_movie, changes_list = self._diff_updates(self.by_id[movie_id], updates)
+            if not changes_list:
+                continue
+            _validate_movie(new_movie)
+            ops.append(("modify", movie_id, new_movie))
+            entries.append(self.logger.modification_entry(movie_id, new_movie.get("title", f"ID {movie_id}"), changes_list))
+
+        if ops:
+            self._apply_batch(ops)
+            self.logger.log_batch(entries)
+        return len(ops)
+
+    def apply_source_delta(self, delta):
+        """
+        Merge a STORAGE_DATASET.diff_source() delta as ONE batch (deletes, updates, inserts) through
+        the usual index maintenance, then checkpoint it together with the new CSV fingerprint.
+        Costs O(changed rows) index work instead of a rebuild. Returns (inserted, updated, deleted).
+        """
+        ops, entries = [], []
+        deletes = [movie_id for movie_id in delta["delete"] if movie_id in self.by_id] #skip movies deleted since the diff
+        for movie_id in deletes:
+            ops.append(("delete", movie_id, None))
+            entries.append(self.logger.deletion_entry(movie_id, self.by_id[movie_id].get("title", f"ID {movie_id}")))
+        updated = 0
+        for movie_id, record in delta["update"].items():
+            if movie_id not in self.by_id:
+                continue
+            new_movie, changes_list = self._diff_updates(self.by_id[movie_id], record)
+            if not changes_list:
+                continue
+            updated += 1
+            ops.append(("modify", movie_id, new_movie))
+            entries.append(self.logger.modification_entry(movie_id, new_movie.get("title", f"ID {movie_id}"), changes_list))
+
+        first_key = self.storager.getter_next_key_to_insert()
+        keys = list(range(first_key, first_key + len(delta["insert"])))
+        for key, record in zip(keys, delta["insert"]):
+            ops.append(("insert", key, record))
+            entries.append(self.logger.insertion_entry(key, record.get("title", f"ID {key}")))
+
+        if ops:
+            self.storager.setter_next_key_to_insert(first_key + len(keys))
+            try:
+                self._apply_batch(ops)
+            except Exception:
+                self.storager.setter_next_key_to_insert(first_key)
+                raise
+            #AL* AUDIT LOG
+            self.logger.log_batch(entries)
+
+        self.storager.source = {
+            "fingerprint": delta["fingerprint"],
+            "ids": PostingList.from_sorted(sorted(set(delta["matched"]) | set(keys))),
+        }
+        self.storager.source_changed = None
+        self.checkpoint()
+        return len(keys), updated, len(deletes)
+    ### <--------- BULK Mutations ---------> ###
     ### <--------- INSERT, REMOVE, MODIFY - movie ---------> ###
     
 
     def search_by_year_range(self, start_year, end_year):
-        entries = self.indexer.AVL_year.sub_map(start_year, end_year+1)
-        result = []
-        for entry in entries:
-            for movie_id in entry.get_value():
-                movie_record = self.by_id.get(movie_id)
-                if movie_record:
-                    result.append(movie_record)
-        return result
+        def compute():
+            entries = self.indexer.AVL_year.sub_map(start_year, end_year+1)
+            result = []
+            for entry in entries:
+                for movie_id in entry.get_value():
+                    movie_record = self.by_id.get(movie_id)
+                    if movie_record:
+                        result.append(movie_record)
+            return result
+        return self._cached(("year_range", start_year, end_year), compute, ranges=[("year", start_year, end_year)])
 
 
-    def range_query(self, field, min_val, max_val):
+    def range_query(self, field, min_val, max_val, ordered=False):
         """
-        Generic range query for numeric fields. O(N)
+        Generic range query for numeric fields, min_val <= value <= max_val.
+        Indexed fields (NUMERIC_FIELDS): O(log N + K), results come in field order.
+        Other fields fall back to an O(N) scan; ordered=True sorts those by the field.
         """
+        return self._cached(("range", field, min_val, max_val, ordered),
+                            lambda: self._range_query(field, min_val, max_val, ordered),
+                            ranges=[(field, min_val, max_val)])
+
+    def _range_query(self, field, min_val, max_val, ordered):
+        field_idx = self.numeric_idx.get(field)
+        if field_idx is not None:
+            result = []
+            for entry in field_idx.entries_between(min_val, max_val):
+                result.extend(self._fetch_records(entry.get_value()))
+            return result
+
         result = []
 
         for movie in self.by_id.values():
@@ -187,6 +742,8 @@ class QueryEngine:
                     if min_val <= val <= max_val:
                         result.append(movie)
 
+        if ordered:
+            result.sort(key=lambda movie: movie[field])
         return result
 
 #©Vardan Grigoryan
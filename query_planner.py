@@ -0,0 +1,239 @@
+from postings import PostingList
+
+### <--------- PREDICATES ---------> ###
+def _field_value(movie, field):
+    """Record value for a predicate field. "year" is derived from release_date."""
+    if field == "year":
+        date = movie.get("release_date")
+        return int(date[:4]) if date and len(date) >= 4 else None
+    return movie.get(field)
+
+
+class Predicate:
+    """Base class. Predicates compose with & (AND), | (OR) and ~ (NOT)."""
+    def matches(self, movie):
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Eq(Predicate):
+    """field == value. For list fields ("genres") the list must contain value."""
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+    def matches(self, movie):
+        val = _field_value(movie, self.field)
+        if isinstance(val, list):
+            return self.value in val
+        return val == self.value
+
+    def __repr__(self):
+        return f"{self.field} = {self.value!r}"
+
+
+class Range(Predicate):
+    """low <= field <= high, None leaves that side unbounded."""
+    def __init__(self, field, low=None, high=None):
+        self.field = field
+        self.low = low
+        self.high = high
+
+    def matches(self, movie):
+        val = _field_value(movie, self.field)
+        if val is None or isinstance(val, (bool, list)):
+            return False
+        try:
+            return (self.low is None or self.low <= val) and (self.high is None or val <= self.high)
+        except TypeError: #e.g. "" stored for a missing number
+            return False
+
+    def __repr__(self):
+        return f"{self.field} in [{self.low!r}, {self.high!r}]"
+
+
+class And(Predicate):
+    def __init__(self, *predicates):
+        #a & b & c builds And(And(a, b), c): flatten so the planner sees every operand at once
+        self.predicates = []
+        for p in predicates:
+            self.predicates.extend(p.predicates if isinstance(p, And) else [p])
+
+    def matches(self, movie):
+        return all(p.matches(movie) for p in self.predicates)
+
+    def __repr__(self):
+        return "(" + " AND ".join(map(repr, self.predicates)) + ")"
+
+
+class Or(Predicate):
+    def __init__(self, *predicates):
+        #a | b | c builds Or(Or(a, b), c): flatten so the planner sees every operand at once
+        self.predicates = []
+        for p in predicates:
+            self.predicates.extend(p.predicates if isinstance(p, Or) else [p])
+
+    def matches(self, movie):
+        return any(p.matches(movie) for p in self.predicates)
+
+    def __repr__(self):
+        return "(" + " OR ".join(map(repr, self.predicates)) + ")"
+
+
+class Not(Predicate):
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def matches(self, movie):
+        return not self.predicate.matches(movie)
+
+    def __repr__(self):
+        return f"NOT {self.predicate!r}"
+### <--------- PREDICATES ---------> ###
+
+
+### <--------- PLANNER ---------> ###
+#an index whose estimate is this many times larger than the current intersection
+#is cheaper to check on the fetched records than to materialize and intersect
+RESIDUAL_FACTOR = 8
+
+def _ids_of(value):
+    """AVL values are PostingLists, except AVL_title which maps a unique title to a bare ID"""
+    if value is None:
+        return PostingList()
+    if isinstance(value, int):
+        return PostingList([value])
+    return value
+
+
+class QueryPlanner:
+    """
+    Plans a predicate tree against the MovieIndex AVL trees:
+        - leaf predicates on an indexed field become INDEX_SCAN nodes,
+        - AND intersects its index scans starting from the most selective one (the driver),
+          everything else is a residual filter on the surviving records,
+        - OR unions its inputs when all of them are indexed,
+        - anything else is a FULL_SCAN over the records.
+    """
+    def __init__(self, indexer, by_id):
+        self.indexer = indexer
+        self.by_id = by_id
+
+    def _index_for(self, field):
+        if field == "genres":
+            return "AVL_genre", self.indexer.AVL_genre
+        if field == "year":
+            return "AVL_year", self.indexer.AVL_year
+        if field == "title":
+            return "AVL_title", self.indexer.AVL_title
+        if field in self.indexer.AVL_numeric:
+            return f"AVL_numeric[{field}]", self.indexer.AVL_numeric[field]
+        return None, None
+
+    def _leaf_entries(self, predicate, tree):
+        if isinstance(predicate, Eq):
+            value = tree.get(predicate.value)
+            return [] if value is None else [value]
+        return [entry.get_value() for entry in tree.entries_between(predicate.low, predicate.high)]
+
+    ### <--------- PLAN ---------> ###
+    def plan(self, predicate):
+        """Return the plan tree for predicate. Estimates are exact posting sizes. O(log N) per leaf + keys in range"""
+        if isinstance(predicate, (Eq, Range)):
+            name, tree = self._index_for(predicate.field)
+            if tree is not None:
+                postings = self._leaf_entries(predicate, tree)
+                return {"type": "INDEX_SCAN", "index": name, "predicate": predicate,
+                        "estimated_rows": sum(len(_ids_of(v)) for v in postings), "_postings": postings}
+
+        elif isinstance(predicate, And):
+            inputs, residual = [], []
+            for child in predicate.predicates:
+                child_plan = self.plan(child)
+                if child_plan["type"] == "FULL_SCAN":
+                    residual.append(child)
+                else:
+                    inputs.append(child_plan)
+
+            if inputs:
+                inputs.sort(key=lambda node: node["estimated_rows"]) #driver first
+                kept = [inputs[0]]
+                for node in inputs[1:]:
+                    if node["estimated_rows"] > RESIDUAL_FACTOR * kept[0]["estimated_rows"]:
+                        residual.append(node["predicate"])
+                    else:
+                        kept.append(node)
+                return {"type": "INTERSECT", "predicate": predicate, "inputs": kept, "residual": residual,
+                        "estimated_rows": kept[0]["estimated_rows"]}
+
+        elif isinstance(predicate, Or):
+            inputs = [self.plan(child) for child in predicate.predicates]
+            if all(node["type"] != "FULL_SCAN" for node in inputs):
+                return {"type": "UNION", "predicate": predicate, "inputs": inputs,
+                        "estimated_rows": min(len(self.by_id), sum(node["estimated_rows"] for node in inputs))}
+
+        return {"type": "FULL_SCAN", "predicate": predicate, "estimated_rows": len(self.by_id)}
+    ### <--------- PLAN ---------> ###
+
+    ### <--------- EXECUTE ---------> ###
+    def _run(self, node):
+        """PostingList of matching movie IDs for an indexed plan node"""
+        if node["type"] == "INDEX_SCAN":
+            if not node["_postings"]:
+                return PostingList()
+            return PostingList.union_all(_ids_of(value) for value in node["_postings"])
+
+        if node["type"] == "UNION":
+            ids = PostingList()
+            for child in node["inputs"]:
+                ids = ids | self._run(child)
+            return ids
+
+        #INTERSECT
+        ids = self._run(node["inputs"][0])
+        for child in node["inputs"][1:]:
+            if not ids:
+                break
+            ids = ids & self._run(child)
+        if node["residual"]:
+            #columnar records decode only the fields the residual predicates read
+            fetch = getattr(self.by_id, "row_view", self.by_id.__getitem__)
+            ids = PostingList.from_sorted(i for i in ids if all(p.matches(fetch(i)) for p in node["residual"]))
+        return ids
+
+    def execute(self, node):
+        """Return the IDs matching the plan, sorted."""
+        if node["type"] == "FULL_SCAN":
+            filter_ids = getattr(self.by_id, "filter_ids", None) #ColumnarRecords: vectorized scan
+            ids = filter_ids(node["predicate"]) if filter_ids is not None else None
+            if ids is not None:
+                return ids
+            return [movie_id for movie_id, movie in self.by_id.items() if node["predicate"].matches(movie)]
+        return list(self._run(node))
+    ### <--------- EXECUTE ---------> ###
+
+    def explain(self, node):
+        """Printable copy of the plan: predicates as strings, internal postings dropped."""
+        out = {}
+        for key, value in node.items():
+            if key.startswith("_"):
+                continue
+            if key == "inputs":
+                value = [self.explain(child) for child in value]
+            elif key == "residual":
+                value = [repr(p) for p in value]
+            elif key == "predicate":
+                value = repr(value)
+            out[key] = value
+        return out
+### <--------- PLANNER ---------> ###
+
+#©Vardan Grigoryan
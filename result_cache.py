@@ -0,0 +1,138 @@
+import sys
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 1024 * 1024
+
+def result_size(records):
+    """Approximate bytes held by a cached list of records (the list and the record dicts)"""
+    return sys.getsizeof(records) + sum(sys.getsizeof(record) for record in records)
+
+
+class ResultCache:
+    """
+    LRU cache of query results, bounded by entry count and approximate bytes.
+    Every entry lists what it depends on:
+        point dependencies (field, value)  e.g. ("genres", "Drama"), ("year", 1999), ("title", "Heat")
+        range dependencies (field, low, high), None leaves a side unbounded
+    invalidate(field, value) drops exactly the entries depending on that key (O(1) per point entry,
+    O(R) over the range entries of that field), so a write only costs the entries it touches.
+    The cache is versioned: a result computed while an invalidation happened is not stored,
+    since it may already be stale. Every method holds an internal lock, so concurrent readers
+    may share one cache (a hit reorders the LRU list).
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0            #incremented by every invalidation
+        self.bytes = 0
+        self._entries = OrderedDict()   #key -> (value, size, point deps, range deps), least recently used first
+        self._by_point = {}             #(field, value) -> {keys}
+        self._by_range = {}             #field -> {key: [(low, high)]}
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._lock = threading.Lock()
+
+    ### <--------- LOOKUP ---------> ###
+    def get(self, key):
+        """(True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value, points=(), ranges=(), version=None, size=None):
+        """
+        Store value under key. version is self.version read before value was computed:
+        if anything was invalidated since, value is dropped instead of cached.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            size = result_size(value) if size is None else size
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._discard(key)
+
+            points, ranges = tuple(points), tuple(ranges)
+            self._entries[key] = (value, size, points, ranges)
+            self.bytes += size
+            for point in points:
+                self._by_point.setdefault(point, set()).add(key)
+            for field, low, high in ranges:
+                self._by_range.setdefault(field, {}).setdefault(key, []).append((low, high))
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+    ### <--------- LOOKUP ---------> ###
+
+
+    ### <--------- INVALIDATION ---------> ###
+    def _discard(self, key):
+        _, size, points, ranges = self._entries.pop(key)
+        self.bytes -= size
+        for point in points:
+            keys = self._by_point.get(point)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_point[point]
+        for field, _, _ in ranges:
+            by_key = self._by_range.get(field)
+            if by_key is not None:
+                by_key.pop(key, None)
+                if not by_key:
+                    del self._by_range[field]
+
+    def invalidate(self, field, value):
+        """Drop the entries depending on field == value, or on a range of field containing value"""
+        with self._lock:
+            self.version += 1
+            try:
+                keys = set(self._by_point.get((field, value), ()))
+            except TypeError: #unhashable value: no point entry can depend on it
+                keys = set()
+            for key, bounds in self._by_range.get(field, {}).items():
+                for low, high in bounds:
+                    try:
+                        if (low is None or low <= value) and (high is None or value <= high):
+                            keys.add(key)
+                            break
+                    except TypeError: #value not comparable with the bounds, e.g. "" for a missing number
+                        pass
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._by_point.clear()
+            self._by_range.clear()
+            self.bytes = 0
+    ### <--------- INVALIDATION ---------> ###
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+#©Vardan Grigoryan
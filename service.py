@@ -0,0 +1,439 @@
+"""
+Local asyncio query service: line-delimited JSON over TCP.
+
+    python service.py --data project/data --port 8765
+
+One request per line, one response per line (responses of a connection may come back out of order):
+    {"id": 1, "op": "search_by_genre", "args": ["Drama"]}
+    {"id": 1, "ok": true, "result": [...]}
+    {"id": 2, "op": "page_by_genre", "args": ["Drama"], "kwargs": {"limit": 50}}
+    {"id": 2, "ok": true, "result": {"records": [...], "next_cursor": "..."}}
+    {"id": 3, "op": "insert_movie", "kwargs": {"movie": {...}}}
+    {"id": 3, "ok": false, "error": "ValueError: ..."}
+args (list) and kwargs (object) are the arguments of the QueryEngine method named by op.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from query_planner import Eq, Range, And, Or, Not
+
+HOST = "127.0.0.1"
+PORT = 8765
+LINE_LIMIT = 16 * 1024 * 1024   #largest request line
+MAX_INFLIGHT = 64               #requests of one connection processed at once
+BATCH_WINDOW = 0.002            #seconds the committer waits for more mutations after the first one
+MAX_BATCH = 512                 #mutations per group commit
+
+READ_OPS = {
+    "search_by_id", "search_by_title", "search_by_year", "search_by_genre", "search_by_year_range",
+    "search_text", "autocomplete", "search_by_title_fuzzy", "range_query", "query", "explain", "aggregate",
+    "page_by_year", "page_by_genre", "page_by_year_range", "page_range",
+}
+
+### <--------- JSON Helpers ---------> ###
+def predicate_from_json(node):
+    """
+    query_planner predicate from its JSON form:
+        {"eq": ["genres", "Drama"]}, {"range": ["year", 1990, 2000]} (null = unbounded),
+        {"and": [...]}, {"or": [...]}, {"not": {...}}
+    """
+    if not isinstance(node, dict) or len(node) != 1:
+        raise ValueError(f"Invalid predicate {node!r}")
+    (kind, value), = node.items()
+    if kind == "eq":
+        return Eq(*value)
+    if kind == "range":
+        return Range(*value)
+    if kind in ("and", "or"):
+        return (And if kind == "and" else Or)(*[predicate_from_json(child) for child in value])
+    if kind == "not":
+        return Not(predicate_from_json(value))
+    raise ValueError(f"Unknown predicate {kind!r}")
+
+def _to_json(value):
+    """Records may be Mapping views (columnar row views, compact records): serialized as objects"""
+    if isinstance(value, dict):
+        return value
+    if hasattr(value, "items"):
+        return dict(value.items())
+    return str(value)
+
+def _dumps(value):
+    return json.dumps(value, default=_to_json, separators=(",", ":"))
+
+MUTATION_ARGS = {"insert_movie": ["movie"], "delete_movie": ["movie_id"], "modify_movie": ["movie_id", "updates"]}
+
+def _bind_mutation(op, args, kwargs):
+    """(movie,) / (movie_id,) / (movie_id, updates) from the request arguments"""
+    names = MUTATION_ARGS[op]
+    if len(args) > len(names) or set(kwargs) != set(names[len(args):]):
+        raise ValueError(f"{op} takes {', '.join(names)}")
+    call = list(args) + [kwargs[name] for name in names[len(args):]]
+    if op == "insert_movie" and not isinstance(call[0], dict):
+        raise ValueError("movie must be an object")
+    if op != "insert_movie" and (not isinstance(call[0], int) or isinstance(call[0], bool)):
+        raise ValueError("movie_id must be an integer")
+    if op == "modify_movie" and not isinstance(call[1], dict):
+        raise ValueError("updates must be an object")
+    return tuple(call)
+### <--------- JSON Helpers ---------> ###
+
+
+### <--------- SERVICE ---------> ###
+class QueryService:
+    """
+    Serves one concurrency.ThreadSafeQueryEngine to many connections.
+        - Reads run (and are JSON-encoded) on a thread pool, so the event loop only parses and routes.
+          Identical reads in flight at the same time are coalesced: the first one runs, the others
+          await its encoded result. A read never joins one started before the last commit.
+        - Mutations are queued and group-committed by one committer thread: consecutive inserts,
+          deletes and modifies become insert_many / delete_many / modify_many, i.e. one WAL entry
+          (one fsync) and one audit write per group instead of one per request. A batch that
+          raises is retried one mutation at a time, so a bad request only fails itself.
+    The service must be the only writer of the engine while it runs.
+    """
+    def __init__(self, engine, host=HOST, port=PORT, workers=4, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        from concurrency import ThreadSafeQueryEngine
+        if not isinstance(engine, ThreadSafeQueryEngine):
+            raise ValueError("QueryService needs a ThreadSafeQueryEngine (open_database(..., thread_safe=True))")
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._readers = ThreadPoolExecutor(workers, thread_name_prefix="query")
+        self._committer = ThreadPoolExecutor(1, thread_name_prefix="commit")
+        self._inflight = {}     #coalescing key -> future of the encoded result
+        self._epoch = 0         #incremented by every group commit
+        self._mutations = None  #asyncio.Queue of (op, bound arguments, future), created in start()
+        self._server = None
+        self._commit_task = None
+        self._connections = set()   #tasks serving the open connections
+        self.stats = {"requests": 0, "reads": 0, "coalesced": 0, "mutations": 0, "commits": 0, "errors": 0}
+
+    ### <--------- LIFECYCLE ---------> ###
+    async def start(self):
+        self._mutations = asyncio.Queue()
+        self._commit_task = asyncio.create_task(self._commit_loop())
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port, limit=LINE_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1] #port=0 picks a free one
+        return self
+
+    async def stop(self):
+        """Stop accepting connections, commit the queued mutations, release the pools"""
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        if self._commit_task is not None:
+            await self._mutations.join()
+            self._commit_task.cancel()
+        self._readers.shutdown()
+        self._committer.shutdown()
+    ### <--------- LIFECYCLE ---------> ###
+
+
+    ### <--------- CONNECTIONS ---------> ###
+    async def _serve_connection(self, reader, writer):
+        slots = asyncio.Semaphore(MAX_INFLIGHT)
+        tasks = set()
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError): #reset, or a line over LINE_LIMIT
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(self._respond(line, writer, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError: #stop(): end the connection quietly
+            for task in tasks:
+                task.cancel()
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _respond(self, line, writer, slots):
+        try:
+            request_id = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("A request must be a JSON object")
+                request_id = request.get("id")
+                result = await self.handle(request.get("op"), request.get("args", []), request.get("kwargs", {}))
+                response = '{"id":' + _dumps(request_id) + ',"ok":true,"result":' + result + "}\n"
+            except Exception as exc:
+                self.stats["errors"] += 1
+                response = _dumps({"id": request_id, "ok": False, "error": f"{type(exc).__name__}: {exc}"}) + "\n"
+            writer.write(response.encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            slots.release()
+    ### <--------- CONNECTIONS ---------> ###
+
+
+    ### <--------- DISPATCH ---------> ###
+    async def handle(self, op, args=(), kwargs=None):
+        """JSON-encoded result of one request. ValueError for unknown operations or bad arguments."""
+        args = list(args) if isinstance(args, tuple) else args
+        kwargs = {} if kwargs is None else kwargs
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("args must be a list and kwargs an object")
+        self.stats["requests"] += 1
+        if op in READ_OPS:
+            return await self._read(op, args, kwargs)
+        if op in MUTATION_ARGS:
+            return await self._write(op, args, kwargs)
+        if op == "stats":
+            return _dumps(self.service_stats())
+        raise ValueError(f"Unknown op {op!r}")
+
+    async def _read(self, op, args, kwargs):
+        key = (self._epoch, op, _dumps([args, kwargs]))
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        self.stats["reads"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self._readers, self._run_read, op, args, kwargs)
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _run_read(self, op, args, kwargs):
+        """Worker thread: run the query and encode its result"""
+        if op in ("query", "explain"): #the predicate comes as JSON
+            if args:
+                args = [predicate_from_json(args[0])] + args[1:]
+            elif "predicate" in kwargs:
+                kwargs = dict(kwargs, predicate=predicate_from_json(kwargs["predicate"]))
+        if op == "aggregate": #optional where predicate, third argument
+            if len(args) > 2 and args[2] is not None:
+                args = args[:2] + [predicate_from_json(args[2])] + args[3:]
+            elif kwargs.get("where") is not None:
+                kwargs = dict(kwargs, where=predicate_from_json(kwargs["where"]))
+        try:
+            result = getattr(self.engine, op)(*args, **kwargs)
+        except TypeError as exc: #wrong arguments for the method
+            raise ValueError(str(exc)) from None
+        if op.startswith("page_"):
+            records, next_cursor = result
+            result = {"records": records, "next_cursor": next_cursor}
+        return _dumps(result)
+
+    async def _write(self, op, args, kwargs):
+        call = _bind_mutation(op, args, kwargs) #bad arguments fail here, before reaching a batch
+        future = asyncio.get_running_loop().create_future()
+        await self._mutations.put((op, call, future))
+        return _dumps(await future)
+    ### <--------- DISPATCH ---------> ###
+
+
+    ### <--------- GROUP COMMIT ---------> ###
+    async def _commit_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._mutations.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._mutations.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(self._committer, self._commit, [(op, call) for op, call, _ in batch])
+            except Exception as exc:
+                results = [(False, exc)] * len(batch)
+            self._epoch += 1
+            self.stats["mutations"] += len(batch)
+            self.stats["commits"] += 1
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done(): #the requesting connection went away
+                    pass
+                elif ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+                self._mutations.task_done()
+
+    def _commit(self, ops):
+        """Committer thread: [(ok, result or exception)] for [(op, call)], in order"""
+        results = []
+        start = 0
+        while start < len(ops):
+            op = ops[start][0]
+            end, ids = start + 1, {ops[start][1][0]} if op != "insert_movie" else set()
+            while end < len(ops) and ops[end][0] == op:
+                if op != "insert_movie":
+                    if ops[end][1][0] in ids: #the same movie twice: it starts the next group
+                        break
+                    ids.add(ops[end][1][0])
+                end += 1
+            results.extend(self._commit_group(op, [call for _, call in ops[start:end]]))
+            start = end
+        return results
+
+    def _commit_group(self, op, calls):
+        engine = self.engine
+        try:
+            if op == "insert_movie":
+                return [(True, key) for key in engine.insert_many([movie for movie, in calls])]
+            #unknown IDs answer False, like delete_movie / modify_movie, instead of failing the group
+            present = {call[0] for call in calls if call[0] in engine.by_id}
+            if op == "delete_movie" and present:
+                engine.delete_many(sorted(present))
+            elif op == "modify_movie":
+                engine.modify_many({movie_id: updates for movie_id, updates in calls if movie_id in present})
+            return [(True, call[0] in present) for call in calls]
+        except ValueError: #one bad mutation was rejected before anything changed: apply them one by one
+            return [self._commit_one(op, call) for call in calls]
+        except Exception as exc: #the batch failed as a whole (e.g. its log write) and _apply_batch undid it
+            return [(False, exc)] * len(calls)
+
+    def _commit_one(self, op, call):
+        try:
+            return True, getattr(self.engine, op)(*call)
+        except Exception as exc:
+            return False, exc
+    ### <--------- GROUP COMMIT ---------> ###
+
+    def service_stats(self):
+        stats = dict(self.stats, queued_mutations=self._mutations.qsize() if self._mutations else 0)
+        if self.stats["commits"]:
+            stats["mutations_per_commit"] = self.stats["mutations"] / self.stats["commits"]
+        if self.engine.result_cache is not None:
+            stats["result_cache"] = self.engine.result_cache.stats()
+        return stats
+### <--------- SERVICE ---------> ###
+
+
+### <--------- CLIENT ---------> ###
+class ServiceClient:
+    """
+    Pipelining client: many calls may be in flight on one connection.
+        async with ServiceClient(port=8765) as client:
+            records = await client.call("search_by_genre", "Drama")
+    A failed request raises ValueError with the server's message.
+    """
+    def __init__(self, host=HOST, port=PORT):
+        self.host = host
+        self.port = port
+        self._next_id = 0
+        self._pending = {}
+        self._reader = self._writer = self._task = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT)
+        self._task = asyncio.create_task(self._receive())
+        return self
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response["id"], None)
+                if future is None or future.done():
+                    continue
+                if response["ok"]:
+                    future.set_result(response["result"])
+                else:
+                    future.set_exception(ValueError(response["error"]))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+            self._pending.clear()
+
+    async def call(self, op, *args, **kwargs):
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write((_dumps({"id": request_id, "op": op, "args": args, "kwargs": kwargs}) + "\n").encode("utf-8"))
+        await self._writer.drain()
+        return await future
+
+    async def close(self):
+        self._writer.close()
+        await self._task
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+### <--------- CLIENT ---------> ###
+
+
+async def _main(args):
+    from database import open_database
+    from result_cache import ResultCache
+
+    db = open_database(args.data, checkpoint_every=args.checkpoint_every, backend=args.backend,
+                       result_cache=ResultCache() if args.cache else None, thread_safe=True)
+    start = time.perf_counter()
+    service = QueryService(db.engine, args.host, args.port, workers=args.workers, batch_window=args.batch_window)
+    await service.start()
+    print(f"listening on {service.host}:{service.port} ({time.perf_counter() - start:.2f}s to open)", flush=True)
+
+    stopping = asyncio.Event()
+    for name in ("SIGINT", "SIGTERM"): #graceful stop; Windows falls back to KeyboardInterrupt
+        try:
+            asyncio.get_running_loop().add_signal_handler(getattr(signal, name), stopping.set)
+        except (NotImplementedError, AttributeError):
+            pass
+    try:
+        await stopping.wait()
+    finally:
+        await service.stop()
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local line-delimited JSON query service")
+    parser.add_argument("--data", default="project/data", help="data directory passed to open_database")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT, help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=4, help="threads running the reads")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW)
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--backend", default="dict", choices=["dict", "columnar", "compact", "snapshot"])
+    parser.add_argument("--cache", action="store_true", help="enable the result cache")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
+
+#©Vardan Grigoryan
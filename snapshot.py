@@ -0,0 +1,486 @@
+"""
+Binary snapshot files, an mmap-able alternative to records_dic.pkl / indices_avl.pkl.
+
+    header    MAGIC, SCHEMA_VERSION, kind, wal_lsn, row count, section count, crc32 of everything after it
+    sections  (name, offset, length) table, then every section 8-byte aligned:
+              fixed-width columns (array typecodes), string heaps with uint64 offsets,
+              and sorted key/posting arrays for the AVL indices
+
+Opening a snapshot maps the file read-only: nothing is decoded until a record or an index is used.
+Records are decoded from the mapped columns on each access, so the reader processes of one host
+share the pages of records.snap through the OS page cache. Indices are not served from the mapping:
+the first use of an index in a process builds it from its sections on that process's heap (AVL
+trees bottom-up from the sorted key/posting arrays, TEXT / TITLE_PREFIX / TITLE_FUZZY unpickled),
+O(N) time and memory per index and per process. indices.snap saves the node-by-node unpickling of
+indices_avl.pkl, not the per-process copy of the indices.
+"""
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+
+MAGIC = b"MOVIESNP"
+SCHEMA_VERSION = 1
+KIND_RECORDS = 1
+KIND_INDICES = 2
+
+_HEADER = struct.Struct("<8sIIQQII")   #magic, version, kind, wal_lsn, count, n_sections, crc32
+_SECTION = struct.Struct("<32sQQ")     #name, offset, length
+_ALIGN = 8
+_LIST_SEP = "\x1f"                     #joins the items of a list field in its string heap
+_CRC_CHUNK = 16 * 1024 * 1024          #bytes checksummed at a time when a snapshot is opened
+
+#record layout of STORAGE.row_to_record; rows that do not fit it are pickled as a whole
+RECORD_COLUMNS = [
+    ("title", "str"), ("vote_average", "num"), ("vote_count", "num"), ("status", "str"),
+    ("release_date", "str"), ("revenue", "num"), ("runtime", "num"), ("adult", "bool"),
+    ("backdrop_path", "str"), ("budget", "num"), ("homepage", "str"), ("imdb_id", "str"),
+    ("original_language", "str"), ("original_title", "str"), ("overview", "str"), ("popularity", "num"),
+    ("poster_path", "str"), ("tagline", "str"), ("genres", "list"), ("production_companies", "list"),
+    ("production_countries", "list"), ("spoken_languages", "list"), ("keywords", "list"),
+]
+_RECORD_KEYS = tuple(field for field, _ in RECORD_COLUMNS)
+
+#kind of a "num" cell
+_FLOAT, _INT, _EMPTY = 0, 1, 2  #_EMPTY: "" left by to_number for a blank CSV cell
+_FLOAT_EXACT = 2**53
+
+
+### <--------- FILE Format ---------> ###
+def _write(path, kind, wal_lsn, count, sections, before_replace=None):
+    """
+    Write sections [(name, bytes-like)] to path.tmp, fsync it and rename it over path.
+    before_replace() runs between the two, e.g. to unmap the snapshot being replaced.
+    """
+    table_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = table_size + (-table_size) % _ALIGN
+    table = []
+    for name, data in sections:
+        if len(name.encode("utf-8")) > 32:
+            raise ValueError(f"Snapshot section name too long: {name!r}")
+        table.append(_SECTION.pack(name.encode("utf-8"), offset, len(data)))
+        offset += len(data) + (-len(data)) % _ALIGN
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        crc = 0
+        body = [b"".join(table), b"\0" * ((-table_size) % _ALIGN)]
+        for _, data in sections:
+            body.append(data)
+            body.append(b"\0" * ((-len(data)) % _ALIGN))
+        for chunk in body:
+            crc = zlib.crc32(chunk, crc)
+            f.write(chunk)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, SCHEMA_VERSION, kind, wal_lsn, count, len(sections), crc))
+        f.flush()
+        os.fsync(f.fileno())
+    if before_replace is not None:
+        before_replace()
+    os.replace(tmp_path, path)
+
+
+def _crc32(mm, start):
+    """crc32 of mm[start:], _CRC_CHUNK bytes at a time: slicing the mmap would copy the whole file"""
+    crc = 0
+    with memoryview(mm) as view:
+        for offset in range(start, len(mm), _CRC_CHUNK):
+            with view[offset:offset + _CRC_CHUNK] as chunk:
+                crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+class Snapshot:
+    """
+    Read-only mapping of one snapshot file.
+    Raises ValueError for a file that is not a snapshot, was written by another schema version,
+    or fails its checksum (verify=False skips the checksum, which reads the whole file once).
+    """
+    def __init__(self, path, kind=None, verify=True):
+        self.path = os.path.abspath(path)
+        self._views = []
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{self.path} is not a snapshot (too short)")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, file_kind, self.wal_lsn, self.count, n_sections, crc = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a snapshot (bad magic {magic!r})")
+        if version != SCHEMA_VERSION:
+            self.close()
+            raise ValueError(f"{self.path} has snapshot schema version {version}, expected {SCHEMA_VERSION}")
+        if kind is not None and file_kind != kind:
+            self.close()
+            raise ValueError(f"{self.path} holds snapshot kind {file_kind}, expected {kind}")
+        if verify and _crc32(self._mm, _HEADER.size) != crc:
+            self.close()
+            raise ValueError(f"{self.path} is corrupt (checksum mismatch)")
+        self.kind = file_kind
+
+        self.sections = {}
+        for i in range(n_sections):
+            name, offset, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = (offset, length)
+
+    def has(self, name):
+        return name in self.sections
+
+    def raw(self, name):
+        """Zero-copy memoryview of a section (released by close())"""
+        offset, length = self.sections[name]
+        view = memoryview(self._mm)[offset:offset + length]
+        self._views.append(view)
+        return view
+
+    def column(self, name, typecode):
+        view = self.raw(name).cast(typecode)
+        self._views.append(view)
+        return view
+
+    def load(self, name):
+        """Unpickle a pickled section"""
+        return pickle.loads(self.raw(name))
+
+    def close(self):
+        for view in reversed(self._views): #cast views before the slices they were made from
+            view.release()
+        self._views = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+### <--------- FILE Format ---------> ###
+
+
+### <--------- STRING Heaps ---------> ###
+def _heap(strings):
+    """[str | None] -> (uint64 offsets, utf-8 heap, null flags)"""
+    offsets = array("Q", [0])
+    nulls = bytearray(len(strings))
+    parts = []
+    total = 0
+    for i, s in enumerate(strings):
+        if s is None:
+            nulls[i] = 1
+        else:
+            data = s.encode("utf-8")
+            parts.append(data)
+            total += len(data)
+        offsets.append(total)
+    return offsets, b"".join(parts), nulls
+
+def _heap_sections(name, strings):
+    offsets, heap, nulls = _heap(strings)
+    return [(name + ".o", offsets.tobytes()), (name + ".h", heap), (name + ".n", bytes(nulls))]
+
+
+class _StringColumn:
+    __slots__ = ("offsets", "heap", "nulls")
+
+    def __init__(self, snapshot, name):
+        self.offsets = snapshot.column(name + ".o", "Q")
+        self.heap = snapshot.raw(name + ".h")
+        self.nulls = snapshot.raw(name + ".n")
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return str(self.heap[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self.nulls)
+### <--------- STRING Heaps ---------> ###
+
+
+### <--------- RECORDS ---------> ###
+def _fits(record):
+    """True if record is laid out exactly like RECORD_COLUMNS (else it is pickled whole)"""
+    if tuple(record) != _RECORD_KEYS:
+        return False
+    for field, column in RECORD_COLUMNS:
+        value = record[field]
+        if column == "num":
+            if not (type(value) is float or value == "" and type(value) is str
+                    or type(value) is int and -_FLOAT_EXACT <= value <= _FLOAT_EXACT):
+                return False
+        elif column == "str":
+            if value is not None and type(value) is not str:
+                return False
+        elif column == "bool":
+            if type(value) is not bool:
+                return False
+        elif type(value) is not list or any(type(item) is not str or not item or _LIST_SEP in item for item in value):
+            return False
+    return True
+
+def _record_sections(records):
+    ids = array("q", sorted(records))
+    irregular = {}
+    regular = []
+    for movie_id in ids:
+        record = records[movie_id]
+        if _fits(record):
+            regular.append(record)
+        else:
+            irregular[movie_id] = record
+            regular.append(None)
+
+    sections = [("ids", ids.tobytes()),
+                ("irregular", pickle.dumps(irregular, protocol=pickle.HIGHEST_PROTOCOL))]
+    for field, column in RECORD_COLUMNS:
+        values = [record[field] if record is not None else None for record in regular]
+        if column == "num":
+            numbers = array("d", (0.0 if v is None or v == "" else float(v) for v in values))
+            kinds = bytes(_EMPTY if v is None or v == "" else _INT if type(v) is int else _FLOAT for v in values)
+            sections += [(field + ".v", numbers.tobytes()), (field + ".k", kinds)]
+        elif column == "bool":
+            sections.append((field + ".b", bytes(1 if v else 0 for v in values)))
+        elif column == "list":
+            sections += _heap_sections(field, [_LIST_SEP.join(v) if v is not None else None for v in values])
+        else:
+            sections += _heap_sections(field, values)
+    return len(ids), sections
+
+
+class SnapshotRecords(MutableMapping):
+    """
+    {movie_id: record} read from a records snapshot, plus an in-memory overlay of the records
+    inserted, modified or deleted since. A record is decoded from the mapped columns on access
+    (O(log N) to find its row); checkpoints write a new snapshot and rebase() onto it.
+    """
+    def __init__(self, snapshot):
+        self._overlay = {}      #movie_id -> record written since the snapshot
+        self._deleted = set()   #snapshot IDs deleted since
+        self._added = 0         #overlay IDs that are not in the snapshot
+        self._attach(snapshot)
+
+    def _attach(self, snapshot):
+        self.snapshot = snapshot
+        self._ids = snapshot.column("ids", "q")
+        self._irregular = snapshot.load("irregular")
+        self._columns = []
+        for field, column in RECORD_COLUMNS:
+            if column == "num":
+                decoded = (snapshot.column(field + ".v", "d"), snapshot.raw(field + ".k"))
+            elif column == "bool":
+                decoded = snapshot.raw(field + ".b")
+            else:
+                decoded = _StringColumn(snapshot, field)
+            self._columns.append((field, column, decoded))
+
+    def _row(self, movie_id):
+        ids = self._ids
+        row = bisect_left(ids, movie_id)
+        if row < len(ids) and ids[row] == movie_id:
+            return row
+        return -1
+
+    def _decode(self, row, movie_id):
+        if movie_id in self._irregular:
+            return self._irregular[movie_id]
+        record = {}
+        for field, column, decoded in self._columns:
+            if column == "num":
+                values, kinds = decoded
+                kind = kinds[row]
+                record[field] = values[row] if kind == _FLOAT else int(values[row]) if kind == _INT else ""
+            elif column == "bool":
+                record[field] = bool(decoded[row])
+            elif column == "list":
+                joined = decoded[row]
+                record[field] = joined.split(_LIST_SEP) if joined else []
+            else:
+                record[field] = decoded[row]
+        return record
+
+    def _in_snapshot(self, movie_id):
+        return movie_id not in self._deleted and self._row(movie_id) != -1
+
+    ### <--------- MAPPING Interface ---------> ###
+    def __getitem__(self, movie_id):
+        record = self._overlay.get(movie_id)
+        if record is not None:
+            return record
+        if movie_id not in self._deleted:
+            row = self._row(movie_id)
+            if row != -1:
+                return self._decode(row, movie_id)
+        raise KeyError(movie_id)
+
+    def __setitem__(self, movie_id, record):
+        if movie_id not in self._overlay and not self._in_snapshot(movie_id):
+            self._added += 1
+        self._overlay[movie_id] = record
+
+    def __delitem__(self, movie_id):
+        in_snapshot = self._in_snapshot(movie_id)
+        if movie_id in self._overlay:
+            del self._overlay[movie_id]
+            if not in_snapshot:
+                self._added -= 1
+        elif not in_snapshot:
+            raise KeyError(movie_id)
+        if in_snapshot:
+            self._deleted.add(movie_id)
+
+    def __contains__(self, movie_id):
+        return movie_id in self._overlay or self._in_snapshot(movie_id)
+
+    def __iter__(self):
+        deleted = self._deleted
+        for movie_id in self._ids:
+            if movie_id not in deleted:
+                yield movie_id
+        for movie_id in self._overlay:
+            if not self._in_snapshot(movie_id):
+                yield movie_id
+
+    def __len__(self):
+        return len(self._ids) - len(self._deleted) + self._added
+    ### <--------- MAPPING Interface ---------> ###
+
+    def rebase(self, snapshot):
+        """Switch to a snapshot that already contains the overlay, and empty it"""
+        self._overlay = {}
+        self._deleted = set()
+        self._added = 0
+        self._attach(snapshot)
+
+    def detach(self):
+        """Drop the views and unmap the file (before it is replaced); rebase() must follow"""
+        self._ids = self._columns = self._irregular = None
+        self.snapshot.close()
+
+
+def save_records(path, records, wal_lsn, source=None, verify=True):
+    """
+    Write records as a records snapshot at path and return them backed by it:
+    a SnapshotRecords is rebased in place (callers holding it keep a valid reference),
+    anything else is replaced by a new SnapshotRecords.
+    source (STORAGE_DATASET.source) is stored as a pickled section next to the records.
+    """
+    count, sections = _record_sections(records)
+    if source is not None:
+        sections.append(("source", pickle.dumps(source, protocol=pickle.HIGHEST_PROTOCOL)))
+    if isinstance(records, SnapshotRecords):
+        _write(path, KIND_RECORDS, wal_lsn, count, sections, before_replace=records.detach)
+        records.rebase(Snapshot(path, KIND_RECORDS, verify))
+        return records
+    _write(path, KIND_RECORDS, wal_lsn, count, sections)
+    return SnapshotRecords(Snapshot(path, KIND_RECORDS, verify))
+
+def open_records(path, verify=True):
+    """(SnapshotRecords, wal_lsn, source) of a records snapshot"""
+    snapshot = Snapshot(path, KIND_RECORDS, verify)
+    source = snapshot.load("source") if snapshot.has("source") else None
+    return SnapshotRecords(snapshot), snapshot.wal_lsn, source
+### <--------- RECORDS ---------> ###
+
+
+### <--------- INDICES ---------> ###
+def _key_sections(name, keys):
+    """Sorted keys as the narrowest typed column that round-trips them, else pickled"""
+    if all(type(k) is str for k in keys):
+        return "str", _heap_sections(name + ".k", keys)
+    if all(type(k) is int and -2**63 <= k < 2**63 for k in keys):
+        return "int", [(name + ".k", array("q", keys).tobytes())]
+    if all(type(k) is float or type(k) is int and -_FLOAT_EXACT <= k <= _FLOAT_EXACT for k in keys):
+        kinds = bytes(_INT if type(k) is int else _FLOAT for k in keys)
+        return "num", [(name + ".k", array("d", map(float, keys)).tobytes()), (name + ".kk", kinds)]
+    return "pickle", [(name + ".k", pickle.dumps(keys, protocol=pickle.HIGHEST_PROTOCOL))]
+
+def _tree_sections(name, tree):
+    """AVLTreeMap of PostingLists (or bare IDs, AVL_title) -> keys, posting offsets, concatenated IDs"""
+    keys = []
+    offsets = array("Q", [0])
+    ids = array("I")
+    bare = bytearray()
+    for entry in tree.entry_set():
+        keys.append(entry.get_key())
+        value = entry.get_value()
+        if isinstance(value, int):
+            ids.append(value)
+            bare.append(1)
+        else:
+            ids.extend(value)
+            bare.append(0)
+        offsets.append(len(ids))
+    key_type, sections = _key_sections(name, keys)
+    sections += [(name + ".po", offsets.tobytes()), (name + ".pi", ids.tobytes()), (name + ".pb", bytes(bare)),
+                 (name + ".t", key_type.encode("ascii"))]
+    return sections
+
+def _read_keys(snapshot, name):
+    key_type = bytes(snapshot.raw(name + ".t")).decode("ascii")
+    if key_type == "str":
+        column = _StringColumn(snapshot, name + ".k")
+        return [column[i] for i in range(len(column))]
+    if key_type == "int":
+        return snapshot.column(name + ".k", "q").tolist()
+    if key_type == "num":
+        values, kinds = snapshot.column(name + ".k", "d"), snapshot.raw(name + ".kk")
+        return [int(v) if kind == _INT else v for v, kind in zip(values, kinds)]
+    return snapshot.load(name + ".k")
+
+def _read_tree(snapshot, name):
+    from indexing import AVLTreeMap
+    from postings import PostingList
+    keys = _read_keys(snapshot, name)
+    offsets = snapshot.column(name + ".po", "Q")
+    ids = snapshot.column(name + ".pi", "I")
+    bare = snapshot.raw(name + ".pb")
+    items = []
+    for i, key in enumerate(keys):
+        if bare[i]:
+            items.append((key, ids[offsets[i]]))
+        else:
+            items.append((key, PostingList.from_sorted(ids[offsets[i]:offsets[i + 1]])))
+    return AVLTreeMap.from_sorted_items(items)
+
+def _index_sections(name, index):
+    if name == "AVL_numeric":
+        sections = [(name + ".fields", pickle.dumps(list(index)))]
+        for field, tree in index.items():
+            sections += _tree_sections(f"{name}/{field}", tree)
+        return sections
+    if name.startswith("AVL_"):
+        return _tree_sections(name, index)
+    return [(name, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))] #TEXT, TITLE_PREFIX
+
+def has_index(snapshot, name):
+    return any(section == name or section.startswith((name + ".", name + "/")) for section in snapshot.sections)
+
+def read_index(snapshot, name):
+    """Build one MovieIndex attribute from an index snapshot (trees bottom-up in O(N)), private to this process"""
+    if name == "AVL_numeric":
+        return {field: _read_tree(snapshot, f"{name}/{field}") for field in snapshot.load(name + ".fields")}
+    if name.startswith("AVL_"):
+        return _read_tree(snapshot, name)
+    return snapshot.load(name)
+
+def save_indices(path, indices, wal_lsn, previous=None, verify=True):
+    """
+    Write {name: index} as an index snapshot at path and return the new Snapshot.
+    Names mapped to None are copied byte for byte from the previous snapshot (never loaded indices).
+    """
+    sections = []
+    for name, index in indices.items():
+        if index is not None:
+            sections += _index_sections(name, index)
+        else:
+            sections += [(section, bytes(previous.raw(section))) for section in previous.sections
+                         if section == name or section.startswith((name + ".", name + "/"))]
+    _write(path, KIND_INDICES, wal_lsn, len(indices), sections,
+           before_replace=previous.close if previous is not None else None)
+    return Snapshot(path, KIND_INDICES, verify)
+### <--------- INDICES ---------> ###
+
+#©Vardan Grigoryan
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #the modules live at the repo root
+
+from benchmarks.synthetic import generate
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Data directory holding a raw/movies.csv of 300 synthetic movies"""
+    os.makedirs(tmp_path / "raw")
+    generate(str(tmp_path / "raw" / "movies.csv"), 300, seed=1)
+    return str(tmp_path)
+
+#©Vardan Grigoryan
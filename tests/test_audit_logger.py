@@ -0,0 +1,45 @@
+import gc
+import json
+import weakref
+
+import audit_logger
+from audit_logger import AuditLogger
+
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    """A crash in the middle of a flush leaves a partial line: the log still opens and appends cleanly"""
+    path = str(tmp_path / "audit_log.jsonl")
+    logger = AuditLogger(path)
+    logger.log_insertion(1, "Heat")
+    logger.log_deletion(2, "Alien")
+    with open(path, "ab") as f:
+        f.write(b'{"action": "INSERT", "movie_id": 3, "ti')
+
+    reopened = AuditLogger(path)
+    reopened.log_modification(1, "Heat", ["runtime"])
+    assert [entry["movie_id"] for entry in reopened.read_logs()] == [1, 2, 1]
+    assert len(reopened.history(1)) == 2 and reopened.history(3) == []
+    with open(path, "rb") as f:
+        assert all(json.loads(line) for line in f)
+
+def test_loggers_are_not_kept_alive_and_flush_on_close_or_exit(tmp_path):
+    """The exit hook only holds weak references: a dropped logger is collected, a live one is flushed"""
+    dropped = AuditLogger(str(tmp_path / "dropped.jsonl"))
+    reference = weakref.ref(dropped)
+    del dropped
+    gc.collect()
+    assert reference() is None
+
+    closed = AuditLogger(str(tmp_path / "closed.jsonl"), batch_size=10)
+    closed.log_insertion(1, "Heat")
+    closed.close()
+    assert closed not in audit_logger._open_loggers
+    assert [entry["movie_id"] for entry in AuditLogger(str(tmp_path / "closed.jsonl")).read_logs()] == [1]
+
+    unclosed = AuditLogger(str(tmp_path / "unclosed.jsonl"), batch_size=10)
+    unclosed.log_deletion(2, "Alien")
+    audit_logger._flush_open_loggers()
+    with open(tmp_path / "unclosed.jsonl", "rb") as f:
+        assert [json.loads(line)["movie_id"] for line in f] == [2]
+
+#©Vardan Grigoryan
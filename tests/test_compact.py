@@ -0,0 +1,46 @@
+import os
+import pickle
+import shutil
+
+from compact import CompactRecord, CompactRecords
+from database import Database
+from STORAGE import STORAGE_DATASET
+
+
+def test_compact_records_round_trip_through_pickle(data_dir):
+    """Pickled column-wise and restored: every record, its field order and its text fields are unchanged"""
+    storage = STORAGE_DATASET(os.path.join(data_dir, "raw", "movies.csv"), os.path.join(data_dir, "unused.pkl"))
+    plain = storage.load_movie_csv()
+    records = CompactRecords(plain)
+    records[0] = dict(plain[0], overview="Caf\u00e9 \u2603 \ud800", tagline="", homepage=None, genres=[])
+
+    loaded = pickle.loads(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+    assert type(loaded) is CompactRecords and all(type(record) is CompactRecord for record in loaded.values())
+    assert list(loaded) == list(records)
+    for movie_id, record in records.items():
+        assert list(loaded[movie_id].items()) == list(record.items())
+    assert loaded[0]["overview"] == "Caf\u00e9 \u2603 \ud800" and loaded[0]["genres"] == []
+    assert pickle.loads(pickle.dumps(records[1])) == plain[1]
+
+def test_search_by_id_matches_dict_backend(data_dir, tmp_path):
+    """search_by_id returns the records of the dict backend, after mutations and after a reopen"""
+    compact_dir = str(tmp_path / "compact")
+    shutil.copytree(os.path.join(data_dir, "raw"), os.path.join(compact_dir, "raw"))
+    engines = [Database(data_dir, checkpoint_every=10**6).engine,
+               Database(compact_dir, checkpoint_every=10**6, backend="compact").engine]
+    for engine in engines:
+        engine.modify_movie(3, {"overview": "R\u00e9\u00e9crit", "keywords": ["rewritten"], "homepage": "https://example.org"})
+        engine.insert_movie(dict(engine.by_id[4], title="Compact Newcomer", tagline=""))
+        engine.delete_movie(5)
+        engine.close()
+    dict_engine, compact_engine = engines
+    assert sorted(dict_engine.by_id) == sorted(compact_engine.by_id)
+    for movie_id in dict_engine.by_id:
+        assert compact_engine.search_by_id(movie_id) == dict_engine.search_by_id(movie_id)
+
+    reopened = Database(compact_dir, backend="compact").engine
+    assert type(reopened.by_id) is CompactRecords
+    for movie_id in dict_engine.by_id:
+        assert reopened.search_by_id(movie_id) == dict_engine.search_by_id(movie_id)
+
+#©Vardan Grigoryan
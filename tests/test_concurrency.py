@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+from benchmarks.stress_concurrency import run
+
+
+@pytest.fixture
+def frequent_switches():
+    """Thread switches every 10 µs instead of 5 ms: far more reader/writer interleavings per second"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(0.00001)
+    yield
+    sys.setswitchinterval(interval)
+
+@pytest.mark.parametrize("backend", ["dict", "columnar", "compact", "snapshot"])
+def test_readers_never_see_a_half_applied_write(data_dir, frequent_switches, backend):
+    """
+    Readers check every record against the indices (_check_record) while writers insert, modify and
+    delete; then the indices are compared with a rebuild (compare_indices), live and after reopening
+    """
+    result = run(data_dir, readers=4, writers=2, seconds=1, checkpoint_every=50, backend=backend)
+    assert result["errors"] == [] and result["error_count"] == 0
+    assert min(result["reads_per_second"], result["writes_per_second"]) > 0
+
+#©Vardan Grigoryan
@@ -0,0 +1,19 @@
+import instrumentation
+from database import Database
+
+
+def test_thread_safe_calls_are_counted_once(data_dir):
+    """ThreadSafeQueryEngine.checkpoint delegates through super(): one call, one count"""
+    engine = Database(data_dir, thread_safe=True).engine
+    instrumentation.enable()
+    try:
+        before = instrumentation.snapshot()["operations"]
+        engine.checkpoint()
+        engine.search_by_id(3)
+        after = instrumentation.snapshot()["operations"]
+    finally:
+        instrumentation.disable()
+    for name in ("QueryEngine.checkpoint", "QueryEngine.search_by_id"):
+        assert after[name]["count"] - before.get(name, {}).get("count", 0) == 1
+
+#©Vardan Grigoryan
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from database import Database
+from query_planner import Eq, Range
+
+
+def _partitioned(data_dir, **options):
+    from partitioning import PartitionedQueryEngine #query_engine + every index module, as Database.engine
+    return PartitionedQueryEngine(data_dir, checkpoint_every=10**6, **options)
+
+def _queries(engine, year):
+    return [engine.search_by_genre("Drama"), engine.search_by_year(year), engine.search_by_year_range(1990, 2010),
+            engine.range_query("vote_average", 5, 8), engine.range_query("status", "Released", "Released"),
+            list(engine.iter_by_genre("Drama", reverse=True)), engine.query(Eq("genres", "Drama") & Range("year", 1990, 2010))]
+
+
+@pytest.mark.parametrize("scheme", ["hash", "year"])
+def test_split_routes_every_movie_by_scheme(data_dir, scheme):
+    """Each movie lands in the partition of its scheme, and the source catalog gets no records pickle"""
+    with _partitioned(data_dir, partitions=3, scheme=scheme) as engine:
+        assert not os.path.exists(os.path.join(data_dir, "pickle", "records_dic.pkl"))
+        reference = Database(data_dir).engine
+        held = engine._broadcast("ids")
+        assert sorted(movie_id for ids in held.values() for movie_id in ids) == sorted(reference.by_id)
+        for k, ids in held.items():
+            for movie_id in ids:
+                if scheme == "hash":
+                    assert movie_id % 3 == k
+                else:
+                    assert engine._partition_of(movie_id, reference.by_id[movie_id]) == k == engine._owner(movie_id)
+        if scheme == "year":
+            assert len(engine.boundaries) == 2 and all(held.values()) #balanced at split time: no empty partition
+
+@pytest.mark.parametrize("scheme", ["hash", "year"])
+def test_scatter_gather_keeps_single_engine_order(data_dir, scheme):
+    """Merged results equal one QueryEngine's, in the same order, before and after mutations"""
+    with _partitioned(data_dir, partitions=3, scheme=scheme) as engine:
+        reference = Database(data_dir, checkpoint_every=10**6).engine
+        assert _queries(engine, 2013) == _queries(reference, 2013)
+
+        new_movie = dict(reference.by_id[7], title="Partitioned Newcomer", release_date="2013-01-01")
+        assert engine.insert_movie(new_movie) == reference.insert_movie(new_movie)
+        for target in (engine, reference):
+            target.delete_movie(11)
+            target.modify_movie(12, {"genres": ["Drama"], "vote_average": 7.5})
+        assert _queries(engine, 2013) == _queries(reference, 2013)
+        assert engine.search_by_id(12) == reference.search_by_id(12)
+        assert engine.search_by_id(11) is None and len(engine) == len(reference.by_id)
+
+def test_year_change_moves_movie_between_partitions(data_dir):
+    """A modify whose year maps to another partition moves the movie there, and it stays there after a reopen"""
+    with _partitioned(data_dir, partitions=3, scheme="year") as engine:
+        movie_id = next(movie_id for movie_id in engine._broadcast("ids", partitions=[0])[0]
+                        if engine.search_by_id(movie_id)["release_date"])
+        assert engine.modify_movie(movie_id, {"release_date": "2099-06-01"})
+        assert engine._owner(movie_id) == 2
+        assert movie_id not in engine._call(0, "ids") and movie_id in engine._call(2, "ids")
+        assert engine.search_by_year(2099) == [engine.search_by_id(movie_id)]
+        moved = engine.search_by_id(movie_id)
+
+    with _partitioned(data_dir) as engine:
+        assert engine.scheme == "year" and engine._owner(movie_id) == 2
+        assert engine.search_by_year(2099) == [moved]
+
+def test_reopen_keeps_partitions_and_rejects_other_layouts(data_dir):
+    """Later starts reopen the manifest's layout: mutations survive, a different partitions/scheme is refused"""
+    with _partitioned(data_dir, partitions=2) as engine:
+        movie_id = engine.insert_movie(dict(engine.search_by_id(3), title="Survives The Reopen"))
+        engine.delete_movie(5)
+        movies = len(engine)
+
+    with _partitioned(data_dir, partitions=2, scheme="hash") as engine:
+        assert len(engine) == movies and engine.search_by_id(5) is None
+        assert engine.search_by_title("Survives The Reopen") == [engine.search_by_id(movie_id)]
+        assert engine.insert_movie(dict(engine.search_by_id(3), title="Next Key")) == movie_id + 1
+    for options in ({"partitions": 3}, {"scheme": "year"}):
+        with pytest.raises(ValueError):
+            _partitioned(data_dir, **options)
+
+#©Vardan Grigoryan
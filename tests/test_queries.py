@@ -0,0 +1,297 @@
+import pickle
+import random
+
+import pytest
+
+from database import Database
+
+
+def test_search_by_title_finds_movie_zero(data_dir):
+    """AVL_title maps a unique title to a bare ID, and records are keyed from 0"""
+    engine = Database(data_dir).engine
+    engine.modify_movie(0, {"title": "A Title Only Movie Zero Has"})
+    assert engine.search_by_title("A Title Only Movie Zero Has") == [engine.by_id[0]]
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_page_range_on_unindexed_field_keeps_id_order(data_dir, reverse):
+    """Cursor pages over a field without an index: ID order, no row twice, even when by_id is not in ID order"""
+    engine = Database(data_dir).engine
+    for movie_id in range(0, 40, 2):
+        engine.modify_movie(movie_id, {"rank": movie_id % 7})
+    moved = dict(engine.by_id[4])
+    engine.delete_movie(4)
+    engine.insert_movie(moved, movie_id=4) #an explicit key lands at the end of by_id
+    assert list(engine.by_id)[-1] == 4
+
+    pages, cursor = [], None
+    while True:
+        records, cursor = engine.page_range("rank", 1, 5, limit=3, cursor=cursor, reverse=reverse)
+        pages.extend(records)
+        if cursor is None:
+            break
+    expected = sorted((movie_id for movie_id in range(0, 40, 2) if 1 <= movie_id % 7 <= 5), reverse=reverse)
+    assert pages == [engine.by_id[movie_id] for movie_id in expected]
+    assert list(engine.iter_range("rank", 1, 5, reverse=reverse)) == pages
+
+def test_query_planner_matches_brute_force(data_dir):
+    """query() returns the records predicate.matches selects, in ID order, whatever plan it picks"""
+    from query_planner import Eq, Range
+    engine = Database(data_dir).engine
+    moved = dict(engine.by_id[4])
+    engine.delete_movie(4)
+    engine.insert_movie(moved, movie_id=4) #by_id no longer in ID order
+    engine.modify_movie(9, {"genres": ["Drama", "Horror"], "vote_average": 7.25})
+    drama_recent = Eq("genres", "Drama") & Range("year", 1990, 2010)
+    predicates = [
+        Eq("genres", "Drama"), drama_recent, drama_recent & Range("vote_average", 6) & Eq("original_language", "en"),
+        Range("year", 2000, 2005) | Eq("genres", "Horror"), Range("year", 2000, 2005) | Eq("original_language", "fr"),
+        ~Eq("genres", "Drama"), Eq("title", engine.by_id[7]["title"]), Range("popularity", None, 1.0) & ~Eq("status", "Released"),
+        Eq("genres", "No Such Genre") & Range("year", 1990), Range("vote_average", 7.25, 7.25) & Eq("genres", "Horror"),
+    ]
+    for predicate in predicates:
+        expected = [movie for _, movie in sorted(engine.by_id.items()) if predicate.matches(movie)]
+        assert engine.query(predicate) == expected, predicate
+
+    plan = engine.explain(drama_recent & Eq("original_language", "en"))
+    estimates = {"AVL_genre": len(engine.search_by_genre("Drama")), "AVL_year": len(engine.search_by_year_range(1990, 2010))}
+    assert plan["type"] == "INTERSECT" and "original_language = 'en'" in plan["residual"]
+    assert plan["estimated_rows"] == min(estimates.values())
+    assert all(node["type"] == "INDEX_SCAN" and node["estimated_rows"] == estimates[node["index"]] for node in plan["inputs"])
+    assert all("_postings" not in node for node in plan["inputs"])
+    assert engine.explain(Range("year", 2000, 2005) | Eq("genres", "Horror"))["type"] == "UNION"
+    assert engine.explain(~Eq("genres", "Drama"))["type"] == "FULL_SCAN"
+
+def test_posting_list_algebra_matches_sets():
+    """&, |, - (merge and probing paths), union_all, iter_from and the gap-encoded pickle agree with Python sets"""
+    from postings import PostingList
+    rng = random.Random(5)
+    samples = [set(), {0}, {2**32 - 1}, set(range(0, 3000, 3)), set(range(500, 900)), set(rng.sample(range(2**20), 40)),
+               set(rng.sample(range(5000), 2500)), {7, 70000, 2**31}]
+    for a in samples:
+        posting = PostingList(a)
+        assert list(posting) == sorted(a) and len(posting) == len(a)
+        restored = pickle.loads(pickle.dumps(posting))
+        assert restored == posting and list(restored) == sorted(a)
+        assert list(posting.iter_from(1000)) == sorted(i for i in a if i > 1000)
+        assert list(posting.iter_from(1000, reverse=True)) == sorted((i for i in a if i < 1000), reverse=True)
+        for b in samples:
+            other = PostingList(b)
+            assert list(posting & other) == sorted(a & b)
+            assert list(posting | other) == sorted(a | b)
+            assert list(posting - other) == sorted(a - b)
+        assert list(PostingList.union_all([posting, PostingList(range(10)), PostingList()])) == sorted(a | set(range(10)))
+
+    posting, expected = PostingList(), set()
+    for movie_id in rng.choices(range(200), k=400):
+        if movie_id in expected:
+            posting.remove(movie_id)
+            expected.discard(movie_id)
+        else:
+            posting.add(movie_id)
+            expected.add(movie_id)
+        assert (movie_id in posting) == (movie_id in expected)
+    assert list(posting) == sorted(expected)
+    with pytest.raises(ValueError):
+        posting.remove(10**6)
+
+def test_bm25_search_matches_brute_force(data_dir):
+    """TextIndex scores equal BM25 computed from the records, after modifies and deletes too"""
+    import math
+    from text_index import movie_tokens, tokenize
+    engine = Database(data_dir).engine
+    engine.modify_movie(3, {"overview": "Ghost ghost ghost river", "keywords": ["ghost"]})
+    engine.modify_movie(8, {"tagline": ""})
+    for movie_id in (10, 11, 12):
+        engine.delete_movie(movie_id)
+
+    def brute_force(query, k1=1.2, b=0.75):
+        documents = {movie_id: movie_tokens(movie) for movie_id, movie in engine.by_id.items()}
+        avg_len = sum(map(len, documents.values())) / len(documents)
+        scores = {}
+        for term in set(tokenize(query)):
+            df = sum(term in tokens for tokens in documents.values())
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            for movie_id, tokens in documents.items():
+                tf = tokens.count(term)
+                if tf:
+                    norm = k1 * (1 - b + b * len(tokens) / avg_len)
+                    scores[movie_id] = scores.get(movie_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    for query in ["ghost", "Ghost river", "world of the revenge", "the", "nothing-matches-this", "killer queen escape"]:
+        expected = brute_force(query)
+        for k in (1, 5, 50):
+            hits = engine.indexer.TEXT.search(query, k)
+            assert [score for score, _ in hits] == pytest.approx(sorted(expected.values(), reverse=True)[:k])
+            assert all(score == pytest.approx(expected[movie_id]) for score, movie_id in hits)
+            assert engine.search_text(query, k) == [engine.by_id[movie_id] for _, movie_id in hits]
+    assert engine.indexer.TEXT.search("ghost", 1)[0][1] == 3
+
+def test_columnar_filter_ids_matches_brute_force(data_dir):
+    """Vectorized filter_ids selects what predicate.matches selects, with dead rows and overflowing values"""
+    pytest.importorskip("numpy")
+    import os
+    from query_planner import Eq, Range
+    from STORAGE import STORAGE_DATASET
+    storage = STORAGE_DATASET(os.path.join(data_dir, "raw", "movies.csv"), os.path.join(data_dir, "unused.pkl"), backend="columnar")
+    records = storage.load_movie_csv()
+    records[5] = dict(records[5], budget=2**70, vote_average="", genres=["Drama", "Brand New Genre"])
+    records[6] = dict(records[6], runtime=95.5, original_language=None, status="Rumored")
+    records[7] = dict(records[7], popularity=float("nan"), spoken_languages=["Klingon"])
+    for movie_id in (8, 9, 10):
+        del records[movie_id]
+    records[400] = dict(records[11], vote_count=-3, adult=False)
+
+    predicates = [
+        Eq("genres", "Drama"), Eq("genres", "Brand New Genre"), Eq("genres", "No Such Genre"), Eq("spoken_languages", "Klingon"),
+        Eq("original_language", "en"), Eq("status", "Rumored"), Eq("adult", False), Eq("vote_count", -3), Eq("runtime", 95.5),
+        Range("vote_average", 5, 7), Range("budget", 10**6), Range("budget", None, 2**63), Range("runtime", 90.5, 100),
+        Range("popularity", None, 1.0), Range("vote_count", -5, 0),
+        Eq("genres", "Drama") & Range("vote_average", 6) | Eq("original_language", "fr"),
+        ~Eq("genres", "Drama") & ~Range("popularity", 1.0), ~(Eq("status", "Released") | Eq("adult", True)),
+    ]
+    for predicate in predicates:
+        expected = sorted(movie_id for movie_id in records if predicate.matches(records[movie_id]))
+        assert records.filter_ids(predicate) == expected, predicate
+    assert records.filter_ids(Eq("title", records[0]["title"])) is None #object columns fall back to matches
+
+def test_result_cache_invalidates_point_and_range_keys(data_dir, tmp_path):
+    """A cached engine answers like an uncached one after every kind of write, and keeps the entries a write does not touch"""
+    import os
+    import shutil
+    from result_cache import ResultCache
+    uncached_dir = str(tmp_path / "uncached")
+    shutil.copytree(os.path.join(data_dir, "raw"), os.path.join(uncached_dir, "raw"))
+    cache = ResultCache()
+    engine = Database(data_dir, result_cache=cache).engine
+    reference = Database(uncached_dir).engine
+    title = engine.by_id[20]["title"]
+
+    def queries(target):
+        return [target.search_by_title(title), target.search_by_title("Renamed"), target.search_by_year(2013),
+                target.search_by_year(1921), target.search_by_genre("Drama"), target.search_by_genre("Horror"),
+                target.search_by_year_range(2010, 2015), target.search_by_year_range(1900, 1980),
+                target.range_query("vote_average", 6, 8), target.range_query("runtime", 100, 10**4),
+                target.range_query("status", "Released", "Released", ordered=True)]
+
+    writes = [
+        lambda target: target.modify_movie(20, {"title": "Renamed"}),
+        lambda target: target.modify_movie(21, {"release_date": "1921-01-01"}),
+        lambda target: target.modify_movie(22, {"vote_average": 7.0, "genres": ["Horror"]}),
+        lambda target: target.modify_movie(23, {"runtime": 150, "status": "Rumored"}),
+        lambda target: target.insert_movie(dict(target.by_id[24], title=title, release_date="2013-06-01")),
+        lambda target: target.delete_movie(25),
+        lambda target: target.modify_many({26: {"release_date": "2014-02-02"}, 27: {"genres": ["Drama"]}}),
+        lambda target: target.delete_many([28, 29]),
+    ]
+    for write in writes:
+        assert queries(engine) == queries(reference)
+        write(engine)
+        write(reference)
+    assert queries(engine) == queries(reference)
+
+    untouched = [engine.search_by_genre("No Such Genre"), engine.search_by_year(1800), engine.search_by_year_range(1800, 1801)]
+    hits = cache.hits
+    engine.modify_movie(30, {"vote_count": engine.by_id[30]["vote_count"] + 1})
+    assert [engine.search_by_genre("No Such Genre"), engine.search_by_year(1800), engine.search_by_year_range(1800, 1801)] == untouched
+    assert cache.hits == hits + 3 #only the entries a write may have changed are dropped
+
+@pytest.mark.parametrize("backend", ["dict", "columnar"])
+def test_rollups_match_brute_force_after_modify_and_delete(data_dir, backend):
+    """Incremental genre/year rollups equal a recount, with repeated genres counted once and float sums without drift"""
+    import math
+    engine = Database(data_dir, backend=backend).engine
+    exact = backend == "dict" #the vectorized first build of columnar sums floats with bincount
+    metrics = ["count", "count:revenue", "sum:budget", "min:runtime", "max:vote_count"]
+    if exact:
+        metrics += ["sum:vote_average", "avg:popularity", "max:popularity"]
+
+    def brute_force(group_by):
+        groups = {}
+        for movie in engine.by_id.values():
+            if group_by == "genres":
+                keys = set(movie["genres"])
+            else:
+                date = movie["release_date"]
+                keys = [int(date[:4]) if len(date) >= 4 else None]
+            for key in keys:
+                groups.setdefault(key, []).append(movie)
+        expected = {}
+        for key, movies in groups.items():
+            row = expected[key] = {}
+            for metric in metrics:
+                function, _, field = metric.partition(":")
+                values = [movie[field] for movie in movies if field and type(movie[field]) in (int, float)]
+                row[metric] = {"count": len(values) if field else len(movies), "sum": math.fsum(values) if values and
+                               any(type(v) is float for v in values) else sum(values), "avg": math.fsum(values) / len(values)
+                               if values else None, "min": min(values, default=None), "max": max(values, default=None)}[function]
+        return expected
+
+    for group_by in ("genres", "year"):
+        assert engine.aggregate(group_by, metrics) == brute_force(group_by) #builds the rollups
+    engine.modify_movie(3, {"genres": ["Drama", "Drama", "Horror"], "popularity": 1e16, "budget": 7})
+    for step in range(50):
+        engine.modify_movie(3, {"popularity": 0.1 * step, "vote_average": 1e15 if step % 2 else 0.3})
+    engine.modify_movie(4, {"release_date": "1800-01-01", "runtime": 10**4})
+    westerns = engine.aggregate("genres", ["count"]).get("Western", {"count": 0})["count"]
+    engine.insert_movie(dict(engine.by_id[5], genres=["Western", "Western"], release_date=""))
+    assert engine.aggregate("genres", ["count"])["Western"]["count"] == westerns + 1
+    for movie_id in (6, 7, 8):
+        engine.delete_movie(movie_id)
+    engine.delete_movie(max(engine.by_id, key=lambda movie_id: engine.by_id[movie_id]["runtime"])) #a max leaves
+    for group_by in ("genres", "year"):
+        assert engine.aggregate(group_by, metrics) == brute_force(group_by)
+
+def test_autocomplete_matches_brute_force_after_deletes(data_dir):
+    """Precomputed top lists stay exact while their best movies are deleted; a trailing space is kept"""
+    from title_prefix_index import normalize_title
+    engine = Database(data_dir).engine
+    by_popularity = sorted(engine.by_id, key=lambda movie_id: engine.by_id[movie_id]["popularity"], reverse=True)
+    for movie_id in by_popularity[:60]: #more than a candidate list holds: "" is recomputed
+        engine.delete_movie(movie_id)
+    for movie_id in by_popularity[60:70]:
+        engine.modify_movie(movie_id, {"title": "Sunset " + engine.by_id[movie_id]["title"], "vote_count": 10**6})
+    engine.insert_movie({"title": "Sun", "release_date": "", "genres": [], "popularity": 10**6, "vote_count": 1})
+
+    def brute_force(key, k, rank_by):
+        matches = [(movie[rank_by], movie_id) for movie_id, movie in engine.by_id.items()
+                   if normalize_title(movie["title"]).startswith(key)]
+        return [engine.by_id[movie_id] for _, movie_id in sorted(matches, reverse=True)[:k]]
+
+    for prefix, key in [("", ""), ("t", "t"), ("THE", "the"), ("The ", "the "), ("sun", "sun"), ("Sun ", "sun "), ("zz", "zz")]:
+        for rank_by in ("popularity", "vote_count"):
+            for k in (1, 10, 25):
+                assert engine.autocomplete(prefix, k, rank_by) == brute_force(key, k, rank_by)
+    assert all(movie["title"] != "Sun" for movie in engine.autocomplete("sun ", 50))
+
+def test_fuzzy_title_search_orders_by_distance_like_brute_force(data_dir):
+    """search_by_title_fuzzy returns every title within max_distance, closest first then by ID, like a full DP"""
+    from title_prefix_index import normalize_title
+    engine = Database(data_dir).engine
+    base = engine.by_id[12]["title"]
+    engine.insert_movie(dict(engine.by_id[13], title=base)) #the same title twice
+    engine.modify_movie(14, {"title": base[:-1]})
+    engine.modify_movie(15, {"title": "Am\u00e9lie " + base})
+    engine.delete_movie(16)
+
+    def levenshtein(a, b):
+        previous = list(range(len(b) + 1))
+        for i, char in enumerate(a, 1):
+            current = [i]
+            for j, other in enumerate(b, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+            previous = current
+        return previous[-1]
+
+    queries = [base, base.upper(), base[1:], base[:3] + "x" + base[4:], base[:2] + base[3] + base[2] + base[4:],
+               "amelie " + base, engine.by_id[20]["title"] + "s", "zzzz"]
+    for query in queries:
+        distances = sorted((levenshtein(normalize_title(query), normalize_title(movie["title"])), movie_id)
+                           for movie_id, movie in engine.by_id.items())
+        for max_distance in (0, 1, 2, 3):
+            for k in (1, 3, 50):
+                expected = [(distance, movie_id) for distance, movie_id in distances if distance <= max_distance][:k]
+                assert engine.indexer.TITLE_FUZZY.search(query, k, max_distance) == expected, (query, max_distance)
+                assert engine.search_by_title_fuzzy(query, k, max_distance) == [engine.by_id[i] for _, i in expected]
+
+#©Vardan Grigoryan
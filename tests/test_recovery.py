@@ -0,0 +1,185 @@
+import csv
+import os
+
+import pytest
+
+from benchmarks.stress_concurrency import compare_indices
+from database import Database
+
+
+def _crash(db):
+    """Drop the database without the checkpoint close() would write: the mutations only live in the WAL"""
+    db.engine.wal.close()
+    db.engine.logger.flush()
+
+def _rewrite_csv(path, edit):
+    """Rewrite movies.csv with edit(rows) applied to its rows (dicts)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields, rows = reader.fieldnames, list(reader)
+    rows = edit(rows)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _movie(title):
+    return {"title": title, "release_date": "2001-05-04", "genres": ["Drama", "Recovery"], "vote_average": 6.5}
+
+def _wal_path(data_dir):
+    return os.path.join(data_dir, "pickle", "mutations.wal")
+
+
+### <--------- WAL Replay ---------> ###
+def test_torn_wal_line_is_cut_off(data_dir):
+    """A crash in the middle of an append: the entries before it replay, the torn one is dropped"""
+    db = Database(data_dir, checkpoint_every=10**6)
+    kept = db.engine.insert_movie(_movie("Kept Before The Crash"))
+    db.engine.modify_movie(kept, {"vote_average": 7.5})
+    torn = db.engine.insert_movie(_movie("Torn By The Crash"))
+    _crash(db)
+    with open(_wal_path(data_dir), "r+b") as f:
+        lines = f.readlines()
+        f.truncate(sum(map(len, lines[:-1])) + len(lines[-1]) // 2)
+
+    engine = Database(data_dir, checkpoint_every=10**6).engine
+    assert engine.by_id[kept]["vote_average"] == 7.5 and torn not in engine.by_id
+    assert [record["title"] for record in engine.search_by_genre("Recovery")] == ["Kept Before The Crash"]
+    with open(_wal_path(data_dir), "rb") as f:
+        assert f.read().endswith(b"\n") #the next append starts on a clean line
+
+    after = engine.insert_movie(_movie("Appended After Recovery"))
+    engine.wal.close()
+    reopened = Database(data_dir).engine
+    assert reopened.by_id[after]["title"] == "Appended After Recovery" and kept in reopened.by_id
+
+def test_batch_entries_replay_whole_or_not_at_all(data_dir):
+    """insert_many / delete_many are one WAL line each: replayed together, or dropped together when torn"""
+    db = Database(data_dir, checkpoint_every=10**6)
+    engine = db.engine
+    inserted = engine.insert_many([_movie(f"Batch Movie {i}") for i in range(5)])
+    deleted = sorted(engine.by_id)[:3]
+    engine.delete_many(deleted)
+    expected = dict(engine.by_id)
+    torn = engine.insert_many([_movie(f"Torn Batch Movie {i}") for i in range(5)])
+    _crash(db)
+    with open(_wal_path(data_dir), "r+b") as f:
+        f.truncate(os.path.getsize(_wal_path(data_dir)) - 20)
+
+    engine = Database(data_dir).engine
+    assert dict(engine.by_id) == expected
+    assert set(inserted) <= set(engine.by_id) and not set(deleted + torn) & set(engine.by_id)
+    assert len(engine.search_by_genre("Recovery")) == 5
+    assert compare_indices(engine) == []
+
+def test_crash_between_records_and_indices_pickles(data_dir, monkeypatch):
+    """A checkpoint that wrote the records pickle but not the indices one: the indices are rebuilt"""
+    from indexing import MovieIndex
+    db = Database(data_dir, checkpoint_every=10**6)
+    engine = db.engine
+    movie_id = engine.insert_movie(_movie("Only In The Records Pickle"))
+    engine.delete_movie(sorted(engine.by_id)[0])
+    expected = dict(engine.by_id)
+
+    def crash(self, wal_lsn=None):
+        raise OSError("crash before the indices pickle")
+    monkeypatch.setattr(MovieIndex, "save_AVL_pickle", crash)
+    with pytest.raises(OSError):
+        engine.checkpoint()
+    monkeypatch.undo()
+    _crash(db)
+
+    reopened = Database(data_dir)
+    assert reopened.storage.wal_lsn != reopened.index.wal_lsn
+    engine = reopened.engine
+    assert engine.indexer.wal_lsn == engine.storager.wal_lsn
+    assert dict(engine.by_id) == expected
+    assert [record["title"] for record in engine.search_by_genre("Recovery")] == ["Only In The Records Pickle"]
+    assert engine.search_by_id(movie_id)["title"] == "Only In The Records Pickle"
+    assert compare_indices(engine) == []
+### <--------- WAL Replay ---------> ###
+
+
+### <--------- BATCH Atomicity ---------> ###
+def test_failed_batch_log_write_is_undone(data_dir, monkeypatch):
+    """When the log write of a batch fails, the batch leaves no trace in memory"""
+    engine = Database(data_dir, checkpoint_every=10**6).engine
+    before = dict(engine.by_id)
+    next_key = engine.storager.getter_next_key_to_insert()
+    drama = len(engine.search_by_genre("Drama"))
+    new_movies = [dict(engine.by_id[movie_id], title=f"Failed Batch {movie_id}") for movie_id in sorted(engine.by_id)[:5]]
+
+    def disk_full(ops):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(engine.wal, "append_batch", disk_full)
+    with pytest.raises(OSError):
+        engine.insert_many(new_movies)
+    with pytest.raises(OSError):
+        engine.delete_many(sorted(engine.by_id)[:5])
+
+    assert dict(engine.by_id) == before
+    assert engine.storager.getter_next_key_to_insert() == next_key
+    assert len(engine.search_by_genre("Drama")) == drama
+    assert engine.search_by_title("Failed Batch 0") == []
+    monkeypatch.undo()
+    assert engine.insert_many(new_movies[:1]) == [next_key]
+
+def test_invalid_mutation_does_not_block_reopen(data_dir, monkeypatch):
+    """A mutation that cannot be applied never reaches the WAL, even when it gets past validation"""
+    import query_engine
+    db = Database(data_dir, checkpoint_every=10**6)
+    engine = db.engine
+    before = dict(engine.by_id)
+    next_key = engine.storager.getter_next_key_to_insert()
+    drama = engine.search_by_genre("Drama")
+    with pytest.raises(ValueError):
+        engine.insert_movie(dict(_movie("x"), title=None))
+    with pytest.raises(ValueError):
+        engine.modify_movie(min(engine.by_id), {"genres": ["Drama", ["x"]]})
+
+    monkeypatch.setattr(query_engine, "_validate_movie", lambda movie: None)
+    with pytest.raises(TypeError):
+        engine.insert_movie(_movie(None))
+    with pytest.raises(TypeError):
+        engine.modify_movie(min(engine.by_id), {"genres": ["Drama", ["x"]]})
+    monkeypatch.undo()
+
+    assert dict(engine.by_id) == before
+    assert engine.storager.getter_next_key_to_insert() == next_key
+    assert engine.search_by_genre("Drama") == drama
+    assert compare_indices(engine) == []
+    assert os.path.getsize(_wal_path(data_dir)) == 0
+    _crash(db)
+    assert dict(Database(data_dir).engine.by_id) == before
+### <--------- BATCH Atomicity ---------> ###
+
+
+### <--------- SOURCE Delta after the WAL ---------> ###
+def test_csv_change_to_movies_deleted_in_wal(data_dir):
+    """A movie deleted in the WAL whose CSV row changed, and one whose row is gone: reopening merges both"""
+    db = Database(data_dir, checkpoint_every=10**6)
+    engine = db.engine
+    changed_id, dropped_id = [movie_id for movie_id in sorted(engine.by_id) if engine.by_id[movie_id].get("imdb_id")][:2]
+    changed_imdb, dropped_imdb = engine.by_id[changed_id]["imdb_id"], engine.by_id[dropped_id]["imdb_id"]
+    engine.delete_movie(changed_id)
+    engine.delete_movie(dropped_id)
+    movies = len(engine.by_id)
+    _crash(db)
+
+    def edit(rows):
+        for row in rows:
+            if row["imdb_id"] == changed_imdb:
+                row["vote_average"] = "9.9"
+        return [row for row in rows if row["imdb_id"] != dropped_imdb]
+    _rewrite_csv(os.path.join(data_dir, "raw", "movies.csv"), edit)
+
+    reopened = Database(data_dir).engine
+    assert changed_id not in reopened.by_id and dropped_id not in reopened.by_id
+    readded = [record for record in reopened.by_id.values() if record.get("imdb_id") == changed_imdb]
+    assert [record["vote_average"] for record in readded] == [9.9] #the CSV wins for the rows it contains
+    assert len(reopened.by_id) == movies + 1
+    assert os.path.getsize(os.path.join(data_dir, "pickle", "mutations.wal")) == 0 #merged and checkpointed
+### <--------- SOURCE Delta after the WAL ---------> ###
+
+#©Vardan Grigoryan
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from database import Database
+
+
+def _movie(title):
+    return {"title": title, "release_date": "2003-03-03", "genres": ["Drama", "Service"], "vote_average": 5.5}
+
+def _serve(data_dir, scenario, **options):
+    """Run scenario(service, client) against a QueryService on a free localhost port"""
+    from service import QueryService, ServiceClient
+
+    db = Database(data_dir, checkpoint_every=10**6, thread_safe=True)
+    async def main():
+        service = await QueryService(db.engine, port=0, **options).start()
+        try:
+            async with ServiceClient(port=service.port) as client:
+                return await scenario(service, client)
+        finally:
+            await service.stop()
+    try:
+        return asyncio.run(main())
+    finally:
+        db.close()
+
+
+### <--------- Reads ---------> ###
+def test_identical_reads_in_flight_are_coalesced(data_dir, monkeypatch):
+    """Five identical reads while the first is still running: the engine is queried once, all five get its result"""
+    calls, release = [], threading.Event()
+
+    async def scenario(service, client):
+        engine = service.engine
+        search_by_genre = engine.search_by_genre
+        def held(genre):
+            calls.append(genre)
+            release.wait(10)
+            return search_by_genre(genre)
+        monkeypatch.setattr(engine, "search_by_genre", held)
+
+        requests = [asyncio.ensure_future(client.call("search_by_genre", "Drama")) for _ in range(5)]
+        while service.stats["coalesced"] < 4:
+            await asyncio.sleep(0.001)
+        release.set()
+        results = await asyncio.gather(*requests)
+        expected = [dict(record.items()) for record in search_by_genre("Drama")]
+        return results, expected, dict(service.stats)
+
+    results, expected, stats = _serve(data_dir, scenario)
+    assert calls == ["Drama"] and stats["reads"] == 1 and stats["coalesced"] == 4
+    assert expected and all(result == expected for result in results)
+### <--------- Reads ---------> ###
+
+
+### <--------- Group Commit ---------> ###
+def test_concurrent_inserts_share_one_commit(data_dir, monkeypatch):
+    """Inserts arriving within the batch window become one insert_many, and survive a reopen"""
+    batches = []
+
+    async def scenario(service, client):
+        engine = service.engine
+        insert_many = engine.insert_many
+        monkeypatch.setattr(engine, "insert_many", lambda movies: batches.append(len(movies)) or insert_many(movies))
+        keys = await asyncio.gather(*[client.call("insert_movie", _movie(f"Grouped {i}")) for i in range(20)])
+        return keys, await client.call("stats")
+
+    keys, stats = _serve(data_dir, scenario, batch_window=0.5)
+    assert batches == [20] and stats["commits"] == 1 and stats["mutations_per_commit"] == 20
+    assert len(set(keys)) == 20
+
+    engine = Database(data_dir).engine
+    assert [engine.by_id[key]["title"] for key in keys] == [f"Grouped {i}" for i in range(20)]
+
+def test_rejected_mutation_fails_alone(data_dir):
+    """A batch with one invalid movie is retried one by one: the others commit, only the bad one errors"""
+    async def scenario(service, client):
+        calls = [client.call("insert_movie", _movie(f"Good {i}")) for i in range(3)]
+        calls.insert(1, client.call("insert_movie", dict(_movie("Bad"), genres="Drama")))
+        calls.append(client.call("delete_movie", 10**9)) #unknown ID: False, not an error
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        return results, dict(service.stats)
+
+    results, stats = _serve(data_dir, scenario, batch_window=0.5)
+    assert isinstance(results[1], ValueError) and "genres" in str(results[1])
+    good, deleted = results[:1] + results[2:4], results[4]
+    assert all(isinstance(key, int) for key in good) and deleted is False
+    assert stats["mutations"] == 5 and stats["commits"] == 1
+
+    engine = Database(data_dir).engine
+    assert sorted(record["title"] for record in engine.search_by_genre("Service")) == ["Good 0", "Good 1", "Good 2"]
+### <--------- Group Commit ---------> ###
+
+#©Vardan Grigoryan
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import snapshot
+from STORAGE import STORAGE_DATASET
+
+
+def test_checksum_spans_chunks(data_dir, monkeypatch):
+    """The checksum is read in chunks: a flipped byte past the first one still fails the open"""
+    storage = STORAGE_DATASET(os.path.join(data_dir, "raw", "movies.csv"), os.path.join(data_dir, "unused.pkl"))
+    records = storage.load_movie_csv()
+    path = os.path.join(data_dir, "records.snap")
+    monkeypatch.setattr(snapshot, "_CRC_CHUNK", 4096)
+    saved = snapshot.save_records(path, records, wal_lsn=7)
+    assert dict(saved) == dict(records)
+    saved.snapshot.close()
+
+    with open(path, "r+b") as f:
+        f.seek(os.path.getsize(path) - 4096 - 10)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="checksum"):
+        snapshot.open_records(path)
+
+#©Vardan Grigoryan
@@ -0,0 +1,137 @@
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+
+#record fields searched by TextIndex ("keywords" is a list, the others are strings)
+TEXT_FIELDS = ["overview", "tagline", "keywords"]
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has he her his in is it its of on or she "
+    "that the their them they this to was were which who will with".split()
+)
+
+### <--------- TOKENIZER ---------> ###
+def tokenize(text):
+    """Lower-cased word tokens without stopwords and single characters"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def movie_tokens(movie_dic):
+    tokens = []
+    for field in TEXT_FIELDS:
+        value = movie_dic.get(field)
+        if not value:
+            continue
+        if isinstance(value, list):
+            value = " ".join(value)
+        tokens.extend(tokenize(value))
+    return tokens
+### <--------- TOKENIZER ---------> ###
+
+
+class _TermPostings:
+    """Parallel sorted arrays: movie IDs and the term frequency in each of them"""
+    __slots__ = ("ids", "tfs")
+
+    def __init__(self):
+        self.ids = array("I")
+        self.tfs = array("H")
+
+    def __getstate__(self):
+        return self.ids, self.tfs
+
+    def __setstate__(self, state):
+        self.ids, self.tfs = state
+
+
+class TextIndex:
+    """
+    Inverted index over TEXT_FIELDS scored with Okapi BM25.
+    Maintained per movie (insert/remove), so it follows insert/delete/modify incrementally.
+    search() keeps the best k candidates with a heap instead of sorting every match.
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}          #term -> _TermPostings
+        self.doc_len = {}           #movie_id -> number of tokens
+        self.total_len = 0
+
+    ### <--------- MAINTENANCE ---------> ###
+    def insert(self, movie_id, movie_dic):
+        """O(T log K) for T distinct terms"""
+        tokens = movie_tokens(movie_dic)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = _TermPostings()
+            ids = posting.ids
+            if not ids or ids[-1] < movie_id:
+                ids.append(movie_id)
+                posting.tfs.append(min(tf, 0xFFFF))
+            else:
+                i = bisect_left(ids, movie_id)
+                ids.insert(i, movie_id)
+                posting.tfs.insert(i, min(tf, 0xFFFF))
+
+        self.doc_len[movie_id] = len(tokens)
+        self.total_len += len(tokens)
+
+    def remove(self, movie_id, movie_dic):
+        """movie_dic must be the record that was inserted (same contract as deleting_process)"""
+        for term in set(movie_tokens(movie_dic)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            i = bisect_left(posting.ids, movie_id)
+            if i < len(posting.ids) and posting.ids[i] == movie_id:
+                del posting.ids[i]
+                del posting.tfs[i]
+                if not posting.ids:
+                    del self.postings[term]
+
+        if movie_id in self.doc_len:
+            self.total_len -= self.doc_len.pop(movie_id)
+    ### <--------- MAINTENANCE ---------> ###
+
+
+    ### <--------- BM25 SEARCH ---------> ###
+    def term_stats(self, query):
+        """(documents, tokens, {term: df}) for query. Summed over partitions, they score like one index"""
+        terms = set(tokenize(query))
+        return len(self.doc_len), self.total_len, {term: len(self.postings[term].ids) for term in terms if term in self.postings}
+
+    def search(self, query, k=10, stats=None):
+        """
+        Return up to k (score, movie_id) pairs, best first. O(sum of df + M log k)
+        stats: term_stats of the whole collection, when this index only holds one partition of it.
+        """
+        n_docs, total_len, dfs = stats if stats is not None else self.term_stats(query)
+        if n_docs == 0:
+            return []
+        avg_len = total_len / n_docs
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            df = dfs[term]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for movie_id, tf in zip(posting.ids, posting.tfs):
+                norm = k1 * (1 - b + b * doc_len[movie_id] / avg_len)
+                scores[movie_id] = scores.get(movie_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, movie_id) for movie_id, score in best]
+    ### <--------- BM25 SEARCH ---------> ###
+
+#©Vardan Grigoryan
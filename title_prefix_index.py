@@ -0,0 +1,219 @@
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import islice
+
+#fields autocomplete results can be ranked by
+RANK_FIELDS = ["popularity", "vote_count"]
+TOP_K = 10              #results served from the precomputed lists of a heavy prefix
+CANDIDATES = 4 * TOP_K  #entries kept per list: deletes consume them, the list is recomputed below TOP_K
+HEAVY_THRESHOLD = 64    #prefixes matching more titles than this keep a precomputed top list
+BLOCK = 512             #rows per block of the sorted array (split at 2 * BLOCK)
+
+### <--------- NORMALIZATION ---------> ###
+def normalize_title(title):
+    """Case- and accent-insensitive form of a title: "Amélie" -> "amelie" """
+    decomposed = unicodedata.normalize("NFKD", title)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+def normalize_prefix(prefix):
+    """normalize_title, keeping one trailing space: "sun " must not match "Sunset" """
+    key = normalize_title(prefix)
+    return key + " " if key and prefix[-1].isspace() else key
+
+def _rank_value(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+### <--------- NORMALIZATION ---------> ###
+
+
+class TitlePrefixIndex:
+    """
+    Type-ahead index over normalized titles.
+    (title, movie_id, scores) rows are kept sorted in blocks of at most 2 * BLOCK rows, so the
+    matches of a prefix are one contiguous run found by bisect, and an insert or a delete moves
+    O(BLOCK) rows instead of shifting the whole array.
+    Every "heavy" prefix (more than HEAVY_THRESHOLD matches) stores its best CANDIDATES movies per
+    rank field, and light prefixes have at most HEAVY_THRESHOLD matches to rank: a lookup never
+    depends on the total number of matches. Each stored list is the exact top of its prefix, so a
+    delete only removes the movie from it; the list is recomputed when fewer than TOP_K remain.
+    A new index starts in bulk mode: inserts are buffered and sorted once by build(), instead of
+    paying an array insertion per title while MovieIndex.insert_overall runs.
+    """
+    def __init__(self):
+        self.blocks = []    #sorted runs of (normalized title, movie_id, tuple of RANK_FIELDS values)
+        self.maxes = []     #last row of each block
+        self.heavy = {}     #prefix -> [top list per rank field], each a list of (score, movie_id), best first
+        self._pending = []  #bulk mode buffer of rows, None once built
+
+    ### <--------- HELPERS ---------> ###
+    def _matches(self, prefix):
+        """Rows whose title starts with prefix, in order. O(log N) to the first, O(1) per row"""
+        blocks = self.blocks
+        b = bisect_left(self.maxes, (prefix,))
+        i = bisect_left(blocks[b], (prefix,)) if b < len(blocks) else 0
+        while b < len(blocks):
+            block = blocks[b]
+            for j in range(i, len(block)):
+                if not block[j][0].startswith(prefix):
+                    return
+                yield block[j]
+            b, i = b + 1, 0
+
+    def _is_heavy(self, prefix):
+        """More than HEAVY_THRESHOLD matches. O(log N + HEAVY_THRESHOLD)"""
+        return len(list(islice(self._matches(prefix), HEAVY_THRESHOLD + 1))) > HEAVY_THRESHOLD
+
+    def _compute_top(self, rows):
+        rows = list(rows)
+        return [heapq.nlargest(CANDIDATES, ((scores[r], movie_id) for _, movie_id, scores in rows))
+                for r in range(len(RANK_FIELDS))]
+
+    def _insert_row(self, row):
+        """O(log N + BLOCK)"""
+        blocks, maxes = self.blocks, self.maxes
+        if not blocks:
+            blocks.append([row])
+            maxes.append(row)
+            return
+        b = min(bisect_left(maxes, row), len(blocks) - 1)
+        block = blocks[b]
+        insort(block, row)
+        if len(block) > 2 * BLOCK:
+            blocks.insert(b + 1, block[BLOCK:])
+            maxes.insert(b + 1, block[-1])
+            del block[BLOCK:]
+        maxes[b] = block[-1]
+
+    def _remove_row(self, key, movie_id):
+        """The removed row, None when (key, movie_id) is not indexed. O(log N + BLOCK)"""
+        blocks, maxes = self.blocks, self.maxes
+        b = bisect_left(maxes, (key, movie_id))
+        if b == len(blocks):
+            return None
+        block = blocks[b]
+        i = bisect_left(block, (key, movie_id))
+        if i == len(block) or block[i][:2] != (key, movie_id):
+            return None
+        row = block.pop(i)
+        if block:
+            maxes[b] = block[-1]
+        else:
+            del blocks[b]
+            del maxes[b]
+        return row
+    ### <--------- HELPERS ---------> ###
+
+
+    ### <--------- BULK BUILD ---------> ###
+    def build(self):
+        """
+        Leave bulk mode: merge the buffered titles into the sorted array and compute every
+        heavy prefix top-down in one pass. O(N log N + N * depth of the heavy prefixes)
+        """
+        if self._pending is None:
+            return
+        rows = sorted(self._pending + [row for block in self.blocks for row in block])
+        self._pending = None
+        self.blocks = [rows[i:i + BLOCK] for i in range(0, len(rows), BLOCK)]
+        self.maxes = [block[-1] for block in self.blocks]
+
+        self.heavy = {}
+        keys = [key for key, _, _ in rows]
+        stack = [("", 0, len(keys))]
+        while stack:
+            prefix, lo, hi = stack.pop()
+            if hi - lo <= HEAVY_THRESHOLD:
+                continue
+            self.heavy[prefix] = self._compute_top(rows[lo:hi])
+
+            #split [lo, hi) by the next character; the title equal to prefix sorts first
+            depth = len(prefix)
+            i = lo
+            while i < hi and len(keys[i]) == depth:
+                i += 1
+            while i < hi:
+                child = prefix + keys[i][depth]
+                j = bisect_left(keys, child[:-1] + chr(ord(child[-1]) + 1), i, hi)
+                stack.append((child, i, j))
+                i = j
+    ### <--------- BULK BUILD ---------> ###
+
+
+    ### <--------- MAINTENANCE ---------> ###
+    def insert(self, movie_id, movie_dic):
+        """O(L * (log N + CANDIDATES) + BLOCK) for a title of L characters"""
+        key = normalize_title(movie_dic.get("title") or "")
+        scores = tuple(_rank_value(movie_dic.get(field)) for field in RANK_FIELDS)
+
+        if self._pending is not None:
+            self._pending.append((key, movie_id, scores))
+            return
+        self._insert_row((key, movie_id, scores))
+
+        #match counts only shrink as the prefix grows, so stop at the first light prefix
+        for length in range(len(key) + 1):
+            prefix = key[:length]
+            tops = self.heavy.get(prefix)
+            if tops is not None:
+                for r, top in enumerate(tops):
+                    item = (scores[r], movie_id)
+                    if item > top[-1]: #below it, the list stays the exact top of fewer movies
+                        top.append(item)
+                        top.sort(reverse=True)
+                        del top[CANDIDATES:]
+                continue
+
+            if not self._is_heavy(prefix):
+                break
+            self.heavy[prefix] = self._compute_top(self._matches(prefix))
+
+    def remove(self, movie_id, movie_dic):
+        """
+        movie_dic must be the record that was inserted (same contract as deleting_process).
+        O(L * (log N + HEAVY_THRESHOLD + CANDIDATES) + BLOCK), plus a recompute of the prefixes
+        whose list drained below TOP_K, at most once every CANDIDATES - TOP_K deletes of their top movies.
+        """
+        self.build()
+        key = normalize_title(movie_dic.get("title") or "")
+        row = self._remove_row(key, movie_id)
+        if row is None:
+            return
+        scores = row[2]
+
+        for length in range(len(key) + 1):
+            prefix = key[:length]
+            tops = self.heavy.get(prefix)
+            if tops is None:
+                break #heavy prefixes are prefix-closed
+            if not self._is_heavy(prefix):
+                del self.heavy[prefix]
+                continue
+            for r, top in enumerate(tops):
+                item = (scores[r], movie_id)
+                if item >= top[-1]: #exact top: a movie ranked at least as high as the last one is in it
+                    top.remove(item)
+            if min(map(len, tops)) < TOP_K:
+                self.heavy[prefix] = self._compute_top(self._matches(prefix))
+    ### <--------- MAINTENANCE ---------> ###
+
+
+    ### <--------- LOOKUP ---------> ###
+    def top_k(self, prefix, k=TOP_K, rank_by="popularity"):
+        """
+        IDs of the k best titles starting with prefix (case/accent-insensitive, a trailing space
+        kept), ranked by rank_by. O(L + log N) for k <= TOP_K.
+        """
+        self.build()
+        r = RANK_FIELDS.index(rank_by)
+        key = normalize_prefix(prefix)
+
+        tops = self.heavy.get(key)
+        if tops is not None and k <= len(tops[r]):
+            return [movie_id for _, movie_id in tops[r][:k]]
+
+        best = heapq.nlargest(k, ((scores[r], movie_id) for _, movie_id, scores in self._matches(key)))
+        return [movie_id for _, movie_id in best]
+    ### <--------- LOOKUP ---------> ###
+
+#©Vardan Grigoryan
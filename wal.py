@@ -0,0 +1,104 @@
+import json
+import os
+
+class WriteAheadLog:
+    """
+    Append-only JSON-lines log of the mutations applied since the last checkpoint.
+    Every entry carries a log sequence number (lsn); a checkpoint records the last lsn
+    it contains, so replay at startup only re-applies the entries written after it.
+    Appending an entry costs O(record) I/O instead of re-pickling the whole dataset.
+    """
+    def __init__(self, log_path="project/data/pickle/mutations.wal", start_lsn=0, sync=True):
+        """
+            start_lsn (int): last lsn contained in the checkpoint the log continues from.
+            sync (bool): fsync after every append, so an acknowledged write survives a crash.
+        """
+        self.log_path = os.path.abspath(log_path)
+        self.sync = sync
+        self.last_lsn = start_lsn
+
+        #creating the file if it does not exist
+        with open(self.log_path, 'a'):
+            pass
+        self._file = None
+
+
+    ### <--------- RECOVERY ---------> ###
+    def recover(self, after_lsn=0):
+        """
+        Return the entries with lsn > after_lsn, in log order.
+        A torn last line (crash in the middle of an append) is cut off the file,
+        so the next append starts on a clean line.
+        """
+        entries = []
+        good_offset = 0
+
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break #torn write, everything after it is garbage
+                if not line.endswith(b"\n"):
+                    break
+                good_offset += len(line)
+                self.last_lsn = max(self.last_lsn, entry["lsn"])
+                if entry["lsn"] > after_lsn:
+                    entries.append(entry)
+
+        if good_offset != os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good_offset)
+        return entries
+    ### <--------- RECOVERY ---------> ###
+
+
+    ### <--------- APPEND ---------> ###
+    def append(self, op, movie_id, record=None):
+        """Append one mutation ("insert", "delete" or "modify") and return its lsn. O(record)"""
+        entry = {"op": op, "id": movie_id}
+        if record is not None:
+            entry["record"] = dict(record)
+        return self._write(entry)
+
+    def append_batch(self, ops):
+        """
+        Append [(op, movie_id, record)] as ONE entry (one line, one fsync) and return its lsn.
+        A torn batch is dropped whole by recover(), so a batch is replayed all-or-nothing.
+        """
+        entries = []
+        for op, movie_id, record in ops:
+            entry = {"op": op, "id": movie_id}
+            if record is not None:
+                entry["record"] = dict(record)
+            entries.append(entry)
+        return self._write({"op": "batch", "entries": entries})
+
+    def _write(self, entry):
+        self.last_lsn += 1
+        entry = {"lsn": self.last_lsn, **entry}
+
+        if self._file is None:
+            self._file = open(self.log_path, 'a', encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        return self.last_lsn
+    ### <--------- APPEND ---------> ###
+
+
+    ### <--------- CHECKPOINT ---------> ###
+    def truncate(self):
+        """Empty the log once a checkpoint containing every entry has been written."""
+        self.close()
+        with open(self.log_path, 'w'):
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    ### <--------- CHECKPOINT ---------> ###
+
+#©Vardan Grigoryan